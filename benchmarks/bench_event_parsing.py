@@ -0,0 +1,80 @@
+# Cost of turning CTFTime event timestamps into datetimes: the old strptime
+# call per render against fromisoformat once at ingestion. Run from the repo root:
+#   python benchmarks/bench_event_parsing.py
+import os
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from event_index import EventIndex
+from models import Event
+
+EVENTS = 5000
+ROUNDS = 20
+
+
+def make_events(count):
+    base = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    events = []
+    for i in range(count):
+        start = base + timedelta(hours=7 * i)
+        events.append({
+            'id': i,
+            'title': f"CTF {i}",
+            'url': f"https://example.com/{i}",
+            'start': start.isoformat(),
+            'finish': (start + timedelta(hours=48)).isoformat(),
+        })
+    return events
+
+
+def best_of(func):
+    best = float('inf')
+    for _ in range(ROUNDS):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main():
+    events = make_events(EVENTS)
+    now = datetime(2025, 6, 1, tzinfo=timezone.utc)
+
+    def strptime_ongoing():
+        # What !current_ctfs used to do: parse both timestamps of every event
+        return [event for event in events
+                if datetime.strptime(event['start'], '%Y-%m-%dT%H:%M:%S%z') <= now
+                < datetime.strptime(event['finish'], '%Y-%m-%dT%H:%M:%S%z')]
+
+    def ingest():
+        return [Event.from_data(event) for event in events]
+
+    parsed = ingest()
+    now_ts = now.timestamp()
+
+    def epoch_ongoing():
+        return [event for event in parsed if event.start_ts <= now_ts < event.finish_ts]
+
+    index = EventIndex()
+    index.replace(parsed)
+
+    def index_ongoing():
+        return index.ongoing(now_ts)
+
+    assert len(strptime_ongoing()) == len(epoch_ongoing()) == len(index_ongoing())
+    rows = [
+        ("strptime per filter", best_of(strptime_ongoing)),
+        ("Event.from_data once (fromisoformat)", best_of(ingest)),
+        ("filter on pre-parsed epoch ints", best_of(epoch_ongoing)),
+        ("EventIndex.ongoing bisect", best_of(index_ongoing)),
+    ]
+    print(f"{EVENTS} events, best of {ROUNDS}:")
+    for name, seconds in rows:
+        print(f"  {name:<40} {seconds * 1000:8.2f} ms  ({seconds / EVENTS * 1e6:6.2f} us/event)")
+
+
+if __name__ == '__main__':
+    main()
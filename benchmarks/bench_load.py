@@ -0,0 +1,397 @@
+# Offline load test of the whole bot: synthetic guilds, members and channels
+# send commands straight to on_message, and CTFTime is a local HTTP server
+# answering from the fixtures in benchmarks/fixtures. Each traffic pattern is
+# reported with its throughput, p50/p99 command latency and memory, so
+# regressions in the hot paths show up as numbers. Needs the bot's
+# requirements, but no Discord token or network. Run from the repo root:
+#   python benchmarks/bench_load.py
+#   python benchmarks/bench_load.py --guilds 20 --members 100 --ctftime-latency 0.2
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from aiohttp import web
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES = os.path.join(REPO, 'benchmarks', 'fixtures')
+sys.path.insert(0, REPO)
+
+# The fixtures' dates are moved forward by the time since this moment, so the
+# same events are ongoing and upcoming whenever the benchmark runs
+FIXTURES_RECORDED_AT = 1717200000    # 2024-06-01T00:00:00Z
+FIXTURES_YEAR = 2024
+
+
+def percentile(values, q):
+    # Nearest-rank percentile of an already sorted list
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+class FakeCTFTime:
+    # The CTFTime API endpoints the bot uses, answered from the fixtures with
+    # ETags (and 304s for matching If-None-Match) after a fixed latency
+    def __init__(self, now, latency):
+        self.latency = latency
+        self.requests = 0
+        shift = (now - FIXTURES_RECORDED_AT) // 3600 * 3600
+        self.events = []
+        for event in self.load('events'):
+            event = dict(event)
+            for key in ('start', 'finish'):
+                at = datetime.fromisoformat(event[key]).timestamp() + shift
+                event[key] = datetime.fromtimestamp(at, timezone.utc).isoformat()
+                event[key + '_ts'] = at
+            self.events.append(event)
+        self.events.sort(key=lambda event: event['start_ts'])
+        self.teams = {team['id']: team for team in self.load('teams')}
+        self.top = self.load('top')[str(FIXTURES_YEAR)]
+        self.top_by_country = self.load('top_by_country')
+
+    @staticmethod
+    def load(name):
+        with open(os.path.join(FIXTURES, f'{name}.json'), encoding='utf-8') as f:
+            return json.load(f)
+
+    @staticmethod
+    def public(event):
+        return {key: value for key, value in event.items() if not key.endswith('_ts')}
+
+    async def respond(self, request, data):
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if data is None:
+            raise web.HTTPNotFound()
+        body = json.dumps(data)
+        etag = '"%s"' % hashlib.sha1(body.encode()).hexdigest()[:16]
+        if request.headers.get('If-None-Match') == etag:
+            return web.Response(status=304, headers={'ETag': etag})
+        return web.Response(text=body, content_type='application/json', headers={'ETag': etag})
+
+    async def events_list(self, request):
+        limit = int(request.query.get('limit', 100))
+        start = int(request.query.get('start', 0))
+        finish = int(request.query.get('finish', 2 ** 40))
+        found = [self.public(event) for event in self.events if start <= event['start_ts'] < finish]
+        return await self.respond(request, found[:limit])
+
+    async def event(self, request):
+        event_id = int(request.match_info['event_id'])
+        found = next((self.public(event) for event in self.events if event['id'] == event_id), None)
+        return await self.respond(request, found)
+
+    async def top_teams(self, request):
+        year = request.match_info.get('year', str(FIXTURES_YEAR))
+        limit = int(request.query.get('limit', 10))
+        return await self.respond(request, {year: self.top[:limit]})
+
+    async def top_teams_by_country(self, request):
+        country = request.match_info['country'].upper()
+        return await self.respond(request, [dict(row, team_country=country) for row in self.top_by_country])
+
+    async def team(self, request):
+        return await self.respond(request, self.teams.get(int(request.match_info['team_id'])))
+
+    async def start(self):
+        # Returns the API base URL on a free local port
+        app = web.Application()
+        app.router.add_get('/api/v1/events/', self.events_list)
+        app.router.add_get('/api/v1/events/{event_id}/', self.event)
+        app.router.add_get('/api/v1/top/', self.top_teams)
+        app.router.add_get('/api/v1/top/{year}/', self.top_teams)
+        app.router.add_get('/api/v1/top-by-country/{country}/', self.top_teams_by_country)
+        app.router.add_get('/api/v1/teams/{team_id}/', self.team)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, '127.0.0.1', 0).start()
+        port = self.runner.addresses[0][1]
+        return f'http://127.0.0.1:{port}/api/v1/'
+
+    async def close(self):
+        await self.runner.cleanup()
+
+
+# Stand-ins for the discord.py objects the command handlers touch. Every call
+# that would hit Discord's API waits `latency` seconds instead.
+
+class FakeRole:
+    def __init__(self, guild, id, name):
+        self.guild = guild
+        self.id = id
+        self.name = name
+
+    @property
+    def mention(self):
+        return f"<@&{self.id}>"
+
+    async def delete(self):
+        await self.guild.api()
+        self.guild.roles.remove(self)
+
+
+class FakeGuild:
+    def __init__(self, id, latency):
+        self.id = id
+        self.latency = latency
+        self.roles = []
+
+    async def api(self):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    def get_role(self, role_id):
+        return next((role for role in self.roles if role.id == role_id), None)
+
+    async def create_role(self, name, mentionable=False):
+        await self.api()
+        role = FakeRole(self, self.id * 1000 + len(self.roles) + 1, name)
+        self.roles.append(role)
+        return role
+
+
+class FakePermissions:
+    manage_guild = True
+
+
+class FakeMember:
+    def __init__(self, guild, id, name):
+        self.guild = guild
+        self.id = id
+        self.name = name
+        self.display_name = name.title()
+        self.roles = []
+        self.guild_permissions = FakePermissions()
+
+    async def add_roles(self, *roles):
+        await self.guild.api()
+        self.roles.extend(roles)
+
+    async def remove_roles(self, *roles):
+        await self.guild.api()
+        for role in roles:
+            self.roles.remove(role)
+
+
+class FakeMessage:
+    def __init__(self, id, channel, content=None, author=None):
+        self.id = id
+        self.channel = channel
+        self.guild = channel.guild
+        self.content = content
+        self.author = author
+        self.jump_url = f"https://discord.com/channels/{self.guild.id}/{channel.id}/{id}"
+
+    async def edit(self, **kwargs):
+        await self.guild.api()
+        self.channel.edits += 1
+        return self
+
+    async def pin(self):
+        await self.guild.api()
+
+    async def unpin(self):
+        await self.guild.api()
+
+
+class FakeChannel:
+    def __init__(self, guild, id):
+        self.guild = guild
+        self.id = id
+        self.sends = 0
+        self.edits = 0
+        self.errors = []
+        self._ids = iter(range(id * 1000000, (id + 1) * 1000000))
+
+    def message(self, content, author):
+        return FakeMessage(next(self._ids), self, content, author)
+
+    def get_partial_message(self, message_id):
+        return FakeMessage(message_id, self)
+
+    async def send(self, content=None, embed=None, embeds=None, **kwargs):
+        await self.guild.api()
+        self.sends += 1
+        if content and content.startswith("An error occurred"):
+            self.errors.append(content)
+        return self.message(content, None)
+
+
+class Server:
+    # One guild with one channel everybody talks in
+    def __init__(self, index, members, latency):
+        self.guild = FakeGuild(index + 1, latency)
+        self.channel = FakeChannel(self.guild, 100 + index)
+        self.members = [FakeMember(self.guild, (index + 1) * 10000 + i, f"player{i}") for i in range(members)]
+        self.admin = self.members[0]
+
+
+def kickoff(servers, challenges, rng):
+    # A CTF starting in every guild at once: the captain creates it and adds
+    # the challenges, then everyone joins, grabs a challenge and checks the
+    # board, and a while later solves land and people look at what's left
+    yield 'create', [(server, server.admin, '!create_ctf kickoff') for server in servers]
+    yield 'add challenges', [(server, server.admin, f'!add_challenge kickoff chal{i}')
+                             for server in servers for i in range(challenges)]
+    yield 'show board', [(server, server.admin, '!show_ctf kickoff') for server in servers]
+    burst = []
+    for server in servers:
+        for i, member in enumerate(server.members):
+            burst.append((server, member, '!join_ctf kickoff'))
+            burst.append((server, member, f'!allocate_challenge kickoff chal{i % challenges}'))
+            burst.append((server, member, rng.choice(['!list_challenges kickoff', '!ctf_stats kickoff'])))
+    rng.shuffle(burst)
+    yield 'join and claim', burst
+    solves = []
+    for server in servers:
+        for i, member in enumerate(server.members):
+            if i % 2 == 0:
+                solves.append((server, member, f'!solve_challenge kickoff chal{i % challenges}'))
+            solves.append((server, member, rng.choice(['!my_challenges', '!unsolved kickoff',
+                                                       '!list_challenges kickoff', '!ctf_stats kickoff'])))
+    rng.shuffle(solves)
+    yield 'solve and browse', solves
+
+
+def browsing(servers, per_member, event_ids, team_ids, rng):
+    # Members paging through CTFTime: mostly event lists, some single events,
+    # leaderboards and team profiles
+    commands = [
+        (6, lambda: f'!upcoming {rng.choice([5, 10, 25])}'),
+        (4, lambda: f'!list_ctfs {rng.choice([5, 10])}'),
+        (4, lambda: '!current_ctfs'),
+        (2, lambda: f'!time_left {rng.choice(event_ids)}'),
+        (2, lambda: f'!time_until_start {rng.choice(event_ids)}'),
+        (2, lambda: rng.choice(['!top', f'!top {FIXTURES_YEAR - 1}'])),
+        (1, lambda: '!top_country pl'),
+        (2, lambda: f'!team {rng.choice(team_ids)}'),
+    ]
+    weights = [weight for weight, _ in commands]
+    traffic = []
+    for server in servers:
+        for member in server.members:
+            for make in rng.choices([make for _, make in commands], weights, k=per_member):
+                traffic.append((server, member, make()))
+    rng.shuffle(traffic)
+    yield 'browse', traffic
+
+
+async def replay(bot, traffic, concurrency):
+    # Runs the messages with at most `concurrency` in flight; returns
+    # {command name: [latency]} and the wall time
+    latencies = {}
+    queue = iter(traffic)
+
+    async def worker():
+        for server, member, content in queue:
+            message = server.channel.message(content, member)
+            started = time.perf_counter()
+            await bot.on_message(message)
+            latencies.setdefault(content.split()[0], []).append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, time.perf_counter() - started
+
+
+def report(name, latencies, elapsed, ctftime_requests, errors, memory, per_command):
+    every = sorted(value for values in latencies.values() for value in values)
+    print(f"{name:<18} {len(every):6} msgs {elapsed:7.2f} s {len(every) / elapsed:8.0f} msg/s  "
+          f"p50 {percentile(every, 0.5) * 1000:7.2f} ms  p99 {percentile(every, 0.99) * 1000:7.2f} ms  "
+          f"{ctftime_requests:4} CTFTime requests  {errors} errors  {memory}")
+    if per_command:
+        for command, values in sorted(latencies.items()):
+            values.sort()
+            print(f"    {command:<20} {len(values):6}  p50 {percentile(values, 0.5) * 1000:7.2f} ms  "
+                  f"p99 {percentile(values, 0.99) * 1000:7.2f} ms")
+
+
+async def run(args):
+    rng = random.Random(args.seed)
+    fake = FakeCTFTime(int(time.time()), args.ctftime_latency)
+    os.environ['CTFTIME_API_URL'] = await fake.start()
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    # The bot keeps its databases in the working directory
+    os.chdir(tempfile.mkdtemp(prefix='ctftimebot-load-'))
+    import ctftimebot as bot
+
+    if not args.paced:
+        # Leave out Discord's per-channel pacing, which would otherwise be all the numbers show
+        bot.outbox.rate = bot.outbox.burst = 1e9
+    servers = [Server(i, args.members, args.discord_latency) for i in range(args.guilds)]
+    event_ids = [event['id'] for event in fake.events]
+    team_ids = list(fake.teams) + [999999]    # plus one CTFTime doesn't know
+
+    started = time.perf_counter()
+    await bot.sync_events()
+    print(f"event sync: {len(bot.event_index)} events in {(time.perf_counter() - started) * 1000:.1f} ms, "
+          f"{fake.requests} CTFTime requests")
+
+    scenarios = {
+        'kickoff': kickoff(servers, args.challenges, rng),
+        'browsing': browsing(servers, args.requests_per_member, event_ids, team_ids, rng),
+    }
+    for scenario in args.scenario or scenarios:
+        print(f"\n{scenario}: {args.guilds} guilds x {args.members} members, concurrency {args.concurrency}")
+        for phase, traffic in scenarios[scenario]:
+            requests_before = fake.requests
+            errors_before = sum(len(server.channel.errors) for server in servers)
+            if args.trace_memory:
+                tracemalloc.start()
+            latencies, elapsed = await replay(bot, traffic, args.concurrency)
+            if args.trace_memory:
+                current, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                memory = f"heap +{current / 2 ** 20:.1f} MB (peak +{peak / 2 ** 20:.1f} MB)"
+            else:
+                memory = f"peak RSS {peak_rss_mb():.0f} MB"
+            errors = sum(len(server.channel.errors) for server in servers) - errors_before
+            report(phase, latencies, elapsed, fake.requests - requests_before, errors, memory, args.per_command)
+
+    # Let the debounced board edits go out before shutting down
+    await asyncio.sleep(bot.scoreboards.debounce + 0.5)
+    print(f"\nDiscord output: {sum(server.channel.sends for server in servers)} sends, "
+          f"{sum(server.channel.edits for server in servers)} edits; outbox {bot.outbox.stats()}")
+    for server in servers:
+        for error in server.channel.errors[:3]:
+            print(f"guild {server.guild.id}: {error}")
+    await bot.client.close()
+    await fake.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay synthetic Discord traffic against the bot, offline.")
+    parser.add_argument('--scenario', action='append', choices=['kickoff', 'browsing'],
+                        help="traffic pattern to run (repeatable, default all)")
+    parser.add_argument('--guilds', type=int, default=5)
+    parser.add_argument('--members', type=int, default=40, help="members per guild")
+    parser.add_argument('--challenges', type=int, default=60, help="challenges per kickoff CTF")
+    parser.add_argument('--requests-per-member', type=int, default=5, help="browsing commands per member")
+    parser.add_argument('--concurrency', type=int, default=50, help="messages being handled at once")
+    parser.add_argument('--ctftime-latency', type=float, default=0.05, help="seconds per fake CTFTime response")
+    parser.add_argument('--discord-latency', type=float, default=0.0, help="seconds per fake Discord API call")
+    parser.add_argument('--paced', action='store_true', help="keep the outbox's per-channel send pacing")
+    parser.add_argument('--per-command', action='store_true', help="also break latencies down per command")
+    parser.add_argument('--trace-memory', action='store_true',
+                        help="report Python heap growth per phase with tracemalloc (slows everything down)")
+    parser.add_argument('--seed', type=int, default=1)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
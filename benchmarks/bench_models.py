@@ -0,0 +1,58 @@
+# Memory used by custom CTF challenges: the old dict-per-challenge layout
+# against the slotted models. Run from the repo root:
+#   python benchmarks/bench_models.py
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import Challenge, CustomCTF, Status, UserNames
+
+CTFS = 10
+USERS = 50
+
+
+def build_dicts(count):
+    ctfs = {}
+    for i in range(count):
+        ctf = ctfs.setdefault(f"ctf{i % CTFS}", {'name': f"ctf{i % CTFS}", 'challenges': {}})
+        # Usernames arrive as fresh strings from each Discord message
+        user = ''.join(['member', str(i % USERS)]) if i % 3 else None
+        ctf['challenges'][f"chal{i}"] = {'user': user, 'solved': i % 3 == 2, 'working_on': i % 3 == 1}
+    return ctfs
+
+
+def build_models(count):
+    ctfs = {}
+    users = UserNames()
+    for i in range(count):
+        name = f"ctf{i % CTFS}"
+        ctf = ctfs.get(name)
+        if ctf is None:
+            ctf = ctfs[name] = CustomCTF(name)
+        # Ids arrive as fresh ints too; the guild's UserNames hands out one shared copy
+        user = users.intern(10**17 + i % USERS) if i % 3 else None
+        ctf.challenges[f"chal{i}"] = Challenge(Status(i % 3), user)
+    return ctfs
+
+
+def measure(build, count):
+    tracemalloc.start()
+    data = build(count)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del data
+    return size
+
+
+def main():
+    for count in (10_000, 100_000):
+        old = measure(build_dicts, count)
+        new = measure(build_models, count)
+        print(f"{count:>7} challenges: dicts {old / 1024:9.0f} KiB, models {new / 1024:9.0f} KiB "
+              f"({old / new:.1f}x smaller, {(old - new) / count:.0f} bytes saved per challenge)")
+
+
+if __name__ == '__main__':
+    main()
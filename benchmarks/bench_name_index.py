@@ -0,0 +1,63 @@
+# Autocomplete and "did you mean" lookups over many names: every prefix of
+# a name typed one keystroke at a time, and names with a typo in them, against
+# indexes of growing size. Run from the repo root:
+#   python benchmarks/bench_name_index.py
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from name_index import NameIndex
+
+SIZES = (100, 1000, 10000)
+QUERIES = 200
+WORDS = ['pwn', 'web', 'rev', 'crypto', 'misc', 'forensics', 'baby', 'heap', 'kernel', 'sandbox', 'jail',
+         'oracle', 'padding', 'format', 'string', 'overflow', 'race', 'cache', 'token', 'login', 'admin']
+
+
+def make_names(count, rng):
+    names = set()
+    while len(names) < count:
+        names.add(f"{' '.join(rng.sample(WORDS, rng.randint(1, 3)))} {rng.randint(1, 999)}")
+    return sorted(names)
+
+
+def typo(name, rng):
+    i = rng.randrange(len(name))
+    return name[:i] + name[i + 1:]
+
+
+def timed(calls):
+    latencies = []
+    for call in calls:
+        started = time.perf_counter()
+        call()
+        latencies.append(time.perf_counter() - started)
+    latencies.sort()
+    return latencies[len(latencies) // 2] * 1e6, latencies[int(len(latencies) * 0.99)] * 1e6
+
+
+def main():
+    rng = random.Random(1)
+    for size in SIZES:
+        names = make_names(size, rng)
+        tracemalloc.start()
+        started = time.perf_counter()
+        index = NameIndex(names)
+        built = time.perf_counter() - started
+        memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+        typed = [name[:length] for name in rng.sample(names, QUERIES // 10) for length in range(1, 11)]
+        complete = timed(lambda query=query: index.search(query) for query in typed)
+        similar = timed(lambda query=typo(name, rng): index.similar(query) for name in rng.choices(names, k=QUERIES))
+        print(f"{size:6} names: built in {built * 1000:7.1f} ms, {memory / 2 ** 20:6.1f} MB | "
+              f"autocomplete p50 {complete[0]:7.1f} us, p99 {complete[1]:7.1f} us | "
+              f"did you mean p50 {similar[0]:7.1f} us, p99 {similar[1]:7.1f} us")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+# Time from startup until the bot can answer its first CTFTime commands, with
+# an empty response cache (cold) and with the one the previous run left on
+# disk (warm). CTFTime is replaced by an in-process fake with fixed latency.
+# Run from the repo root:
+#   python benchmarks/bench_startup.py
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ctftime_client import CTFTimeClient
+from event_stream import stream_events
+from rankings import Rankings
+from storage import ResponseStore
+
+LATENCY = 0.15              # seconds per simulated CTFTime request
+SYNC_PAST = 14 * 24 * 3600
+SYNC_AHEAD = 30 * 24 * 3600
+BASE = 'https://ctftime.org/api/v1/'
+
+
+class FakeResponse:
+    def __init__(self, status, body, etag):
+        self.status = status
+        self.body = body
+        self.headers = {'ETag': etag}
+
+    async def __aenter__(self):
+        await asyncio.sleep(LATENCY)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+    def raise_for_status(self):
+        pass
+
+    async def json(self, content_type=None):
+        return json.loads(self.body)
+
+
+class FakeCTFTime:
+    # Deterministic events (one every 8 hours) and teams, with ETags
+    closed = False
+
+    def body(self, url, params):
+        if url == BASE + 'events/':
+            start = params['start'] // (8 * 3600) * (8 * 3600)
+            events = []
+            for at in range(start, params['finish'], 8 * 3600):
+                iso = datetime.fromtimestamp(at, timezone.utc).isoformat()
+                finish = datetime.fromtimestamp(at + 86400, timezone.utc).isoformat()
+                events.append({'id': at // 3600, 'title': f"CTF {at}", 'url': '', 'start': iso, 'finish': finish})
+            return events[:params['limit']]
+        if url.startswith(BASE + 'top/'):
+            return {'2024': [{'team_id': i, 'team_name': f"Team {i}", 'points': 100.0 - i} for i in range(1, 11)]}
+        team_id = int(url.rstrip('/').rsplit('/', 1)[1])
+        return {'id': team_id, 'name': f"Team {team_id}", 'country': 'PL', 'rating': {}}
+
+    def get(self, url, params=None, headers=None, timeout=None):
+        body = json.dumps(self.body(url, params))
+        etag = '"%x"' % hash(body)
+        if headers and headers.get('If-None-Match') == etag:
+            return FakeResponse(304, None, etag)
+        return FakeResponse(200, body, etag)
+
+    async def close(self):
+        pass
+
+
+async def startup(db_path, now):
+    started = time.perf_counter()
+    client = CTFTimeClient(store=ResponseStore(db_path))
+    fake = FakeCTFTime()
+    client._get_session = lambda: fake
+    cache = {'ttl': 300, 'stale_ttl': 900, 'persist': True}
+
+    async def fetch_events(limit, start, finish):
+        return await client.get_json(BASE + 'events/', params={'limit': limit, 'start': start, 'finish': finish}, **cache)
+
+    async def fetch_top():
+        return await client.get_json(BASE + 'top/', params={'limit': 10}, **cache)
+
+    async def fetch_team(team_id):
+        return await client.get_json(f"{BASE}teams/{team_id}/", **cache)
+
+    rankings = Rankings(fetch_top, None, None, fetch_team)
+    await client.warm()
+    # The first event sync plus a cold !top, as right after on_ready
+    events = [event async for event in stream_events(fetch_events, now - SYNC_PAST, now + SYNC_AHEAD)]
+    _, teams = await rankings.top()
+    await rankings.teams(team.team_id for team in teams)
+    ready = time.perf_counter() - started
+    blocking = client.upstream_requests
+
+    # Let background refreshes finish before shutting down
+    await asyncio.sleep(LATENCY * 3)
+    rankings.close()
+    await client.close()
+    return ready, blocking, len(events)
+
+
+def main():
+    now = int(time.time())
+    with tempfile.TemporaryDirectory() as directory:
+        db_path = os.path.join(directory, 'ctftime_cache.db')
+        for label in ('cold', 'warm'):
+            ready, requests, events = asyncio.run(startup(db_path, now))
+            print(f"{label}: ready in {ready * 1000:7.1f} ms, {requests:2} CTFTime requests started, "
+                  f"{events} events synced")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,169 @@
+import asyncio
+from contextlib import asynccontextmanager
+from models import Challenge, Status
+from name_index import NameIndex
+
+UNCLAIMED = Status.UNCLAIMED
+WORKING = Status.WORKING
+SOLVED = Status.SOLVED
+
+
+def new_challenge():
+    return Challenge()
+
+
+def legacy_usernames(ctfs):
+    # Challenges saved before user ids were stored hold the claimant's username
+    return {challenge.user for ctf in ctfs.values() for challenge in ctf.challenges.values()
+            if isinstance(challenge.user, str)}
+
+
+def adopt_legacy_users(ctfs, members):
+    # Hand every challenge held under a username to the member `members` maps
+    # that username to; returns (ctf_name, challenge_name, username, member)
+    # for each challenge changed
+    adopted = []
+    for ctf_name, ctf in ctfs.items():
+        for challenge_name, challenge in ctf.challenges.items():
+            member = members.get(challenge.user) if isinstance(challenge.user, str) else None
+            if member is not None:
+                adopted.append((ctf_name, challenge_name, challenge.user, member))
+                challenge.user = member.id
+    return adopted
+
+
+def compare_and_set(challenge, expected_status, new_status, user, expected_user=None):
+    # Move a challenge to new_status only if it is still in expected_status (and,
+    # if given, still held by expected_user). There is no await between the check
+    # and the write, so on the event loop nothing can interleave with it.
+    if challenge.status is not expected_status:
+        return False
+    if expected_user is not None and challenge.user != expected_user:
+        return False
+    challenge.user = user
+    challenge.status = new_status
+    return True
+
+
+def claim_challenge(challenges, challenge_name, user):
+    # Returns (claimed, challenge); challenge is None if it doesn't exist
+    challenge = challenges.get(challenge_name)
+    if challenge is None:
+        return False, None
+    return compare_and_set(challenge, UNCLAIMED, WORKING, user), challenge
+
+
+def solve_challenge(challenges, challenge_name, user):
+    # Only the member working on a challenge can mark it solved
+    challenge = challenges.get(challenge_name)
+    if challenge is None:
+        return False, None
+    return compare_and_set(challenge, WORKING, SOLVED, user, expected_user=user), challenge
+
+
+class KeyedLocks:
+    # One asyncio.Lock per key (e.g. per CTF), created on demand and dropped
+    # once nobody holds or waits on it, so unrelated keys never contend.
+    def __init__(self):
+        self._locks = {}
+        self._users = {}
+
+    def __len__(self):
+        return len(self._locks)
+
+    @asynccontextmanager
+    async def hold(self, key):
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = self._locks[key] = asyncio.Lock()
+        self._users[key] = self._users.get(key, 0) + 1
+        try:
+            async with lock:
+                yield
+        finally:
+            self._users[key] -= 1
+            if self._users[key] == 0:
+                del self._users[key]
+                del self._locks[key]
+
+
+class ChallengeIndex:
+    # Secondary indexes over one guild's challenges (by status, by user,
+    # per-CTF counts and names), updated on every mutation so queries never
+    # scan every challenge of every CTF.
+    def __init__(self):
+        self._indexed = {}     # ctf -> {challenge_name: (status, user)}
+        self._by_status = {}   # ctf -> {status: set of challenge names}
+        self._by_user = {}     # user -> set of (ctf, challenge_name)
+        self._names = {}       # ctf -> NameIndex of its challenge names
+
+    def rebuild(self, ctfs):
+        self._indexed.clear()
+        self._by_status.clear()
+        self._by_user.clear()
+        self._names.clear()
+        for ctf_name, ctf in ctfs.items():
+            for challenge_name, challenge in ctf.challenges.items():
+                self.update(ctf_name, challenge_name, challenge)
+
+    def update(self, ctf_name, challenge_name, challenge):
+        # Re-index one challenge; pass None when it has been deleted
+        indexed = self._indexed.setdefault(ctf_name, {})
+        old = indexed.pop(challenge_name, None)
+        if old is not None:
+            status, user = old
+            self._by_status[ctf_name][status].discard(challenge_name)
+            if user is not None:
+                held = self._by_user[user]
+                held.discard((ctf_name, challenge_name))
+                if not held:
+                    del self._by_user[user]
+        if challenge is None:
+            names = self._names.get(ctf_name)
+            if names is not None:
+                names.remove(challenge_name)
+                # A challenge whose name differs only in case takes its place
+                for other in indexed:
+                    if other not in names:
+                        names.add(other)
+            if not indexed:
+                self.remove_ctf(ctf_name)
+            return
+        if old is None:
+            self._names.setdefault(ctf_name, NameIndex()).add(challenge_name)
+        status = challenge.status
+        user = challenge.user
+        indexed[challenge_name] = (status, user)
+        statuses = self._by_status.setdefault(ctf_name, {UNCLAIMED: set(), WORKING: set(), SOLVED: set()})
+        statuses[status].add(challenge_name)
+        if user is not None:
+            self._by_user.setdefault(user, set()).add((ctf_name, challenge_name))
+
+    def remove_ctf(self, ctf_name):
+        for challenge_name, (status, user) in self._indexed.pop(ctf_name, {}).items():
+            if user is not None:
+                held = self._by_user[user]
+                held.discard((ctf_name, challenge_name))
+                if not held:
+                    del self._by_user[user]
+        self._by_status.pop(ctf_name, None)
+        self._names.pop(ctf_name, None)
+
+    def names(self, ctf_name):
+        # NameIndex of the CTF's challenge names, for suggestions and autocomplete
+        return self._names.get(ctf_name) or NameIndex()
+
+    def with_status(self, ctf_name, *statuses):
+        by_status = self._by_status.get(ctf_name, {})
+        return sorted(name for status in statuses for name in by_status.get(status, ()))
+
+    def for_user(self, user):
+        # (ctf, challenge, status) for everything the user has claimed or solved
+        return sorted((ctf_name, challenge_name, self._indexed[ctf_name][challenge_name][0])
+                      for ctf_name, challenge_name in self._by_user.get(user, ()))
+
+    def counts(self, ctf_name):
+        by_status = self._by_status.get(ctf_name, {})
+        counts = {status: len(by_status.get(status, ())) for status in (UNCLAIMED, WORKING, SOLVED)}
+        counts['total'] = sum(counts.values())
+        return counts
@@ -0,0 +1,178 @@
+import re
+
+# Every command starts with this prefix; anything else is ordinary chat
+COMMAND_PREFIX = '!'
+
+
+class UsageError(Exception):
+    # Raised by an argument parser when the command was called with bad arguments
+    pass
+
+
+class Command:
+    def __init__(self, name, handler, parse, usage, description, guild_only, defer):
+        self.name = name
+        self.handler = handler
+        self.parse = parse
+        self.usage = usage
+        self.description = description
+        self.guild_only = guild_only
+        # Waits on CTFTime or Discord before answering, so a slash command defers first
+        self.defer = defer
+
+    @property
+    def signature(self):
+        return f"{self.name} {self.usage}" if self.usage else self.name
+
+
+class CommandRegistry:
+    # Maps a command name straight to its handler, so dispatch is one split and
+    # one dict lookup no matter how many commands exist.
+    def __init__(self, prefix=COMMAND_PREFIX):
+        self.prefix = prefix
+        self._commands = {}
+
+    def __iter__(self):
+        return iter(self._commands.values())
+
+    def __contains__(self, name):
+        return name in self._commands
+
+    def command(self, name, usage='', description=None, parse=None, guild_only=False, defer=False):
+        def register(handler):
+            self._commands[name] = Command(name, handler, parse or no_args, usage, description, guild_only, defer)
+            return handler
+        return register
+
+    def get(self, name):
+        return self._commands[name]
+
+    def resolve(self, content):
+        # Returns (command, argument string), or None for anything that isn't a known command
+        if not content.startswith(self.prefix):
+            return None
+        parts = content.split(maxsplit=1)
+        if not parts:
+            return None
+        command = self._commands.get(parts[0])
+        if command is None:
+            return None
+        return command, parts[1] if len(parts) > 1 else ''
+
+
+# Argument parsers: each takes the text after the command name and returns a
+# tuple of positional arguments for the handler, or raises UsageError.
+
+# One argument: "double quoted" (straight or the curly quotes phones type) to keep spaces, or a single word
+ARGUMENT = re.compile(r'"([^"]*)"|“([^”]*)”|(\S+)')
+
+
+def unquote(text):
+    # '"My CTF"' -> 'My CTF'; anything else is returned as is
+    match = ARGUMENT.fullmatch(text)
+    if match is None:
+        return text
+    return next(group for group in match.groups() if group is not None)
+
+
+def first_arg(rest):
+    # '"My CTF" pwn 1' -> ('My CTF', 'pwn 1'); (None, '') when there are no arguments
+    match = ARGUMENT.search(rest)
+    if match is None:
+        return None, ''
+    return next(group for group in match.groups() if group is not None), rest[match.end():].strip()
+
+
+def no_args(rest):
+    return ()
+
+
+def text_arg(rest):
+    # The whole remainder as one name, e.g. a CTF name with spaces, quoted or not
+    text = unquote(' '.join(rest.split()))
+    if not text:
+        raise UsageError()
+    return (text,)
+
+
+def ctf_and_challenge_args(rest):
+    # <ctf_name> <challenge_name>; the challenge name may contain spaces, and
+    # so may the CTF name if it's quoted: '"My CTF" pwn 1'
+    ctf_name, challenge_name = first_arg(rest)
+    challenge_name = unquote(challenge_name)
+    if not ctf_name or not challenge_name:
+        raise UsageError()
+    return ctf_name, challenge_name
+
+
+def int_arg(rest):
+    try:
+        return (int(rest.split()[0]),)
+    except (IndexError, ValueError):
+        raise UsageError()
+
+
+def event_arg(rest):
+    # An event id, or an event title (quoted or not) to look up among the synced events
+    event, _ = first_arg(rest)
+    if event is not None and event.isdigit():
+        return (int(event),)
+    title = unquote(' '.join(rest.split()))
+    if not title:
+        raise UsageError()
+    return (title,)
+
+
+def optional_int_arg(default):
+    # A count or year, at least 1, or `default` when it's left out
+    def parse(rest):
+        if not rest.split():
+            return (default,)
+        value, = int_arg(rest)
+        if value < 1:
+            raise UsageError()
+        return (value,)
+    return parse
+
+
+DURATION_PART = re.compile(r'(\d+)([dhm])')
+DURATION_UNITS = {'d': 86400, 'h': 3600, 'm': 60}
+
+
+def parse_duration(text):
+    # "1h30m" -> 5400, "2d" -> 172800, a bare number is minutes
+    text = text.lower()
+    if text.isdigit():
+        return int(text) * 60
+    parts = DURATION_PART.findall(text)
+    if not parts or ''.join(count + unit for count, unit in parts) != text:
+        raise UsageError()
+    return sum(int(count) * DURATION_UNITS[unit] for count, unit in parts)
+
+
+def parse_offsets(text, default_offsets, max_offsets):
+    # "1d 1h 15m" or "1d,1h" -> (86400, 3600, 900), longest first
+    offsets = sorted({parse_duration(part) for part in text.replace(',', ' ').split()}, reverse=True)
+    if len(offsets) > max_offsets or 0 in offsets:
+        raise UsageError()
+    return tuple(offsets) or default_offsets
+
+
+def event_and_offsets_args(default_offsets, max_offsets):
+    # <event_id or "title"> [offsets], offsets separated by spaces or commas, e.g. "1d 1h 15m"
+    def parse(rest):
+        event, rest = first_arg(rest)
+        if not event:
+            raise UsageError()
+        if event.isdigit():
+            event = int(event)
+        return event, parse_offsets(rest, default_offsets, max_offsets)
+    return parse
+
+
+def country_code_arg(rest):
+    # A two-letter ISO country code, e.g. "pl"
+    parts = rest.split()
+    if len(parts) != 1 or len(parts[0]) != 2 or not parts[0].isalpha():
+        raise UsageError()
+    return (parts[0].lower(),)
@@ -0,0 +1,285 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+import aiohttp
+from metrics import endpoint_label
+
+log = logging.getLogger(__name__)
+
+# Defaults for talking to the CTFTime API
+DEFAULT_TIMEOUT = 10          # seconds allowed for a single request
+MAX_CONCURRENCY = 8           # requests allowed in flight at once
+MAX_CONNECTIONS = 16          # size of the keep-alive connection pool
+KEEPALIVE_TIMEOUT = 30        # seconds an idle pooled connection is kept open
+CACHE_MAX_ENTRIES = 512       # responses kept in memory before LRU eviction
+WARM_STALE_GRACE = 3600       # seconds a response loaded at startup may be served stale
+
+
+def cache_key(url, params=None):
+    # Key responses by endpoint plus a stable ordering of the query parameters
+    if not params:
+        return url
+    return url + '?' + '&'.join(f'{k}={v}' for k, v in sorted(params.items()))
+
+
+class ResponseCache:
+    # Bounded LRU of decoded JSON responses. Each entry has a TTL after which it
+    # is stale, and a further stale window during which it may still be served
+    # while a background refresh runs. Entries that came with an ETag or
+    # Last-Modified header outlive the stale window (until evicted) so they can
+    # be revalidated with a conditional request instead of downloaded again.
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key):
+        # Returns (value, is_fresh), or None when there is nothing usable
+        entry = self._entries.get(key)
+        now = time.monotonic()
+        if entry is None:
+            self.misses += 1
+            return None
+        value, fresh_until, stale_until, etag, last_modified = entry
+        if now > stale_until:
+            if etag is None and last_modified is None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        if now <= fresh_until:
+            self.hits += 1
+            return value, True
+        self.stale_hits += 1
+        return value, False
+
+    def validators(self, key):
+        # (value, etag, last_modified) of a cached response that can be
+        # revalidated, however old it is; None otherwise
+        entry = self._entries.get(key)
+        if entry is None or (entry[3] is None and entry[4] is None):
+            return None
+        return entry[0], entry[3], entry[4]
+
+    def set(self, key, value, ttl, stale_ttl=0, etag=None, last_modified=None):
+        now = time.monotonic()
+        self._entries[key] = (value, now + ttl, now + ttl + stale_ttl, etag, last_modified)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, key=None):
+        if key is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(key, None)
+
+    def stats(self):
+        lookups = self.hits + self.stale_hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'hits': self.hits,
+            'stale_hits': self.stale_hits,
+            'misses': self.misses,
+            'hit_ratio': (self.hits + self.stale_hits) / lookups if lookups else 0.0,
+        }
+
+
+class CTFTimeClient:
+    # One shared aiohttp session for the whole bot so every fetch reuses the
+    # same keep-alive pool instead of opening a new connection per command.
+    # Responses fetched with persist=True are also kept in `store` (a
+    # storage.ResponseStore), which backs the in-memory cache across restarts.
+    # With `metrics` (a metrics.Metrics) every upstream request is counted and
+    # timed per endpoint.
+    def __init__(self, headers=None, timeout=DEFAULT_TIMEOUT, max_concurrency=MAX_CONCURRENCY,
+                 max_connections=MAX_CONNECTIONS, cache=None, store=None, metrics=None):
+        self.headers = dict(headers or {})
+        self.cache = cache if cache is not None else ResponseCache()
+        self.store = store
+        self.metrics = metrics
+        self._refreshing = {}
+        self._inflight = {}
+        self.upstream_requests = 0
+        self.coalesced_requests = 0
+        self.not_modified = 0
+        self.store_hits = 0
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.max_connections = max_connections
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._session = None
+
+    def _get_session(self):
+        # The session has to be created from inside the running event loop
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.max_connections,
+                keepalive_timeout=KEEPALIVE_TIMEOUT,
+                ttl_dns_cache=300,
+            )
+            self._session = aiohttp.ClientSession(
+                headers=self.headers,
+                timeout=self.timeout,
+                connector=connector,
+            )
+        return self._session
+
+    async def get_json(self, url, params=None, timeout=None, ttl=None, stale_ttl=0, persist=False):
+        # Without a TTL the response is never cached
+        if not ttl:
+            value, _, _ = await self._fetch_shared(url, params, timeout)
+            return value
+
+        key = cache_key(url, params)
+        persist = persist and self.store is not None
+        cached = self.cache.get(key)
+        if cached is None and persist and self.cache.validators(key) is None:
+            cached = await self._load_stored(key)
+        if cached is not None:
+            value, is_fresh = cached
+            if not is_fresh:
+                # Serve the stale copy now and refresh it in the background
+                self._schedule_refresh(key, url, params, timeout, ttl, stale_ttl, persist)
+            return value
+
+        return await self._refresh(key, url, params, timeout, ttl, stale_ttl, persist)
+
+    async def warm(self, limit=None, grace=WARM_STALE_GRACE):
+        # Load the most recently stored responses into memory so the first
+        # requests after a restart are answered without waiting on CTFTime.
+        # Each may be served stale for at least `grace` seconds, which
+        # triggers a background refresh on first use.
+        if self.store is None:
+            return 0
+        rows = await self.store.load_recent(limit or self.cache.max_entries)
+        now = time.time()
+        # Oldest first, so the newest end up most recently used
+        for key, value, expires, stale_until, etag, last_modified in reversed(rows):
+            if key not in self.cache:
+                stale_until = max(stale_until, now + grace)
+                self.cache.set(key, value, expires - now, stale_until - expires, etag, last_modified)
+        return len(rows)
+
+    async def _load_stored(self, key):
+        # Pull a persisted response into the memory cache, keeping its expiry
+        stored = await self.store.get(key)
+        if key in self.cache:
+            # A concurrent fetch filled it while the store was being read
+            return self.cache.get(key)
+        if stored is None:
+            return None
+        value, expires, stale_until, etag, last_modified = stored
+        now = time.time()
+        self.cache.set(key, value, expires - now, stale_until - expires, etag, last_modified)
+        cached = self.cache.get(key)
+        if cached is not None:
+            self.store_hits += 1
+        return cached
+
+    async def _refresh(self, key, url, params, timeout, ttl, stale_ttl, persist):
+        # Revalidate with the cached copy's ETag/Last-Modified when there is one
+        value, etag, last_modified = await self._fetch_shared(url, params, timeout, self.cache.validators(key))
+        self.cache.set(key, value, ttl, stale_ttl, etag, last_modified)
+        if persist:
+            self.store.put(key, value, ttl, stale_ttl, etag, last_modified)
+        return value
+
+    def _schedule_refresh(self, key, url, params, timeout, ttl, stale_ttl, persist=False):
+        if key in self._refreshing:
+            return
+
+        async def refresh():
+            try:
+                await self._refresh(key, url, params, timeout, ttl, stale_ttl, persist)
+            except Exception as e:
+                log.warning("Background refresh of %s failed: %s", key, e)
+            finally:
+                self._refreshing.pop(key, None)
+
+        self._refreshing[key] = asyncio.get_running_loop().create_task(refresh())
+
+    async def _fetch_shared(self, url, params=None, timeout=None, cached=None):
+        # Single-flight: concurrent callers for the same URL share one upstream
+        # request and all receive its result or its error.
+        key = cache_key(url, params)
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.get_running_loop().create_task(self._fetch_json(url, params, timeout, cached))
+            self._inflight[key] = task
+
+            def forget(done, key=key):
+                if self._inflight.get(key) is done:
+                    del self._inflight[key]
+
+            task.add_done_callback(forget)
+        else:
+            self.coalesced_requests += 1
+        # Shield so one caller being cancelled doesn't cancel it for the others
+        return await asyncio.shield(task)
+
+    async def _fetch_json(self, url, params=None, timeout=None, cached=None):
+        # Returns (value, etag, last_modified). `cached` is a previous
+        # (value, etag, last_modified) to revalidate instead of re-downloading.
+        self.upstream_requests += 1
+        session = self._get_session()
+        kwargs = {'params': params}
+        if timeout is not None:
+            # Per-request override of the session-wide timeout
+            kwargs['timeout'] = aiohttp.ClientTimeout(total=timeout)
+        if cached is not None:
+            conditional = {}
+            if cached[1]:
+                conditional['If-None-Match'] = cached[1]
+            if cached[2]:
+                conditional['If-Modified-Since'] = cached[2]
+            kwargs['headers'] = conditional
+        # Bound the number of requests hitting CTFTime at the same time
+        async with self._semaphore:
+            started = time.perf_counter()
+            outcome = 'error'
+            try:
+                async with session.get(url, **kwargs) as response:
+                    etag = response.headers.get('ETag')
+                    last_modified = response.headers.get('Last-Modified')
+                    if response.status == 304 and cached is not None:
+                        self.not_modified += 1
+                        outcome = 'not_modified'
+                        return cached[0], etag or cached[1], last_modified or cached[2]
+                    response.raise_for_status()
+                    # CTFTime doesn't always send application/json, so don't check it
+                    value = await response.json(content_type=None)
+                    outcome = 'ok'
+                    return value, etag, last_modified
+            finally:
+                if self.metrics is not None:
+                    endpoint = endpoint_label(url)
+                    self.metrics.observe('ctftime_request_seconds', time.perf_counter() - started, endpoint=endpoint)
+                    self.metrics.inc('ctftime_requests_total', endpoint=endpoint, outcome=outcome)
+
+    def stats(self):
+        return {
+            'upstream_requests': self.upstream_requests,
+            'coalesced_requests': self.coalesced_requests,
+            'not_modified': self.not_modified,
+            'store_hits': self.store_hits,
+        }
+
+    async def close(self):
+        for task in list(self._refreshing.values()) + list(self._inflight.values()):
+            task.cancel()
+        self._refreshing.clear()
+        self._inflight.clear()
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        if self.store is not None:
+            await self.store.close()
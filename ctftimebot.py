@@ -1,551 +1,1182 @@
-import discord
-import requests
-import json
-from datetime import datetime, timedelta
-import os
-from dotenv import load_dotenv
-
-# Load environment variables
-load_dotenv()
-
-# Define the base URLs for the CTFTime API
-team_base_url = 'https://ctftime.org/api/v1/teams/'
-top_teams_by_country_url = 'https://ctftime.org/api/v1/top-by-country/'
-events_url = 'https://ctftime.org/api/v1/events/'
-top_teams = 'https://ctftime.org/api/v1/top/'
-top_teams_by_year = 'https://ctftime.org/api/v1/top/{year}/'
-specific_event ='https://ctftime.org/api/v1/events/{event_id}/'
-
-# Set the headers to accept JSON responses and include a User-Agent
-headers = {
-    'Accept': 'application/json',
-    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3'
-}
-
-# Define the bot
-intents = discord.Intents.default()
-intents.message_content = True  # Enable the message content intent
-client = discord.Client(intents=intents)
-
-# Dictionary to store custom CTF events and their challenges
-custom_ctfs = {}
-
-# File to store custom CTFs
-CUSTOM_CTFS_FILE = 'custom_ctfs.json'
-
-def save_custom_ctfs():
-    with open(CUSTOM_CTFS_FILE, 'w') as f:
-        json.dump(custom_ctfs, f)
-
-def load_custom_ctfs():
-    global custom_ctfs
-    if os.path.exists(CUSTOM_CTFS_FILE):
-        with open(CUSTOM_CTFS_FILE, 'r') as f:
-            custom_ctfs = json.load(f)
-    else:
-        custom_ctfs = {}
-
-def fetch_team_details(team_id):
-    url = f'{team_base_url}{team_id}/'
-    response = requests.get(url, headers=headers)
-    response.raise_for_status()
-    return response.json()
-
-def fetch_events(limit, start, finish):
-    url = f'{events_url}?limit={limit}&start={start}&finish={finish}'
-    response = requests.get(url, headers=headers)
-    response.raise_for_status()
-    return response.json()
-
-def fetch_upcoming_events(limit=5):
-    url = f'{events_url}?limit={limit}'
-    response = requests.get(url, headers=headers)
-    response.raise_for_status()
-    return response.json()
-
-def fetch_top_teams():
-    url = f'{top_teams}?limit=10'
-    response = requests.get(url, headers=headers)
-    response.raise_for_status()
-    return response.json()
-
-def fetch_top_teams_by_year(year):
-    url = top_teams_by_year.format(year=year)
-    response = requests.get(url, headers=headers)
-    response.raise_for_status()
-    return response.json()
-
-def fetch_specific_event(event_id):
-    url = specific_event.format(event_id=event_id)
-    response = requests.get(url, headers=headers)
-    response.raise_for_status()
-    return response.json()
-
-def fetch_top_teams_by_country(country_code):
-    url = f'{top_teams_by_country_url}{country_code}/'
-    response = requests.get(url, headers=headers)
-    response.raise_for_status()
-    return response.json()
-
-@client.event
-async def on_ready():
-    print(f'We have logged in as {client.user}')
-    load_custom_ctfs()
-
-async def create_ctf_role(guild, ctf_name):
-    # Check if the role already exists
-    role_name = f"CTF: {ctf_name}"
-    role = discord.utils.get(guild.roles, name=role_name)
-    if not role:
-        # Create the role if it doesn't exist
-        role = await guild.create_role(name=role_name, mentionable=True)
-        print(f"Created role: {role_name}")
-    return role
-
-async def assign_ctf_role(member, role):
-    # Assign the role to the user
-    if role not in member.roles:
-        await member.add_roles(role)
-        print(f"Assigned role {role.name} to {member.name}")
-    else:
-        print(f"{member.name} already has the role {role.name}")
-
-async def remove_ctf_role(member, role):
-    # Remove the role from the user
-    if role in member.roles:
-        await member.remove_roles(role)
-        print(f"Removed role {role.name} from {member.name}")
-    else:
-        print(f"{member.name} does not have the role {role.name}")
-
-@client.event
-async def on_message(message):
-    if message.author == client.user:
-        return
-
-    print(f"Received message: {message.content}")
-
-    if message.content.startswith('!help_ctftime'): 
-        embed = discord.Embed(title="CTFTime Bot Help", description="Available commands:", color=0x00ff00)
-        embed.add_field(name="!create_ctf <name>", value="Create a new custom CTF event with the given name.", inline=False)
-        embed.add_field(name="!delete_ctf <ctf_name>", value="Delete a custom CTF event by name.", inline=False)
-        embed.add_field(name="!join_ctf <ctf_name>", value="Join a custom CTF event and get the associated role.", inline=False)
-        embed.add_field(name="!leave_ctf <ctf_name>", value="Leave a CTF and remove the associated role.", inline=False)
-        embed.add_field(name="!add_challenge <ctf_name> <challenge_name>", value="Add a new challenge to a specific CTF.", inline=False)
-        embed.add_field(name="!delete_challenge <ctf_name> <challenge_name>", value="Delete a challenge from a specific CTF.", inline=False)
-        embed.add_field(name="!allocate_challenge <ctf_name> <challenge_name>", value="Allocate a challenge to yourself in a specific CTF.", inline=False)
-        embed.add_field(name="!solve_challenge <ctf_name> <challenge_name>", value="Mark a challenge as solved in a specific CTF.", inline=False)
-        embed.add_field(name="!list_challenges <ctf_name>", value="List all challenges for a specific CTF.", inline=False)
-        embed.add_field(name="!show_ctf <ctf_name>", value="Show details of a specific CTF, including solved and unsolved challenges.", inline=False)
-        embed.add_field(name="!list_ctfs", value="List upcoming CTF events with their IDs.", inline=False)
-        embed.add_field(name="!time_until_start <event_id>", value="Get the time remaining until a specific CTF event starts.", inline=False)
-        embed.add_field(name="!time_left <event_id>", value="Get the remaining time for a specific CTF event.", inline=False)
-        embed.add_field(name="!upcoming <limit>", value="Fetch a specified number of upcoming events (default is 5).", inline=False)
-        await message.channel.send(embed=embed)
-
-    elif message.content.startswith('!create_ctf'):
-        try:
-            ctf_name = ' '.join(message.content.split()[1:])
-            if not ctf_name:
-                await message.channel.send("Usage: !create_ctf <name>")
-                return
-
-            if ctf_name in custom_ctfs:
-                await message.channel.send(f"A CTF with the name '{ctf_name}' already exists.")
-            else:
-                custom_ctfs[ctf_name] = {
-                    'name': ctf_name,
-                    'challenges': {}
-                }
-                save_custom_ctfs()
-
-                # Create a role for the CTF
-                guild = message.guild
-                role = await create_ctf_role(guild, ctf_name)
-                await message.channel.send(f"The Epic CTF '{ctf_name}' has been created. Role '{role.name}' has been created.")
-        except Exception as e:
-            await message.channel.send(f"An error occurred: {e}")
-
-    elif message.content.startswith('!delete_ctf'):
-        try:
-            ctf_name = ' '.join(message.content.split()[1:])
-            if not ctf_name:
-                await message.channel.send("Usage: !delete_ctf <ctf_name>")
-                return
-
-            if ctf_name not in custom_ctfs:
-                await message.channel.send(f"CTF '{ctf_name}' does not exist.")
-            else:
-                # Delete the CTF from the custom_ctfs dictionary
-                del custom_ctfs[ctf_name]
-                save_custom_ctfs()
-
-                # Optionally, delete the associated role
-                guild = message.guild
-                role = discord.utils.get(guild.roles, name=f"CTF: {ctf_name}")
-                if role:
-                    await role.delete()
-                    await message.channel.send(f"CTF '{ctf_name}' and its associated role have been deleted.")
-                else:
-                    await message.channel.send(f"CTF '{ctf_name}' has been deleted, but no associated role was found.")
-        except Exception as e:
-            await message.channel.send(f"An error occurred: {e}")
-
-    elif message.content.startswith('!time_until_start'):
-        try:
-            event_id = int(message.content.split()[1])
-            data = fetch_specific_event(event_id)
-            if not data:
-                await message.channel.send("No data received for the specified event.")
-            else:
-                start_time = datetime.strptime(data['start'], '%Y-%m-%dT%H:%M:%S%z')
-                current_time = datetime.now(start_time.tzinfo)
-                time_until_start = start_time - current_time
-
-                if time_until_start.total_seconds() > 0:
-                    # Convert to Unix epoch time
-                    epoch_time = int(start_time.timestamp())
-
-                    # Convert to human-readable format
-                    days = time_until_start.days
-                    hours, remainder = divmod(time_until_start.seconds, 3600)
-                    minutes, _ = divmod(remainder, 60)
-
-                    # Send the response
-                    await message.channel.send(
-                        f"Time until the event '{data['title']}' starts:\n"
-                        f"- Epoch Time: {epoch_time}\n"
-                        f"- Human-Readable: {days} days, {hours} hours, {minutes} minutes"
-                    )
-                else:
-                    await message.channel.send(f"The event '{data['title']}' has already started.")
-        except Exception as e:
-            await message.channel.send(f"Please provide a valid event ID. An error occurred")
-
-
-    elif message.content.startswith('!join_ctf'):
-        try:
-            ctf_name = ' '.join(message.content.split()[1:])
-            if not ctf_name:
-                await message.channel.send("Usage: !join_ctf <ctf_name>")
-                return
-
-            if ctf_name not in custom_ctfs:
-                await message.channel.send(f"CTF '{ctf_name}' does not exist.")
-            else:
-                # Assign the CTF role to the user
-                guild = message.guild
-                role = discord.utils.get(guild.roles, name=f"CTF: {ctf_name}")
-                if role:
-                    await assign_ctf_role(message.author, role)
-                    await message.channel.send(f"You have joined CTF '{ctf_name}'. Role '{role.name}' has been assigned.")
-                else:
-                    await message.channel.send(f"Role for CTF '{ctf_name}' not found.")
-        except Exception as e:
-            await message.channel.send(f"An error occurred: {e}")
-
-    elif message.content.startswith('!upcoming'):
-        try:
-            limit = int(message.content.split()[1]) if len(message.content.split()) > 1 else 5
-            data = fetch_upcoming_events(limit)
-            if not data:
-                await message.channel.send("No upcoming events received from CTFTime")
-            else:
-                embed = discord.Embed(title="Upcoming CTF Events", color=0x00ff00)
-                for event in data:
-                    start_time = datetime.strptime(event['start'], '%Y-%m-%dT%H:%M:%S%z')
-                    finish_time = datetime.strptime(event['finish'], '%Y-%m-%dT%H:%M:%S%z')
-                    embed.add_field(
-                        name=event['title'],
-                        value=f"ID: {event['id']}\nStart: {start_time}\nFinish: {finish_time}\nURL: {event['url']}",
-                        inline=False
-                    )
-                await message.channel.send(embed=embed)
-        except Exception as e:
-            await message.channel.send(f"An error occurred: {e}")
-
-    elif message.content.startswith('!add_challenge'):
-        try:
-            parts = message.content.split(maxsplit=2)
-            if len(parts) < 3:
-                await message.channel.send("Usage: !add_challenge <ctf_name> <challenge_name>")
-                return
-
-            ctf_name = parts[1]
-            challenge_name = parts[2]
-
-            if ctf_name not in custom_ctfs:
-                await message.channel.send(f"CTF '{ctf_name}' does not exist.")
-            else:
-                if challenge_name in custom_ctfs[ctf_name]['challenges']:
-                    await message.channel.send(f"The challenge '{challenge_name}' already exists in CTF '{ctf_name}'.")
-                else:
-                    custom_ctfs[ctf_name]['challenges'][challenge_name] = {
-                        'user': None,
-                        'solved': False,
-                        'working_on': False
-                    }
-                    save_custom_ctfs()
-                    await message.channel.send(f"The challenge '{challenge_name}' has been added to CTF '{ctf_name}'.")
-        except Exception as e:
-            await message.channel.send(f"An error occurred: {e}")
-
-    elif message.content.startswith('!allocate_challenge'):
-        try:
-            parts = message.content.split(maxsplit=2)
-            if len(parts) < 3:
-                await message.channel.send("Usage: !allocate_challenge <ctf_name> <challenge_name>")
-                return
-
-            ctf_name = parts[1]
-            challenge_name = parts[2]
-
-            if ctf_name not in custom_ctfs:
-                await message.channel.send(f"CTF '{ctf_name}' does not exist.")
-            else:
-                # If the challenge doesn't exist, add it to the CTF
-                if challenge_name not in custom_ctfs[ctf_name]['challenges']:
-                    custom_ctfs[ctf_name]['challenges'][challenge_name] = {
-                        'user': None,
-                        'solved': False,
-                        'working_on': False
-                    }
-                    save_custom_ctfs()
-                    await message.channel.send(f"The challenge '{challenge_name}' has been added to CTF '{ctf_name}'.")
-
-                # Allocate the challenge to the user
-                challenge = custom_ctfs[ctf_name]['challenges'][challenge_name]
-                if challenge['user']:
-                    await message.channel.send(f"The challenge '{challenge_name}' is already allocated to {challenge['user']}.")
-                else:
-                    challenge['user'] = message.author.name
-                    challenge['working_on'] = True
-                    save_custom_ctfs()
-
-                    # Assign the CTF role to the user
-                    guild = message.guild
-                    role = discord.utils.get(guild.roles, name=f"CTF: {ctf_name}")
-                    if role:
-                        await assign_ctf_role(message.author, role)
-                    else:
-                        await message.channel.send(f"Role for CTF '{ctf_name}' not found.")
-
-                    await message.channel.send(f"The challenge '{challenge_name}' in CTF '{ctf_name}' has been allocated to {message.author.name}.")
-        except Exception as e:
-            await message.channel.send(f"An error occurred: {e}")
-
-    elif message.content.startswith('!solve_challenge'):
-        try:
-            parts = message.content.split(maxsplit=2)
-            if len(parts) < 3:
-                await message.channel.send("Usage: !solve_challenge <ctf_name> <challenge_name>")
-                return
-
-            ctf_name = parts[1]
-            challenge_name = parts[2]
-
-            if ctf_name not in custom_ctfs:
-                await message.channel.send(f"CTF '{ctf_name}' does not exist.")
-            else:
-                if challenge_name not in custom_ctfs[ctf_name]['challenges']:
-                    await message.channel.send(f"The challenge '{challenge_name}' does not exist in CTF '{ctf_name}'.")
-                else:
-                    challenge = custom_ctfs[ctf_name]['challenges'][challenge_name]
-                    if challenge['user'] == message.author.name:
-                        challenge['solved'] = True
-                        challenge['working_on'] = False
-                        save_custom_ctfs()
-                        await message.channel.send(f"The challenge '{challenge_name}' in CTF '{ctf_name}' has been marked as solved by {message.author.name}.")
-                    else:
-                        await message.channel.send(f"The challenge '{challenge_name}' is allocated to {challenge['user']}, not you.")
-        except Exception as e:
-            await message.channel.send(f"An error occurred: {e}")
-
-    elif message.content.startswith('!list_challenges'):
-        try:
-            ctf_name = ' '.join(message.content.split()[1:])
-            if not ctf_name:
-                await message.channel.send("Usage: !list_challenges <ctf_name>")
-                return
-
-            if ctf_name not in custom_ctfs:
-                await message.channel.send(f"CTF '{ctf_name}' does not exist.")
-            else:
-                challenges = custom_ctfs[ctf_name]['challenges']
-                if not challenges:
-                    await message.channel.send(f"No challenges have been added to CTF '{ctf_name}' yet.")
-                else:
-                    # Split challenges into pages (25 challenges per page)
-                    challenges_list = list(challenges.items())
-                    pages = [challenges_list[i:i + 25] for i in range(0, len(challenges_list), 25)]
-
-                    for page_num, page in enumerate(pages, start=1):
-                        embed = discord.Embed(title=f"Challenges for CTF '{ctf_name}' (Page {page_num}/{len(pages)})", color=0x00ff00)
-                        for challenge_name, details in page:
-                            status = "Solved" if details['solved'] else "Unsolved"
-                            working_on = f"Working on it: {details['user']}" if details['working_on'] else "Not being worked on"
-                            solved_by = f"Solved by: {details['user']}" if details['solved'] else "Not solved yet"
-                            embed.add_field(
-                                name=challenge_name,
-                                value=f"Status: {status}\n{working_on}\n{solved_by}",
-                                inline=False
-                            )
-                        await message.channel.send(embed=embed)
-        except Exception as e:
-            await message.channel.send(f"An error occurred: {e}")
-
-    elif message.content.startswith('!show_ctf'):
-        try:
-            ctf_name = ' '.join(message.content.split()[1:])
-            if not ctf_name:
-                await message.channel.send("Usage: !show_ctf <ctf_name>")
-                return
-
-            if ctf_name not in custom_ctfs:
-                await message.channel.send(f"CTF '{ctf_name}' does not exist.")
-            else:
-                ctf = custom_ctfs[ctf_name]
-                challenges = ctf['challenges']
-
-                # Create an embed to display CTF details
-                embed = discord.Embed(title=f"CTF: {ctf_name}", color=0x00ff00)
-
-                # Add challenges and their solve status
-                if not challenges:
-                    embed.add_field(name="Challenges", value="No challenges have been added to this CTF yet.", inline=False)
-                else:
-                    solved_challenges = []
-                    unsolved_challenges = []
-
-                    for challenge_name, details in challenges.items():
-                        status = "Solved" if details['solved'] else "Unsolved"
-                        working_on = f"Working on it: {details['user']}" if details['working_on'] else "Not being worked on"
-                        solved_by = f"Solved by: {details['user']}" if details['solved'] else "Not solved yet"
-                        challenge_info = f"Status: {status}\n{working_on}\n{solved_by}"
-
-                        if details['solved']:
-                            solved_challenges.append(f"**{challenge_name}**\n{challenge_info}")
-                        else:
-                            unsolved_challenges.append(f"**{challenge_name}**\n{challenge_info}")
-
-                    if solved_challenges:
-                        embed.add_field(name="Solved Challenges", value="\n\n".join(solved_challenges), inline=False)
-                    if unsolved_challenges:
-                        embed.add_field(name="Unsolved Challenges", value="\n\n".join(unsolved_challenges), inline=False)
-
-                await message.channel.send(embed=embed)
-        except Exception as e:
-            await message.channel.send(f"An error occurred: {e}")
-
-    elif message.content.startswith('!delete_challenge'):
-        try:
-            parts = message.content.split(maxsplit=2)
-            if len(parts) < 3:
-                await message.channel.send("Usage: !delete_challenge <ctf_name> <challenge_name>")
-                return
-
-            ctf_name = parts[1]
-            challenge_name = parts[2]
-
-            if ctf_name not in custom_ctfs:
-                await message.channel.send(f"CTF '{ctf_name}' does not exist.")
-            else:
-                if challenge_name not in custom_ctfs[ctf_name]['challenges']:
-                    await message.channel.send(f"The challenge '{challenge_name}' does not exist in CTF '{ctf_name}'.")
-                else:
-                    challenge = custom_ctfs[ctf_name]['challenges'][challenge_name]
-                    # Check if the user is the one who allocated the challenge
-                    if challenge['user'] == message.author.name:
-                        del custom_ctfs[ctf_name]['challenges'][challenge_name]
-                        save_custom_ctfs()
-                        await message.channel.send(f"The challenge '{challenge_name}' has been deleted from CTF '{ctf_name}'.")
-                    else:
-                        await message.channel.send(f"You cannot delete the challenge '{challenge_name}' because it is allocated to {challenge['user']}.")
-        except Exception as e:
-            await message.channel.send(f"An error occurred: {e}")
-
-    elif message.content.startswith('!time_left'):
-        try:
-            event_id = int(message.content.split()[1])
-            data = fetch_specific_event(event_id)
-            if not data:
-                await message.channel.send("No data received from CTFTime")
-            else:
-                finish_time = datetime.strptime(data['finish'], '%Y-%m-%dT%H:%M:%S%z')
-                current_time = datetime.now(finish_time.tzinfo)
-                time_left = finish_time - current_time
-                if time_left.total_seconds() > 0:
-                    await message.channel.send(f"Time left for the event '{data['title']}': {time_left}")
-                else:
-                    await message.channel.send(f"The event '{data['title']}' has already ended.")
-        except Exception as e:
-            await message.channel.send(f"An error occurred: {e}")
-
-    elif message.content.startswith('!list_ctfs'):
-        try:
-            limit = int(message.content.split()[1]) if len(message.content.split()) > 1 else 5
-            data = fetch_upcoming_events(limit)
-            if not data:
-                await message.channel.send("No upcoming events received from CTFTime")
-            else:
-                embeds = []
-                embed = discord.Embed(title="Upcoming CTF Events", color=0x00ff00)
-                for i, event in enumerate(data):
-                    if i > 0 and i % 25 == 0:
-                        embeds.append(embed)
-                        embed = discord.Embed(title="Upcoming CTF Events (cont.)", color=0x00ff00)
-                    embed.add_field(name=event['title'], value=f"ID: {event['id']}\nStart: {event['start']}\nFinish: {event['finish']}\nURL: {event['url']}", inline=False)
-                embeds.append(embed)
-                for embed in embeds:
-                    await message.channel.send(embed=embed)
-        except Exception as e:
-            await message.channel.send(f"An error occurred: {e}")
-
-    elif message.content.startswith('!current_ctfs'):
-        try:
-            limit = int(message.content.split()[1]) if len(message.content.split()) > 1 else 5
-            data = fetch_upcoming_events(limit)
-            if not data:
-                await message.channel.send("No upcoming events received from CTFTime")
-            else:
-                current_time = datetime.now()
-                embeds = []
-                embed = discord.Embed(title="Currently Ongoing CTF Events", color=0x00ff00)
-                ongoing_events = [event for event in data if datetime.strptime(event['start'], '%Y-%m-%dT%H:%M:%S%z') <= current_time <= datetime.strptime(event['finish'], '%Y-%m-%dT%H:%M:%S%z')]
-                if ongoing_events:
-                    for i, event in enumerate(ongoing_events):
-                        if i > 0 and i % 25 == 0:
-                            embeds.append(embed)
-                            embed = discord.Embed(title="Currently Ongoing CTF Events (cont.)", color=0x00ff00)
-                        embed.add_field(name=event['title'], value=f"ID: {event['id']}\nStart: {event['start']}\nFinish: {event['finish']}\nURL: {event['url']}", inline=False)
-                else:
-                    embed.add_field(name="No ongoing events", value="There are no CTF events currently ongoing.", inline=False)
-                embeds.append(embed)
-                for embed in embeds:
-                    await message.channel.send(embed=embed)
-        except Exception as e:
-            await message.channel.send(f"An error occurred: {e}")
-
-    elif message.content.startswith('!leave_ctf'):
-        try:
-            ctf_name = ' '.join(message.content.split()[1:])
-            if not ctf_name:
-                await message.channel.send("Usage: !leave_ctf <ctf_name>")
-                return
-
-            if ctf_name not in custom_ctfs:
-                await message.channel.send(f"CTF '{ctf_name}' does not exist.")
-            else:
-                # Remove the CTF role from the user
-                guild = message.guild
-                role = discord.utils.get(guild.roles, name=f"CTF: {ctf_name}")
-                if role:
-                    await remove_ctf_role(message.author, role)
-                    await message.channel.send(f"You have left CTF '{ctf_name}'. Role '{role.name}' has been removed.")
-                else:
-                    await message.channel.send(f"Role for CTF '{ctf_name}' not found.")
-        except Exception as e:
-            await message.channel.send(f"An error occurred: {e}")
-
-# Run the bot the safe way
-client.run(os.getenv('DISCORD_BOT_TOKEN'))
+import asyncio
+import json
+import logging
+import time
+from contextlib import aclosing
+import discord
+from discord import app_commands
+from datetime import datetime, timedelta
+import os
+from dotenv import load_dotenv
+from ctftime_client import CTFTimeClient
+from metrics import Metrics, LogCounter, format_latency
+from event_index import EventIndex
+from event_stream import stream_events
+from guilds import GuildRegistry
+from challenges import new_challenge, claim_challenge, solve_challenge, UNCLAIMED, WORKING, SOLVED
+from models import CustomCTF, Event
+from roles import RoleIndex
+from rankings import Rankings, country_flag
+from reminders import ReminderScheduler, DEFAULT_OFFSETS, MAX_OFFSETS, START, format_offset
+from storage import ReminderStore, ResponseStore
+from outbox import Outbox, field_embeds
+from interactions import InteractionMessage, choice, DESCRIPTION_LIMIT, MAX_CHOICES
+from scoreboard import Scoreboards, chunk_lines, render_fragment
+from commands import CommandRegistry, UsageError, text_arg, ctf_and_challenge_args, int_arg, optional_int_arg, event_arg, event_and_offsets_args, parse_offsets, country_code_arg
+
+# Load environment variables
+load_dotenv()
+
+# LOG_LEVEL=DEBUG also logs every command received
+logging.basicConfig(
+    level=os.getenv('LOG_LEVEL', 'INFO').upper(),
+    format='%(asctime)s %(levelname)s %(name)s: %(message)s',
+)
+log = logging.getLogger('ctftimebot')
+
+# Define the base URLs for the CTFTime API. CTFTIME_API_URL points the bot
+# somewhere else, e.g. the fake CTFTime server of benchmarks/bench_load.py
+ctftime_api_url = os.getenv('CTFTIME_API_URL', 'https://ctftime.org/api/v1/')
+team_base_url = f'{ctftime_api_url}teams/'
+top_teams_by_country_url = f'{ctftime_api_url}top-by-country/'
+events_url = f'{ctftime_api_url}events/'
+top_teams = f'{ctftime_api_url}top/'
+top_teams_by_year = ctftime_api_url + 'top/{year}/'
+specific_event = ctftime_api_url + 'events/{event_id}/'
+
+# Set the headers to accept JSON responses and include a User-Agent
+headers = {
+    'Accept': 'application/json',
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3'
+}
+
+# How long CTFTime responses are cached, in seconds. After 'ttl' a response is stale;
+# for a further 'stale_ttl' it is still served while a background refresh runs.
+# 'persist' responses are also kept on disk, so they survive restarts and are
+# revalidated with ETag/If-Modified-Since instead of downloaded again.
+EVENTS_LIST_CACHE = {'ttl': 300, 'stale_ttl': 900, 'persist': True}
+SPECIFIC_EVENT_CACHE = {'ttl': 60, 'stale_ttl': 600, 'persist': True}
+TOP_TEAMS_CACHE = {'ttl': 3600, 'stale_ttl': 3600, 'persist': True}
+TEAM_DETAILS_CACHE = {'ttl': 3600, 'stale_ttl': 3600, 'persist': True}
+# Teams listed by !top; !top_country shows up to TOP_COUNTRY_LIMIT
+TOP_TEAMS_LIMIT = 10
+TOP_COUNTRY_LIMIT = 25
+
+# Rolling window of CTFTime events kept in memory by the background sync
+EVENT_SYNC_INTERVAL = 600                 # seconds between syncs
+EVENT_SYNC_PAST = 14 * 24 * 3600          # how far back to look for ongoing events
+EVENT_SYNC_AHEAD = 30 * 24 * 3600         # how far ahead to look for upcoming events
+
+# Closest names offered when a CTF, challenge or event title isn't found
+SUGGESTIONS = 3
+
+# Upcoming events beyond the synced window are streamed from CTFTime up to this far ahead
+UPCOMING_HORIZON = 365 * 24 * 3600
+# Most events a single listing command will show, whatever limit it was given
+MAX_EVENTS_PER_COMMAND = 100
+
+# Command latencies, CTFTime request stats and event loop lag, shown by
+# !bot_stats and, if METRICS_PORT is set, served on localhost for Prometheus
+metrics = Metrics()
+METRICS_PORT = os.getenv('METRICS_PORT')
+
+# Shared async CTFTime client (one keep-alive connection pool for every command),
+# with persisted responses kept in a local SQLite file
+CTFTIME_CACHE_DB = 'ctftime_cache.db'
+ctftime = CTFTimeClient(headers=headers, store=ResponseStore(CTFTIME_CACHE_DB), metrics=metrics)
+
+# Local index of synced events for "ongoing", "starting soon" and by-id lookups
+event_index = EventIndex()
+
+class CTFTimeBot(discord.Client):
+    async def setup_hook(self):
+        # Serve CTFTime data from the last run right away; it refreshes in the background
+        warmed = await ctftime.warm()
+        log.info("Loaded %d cached CTFTime responses", warmed)
+        await reminders.load()
+        await sync_commands()
+        self.metrics_runner = None
+        if METRICS_PORT:
+            self.metrics_runner = await metrics.serve('127.0.0.1', int(METRICS_PORT))
+            log.info("Serving metrics on http://127.0.0.1:%s/metrics", METRICS_PORT)
+        # Background work that runs for as long as the bot is up
+        self.background_tasks = [
+            asyncio.create_task(sync_events_forever()),
+            asyncio.create_task(unload_idle_guilds_forever()),
+            asyncio.create_task(reminders.run()),
+            asyncio.create_task(metrics.monitor_loop_lag()),
+        ]
+
+    async def close(self):
+        # Stop background work, write out pending changes and release connections
+        for task in getattr(self, 'background_tasks', []):
+            task.cancel()
+        if getattr(self, 'metrics_runner', None) is not None:
+            await self.metrics_runner.cleanup()
+        rankings.close()
+        await ctftime.close()
+        await guilds.close()
+        await reminders.close()
+        await super().close()
+
+# Every command is also a slash command. The ! commands need the privileged
+# message content intent and have the bot read every message in its servers;
+# PREFIX_COMMANDS=0 turns them off and the bot no longer receives chat at all.
+PREFIX_COMMANDS = os.getenv('PREFIX_COMMANDS', '1') != '0'
+
+# Longest Discord rate limit discord.py sleeps through inside a request (30 s is
+# the least it allows); longer ones raise discord.RateLimited, which the outbox
+# waits out per channel and counts
+DISCORD_MAX_RATELIMIT_WAIT = 30.0
+
+# discord.py doesn't tell the caller about the 429s it sleeps through, but logs
+# each one as a warning starting with this, so they are counted from its log
+# (at LOG_LEVEL=WARNING or below)
+DISCORD_RATE_LIMIT_LOG = 'We are being rate limited.'
+discord_rate_limits = LogCounter(DISCORD_RATE_LIMIT_LOG)
+logging.getLogger('discord.http').addFilter(discord_rate_limits)
+
+# Define the bot
+intents = discord.Intents.default()
+intents.message_content = PREFIX_COMMANDS
+intents.messages = PREFIX_COMMANDS
+client = CTFTimeBot(intents=intents, max_ratelimit_timeout=DISCORD_MAX_RATELIMIT_WAIT)
+tree = app_commands.CommandTree(client)
+
+# The slash commands as last registered with Discord. Registering is rate
+# limited, so it only happens again when they have changed, or with SYNC_COMMANDS=1
+# (e.g. after switching the bot to another application)
+SLASH_COMMANDS_FILE = 'slash_commands.json'
+SYNC_COMMANDS = os.getenv('SYNC_COMMANDS') == '1'
+
+def read_synced_commands():
+    try:
+        with open(SLASH_COMMANDS_FILE, 'r') as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+def write_synced_commands(payload):
+    with open(SLASH_COMMANDS_FILE, 'w') as f:
+        f.write(payload)
+
+async def sync_commands():
+    payload = json.dumps([command.to_dict(tree) for command in tree.get_commands()], sort_keys=True)
+    if not SYNC_COMMANDS and await asyncio.to_thread(read_synced_commands) == payload:
+        log.info("Slash commands unchanged since they were last registered")
+        return
+    try:
+        synced = await tree.sync()
+    except discord.HTTPException as e:
+        log.warning("Registering slash commands failed: %s", e)
+        return
+    await asyncio.to_thread(write_synced_commands, payload)
+    log.info("Registered %d slash commands", len(synced))
+
+# Directory holding one custom CTF database per guild
+CUSTOM_CTFS_DIR = 'custom_ctfs'
+# Pre-sharding storage, moved into the guild set by CUSTOM_CTFS_GUILD_ID (or the
+# only guild the bot is in) the first time that guild is loaded. Until on_ready
+# has settled which guild that is, guild loads wait.
+CUSTOM_CTFS_DB = 'custom_ctfs.db'
+CUSTOM_CTFS_FILE = 'custom_ctfs.json'
+# Guilds without a command for this long are dropped from memory
+GUILD_IDLE_TIMEOUT = 3600
+
+# Most members looked up per username held by a challenge saved before user ids were stored
+LEGACY_MEMBER_QUERY_LIMIT = 5
+
+legacy_guild_id = os.getenv('CUSTOM_CTFS_GUILD_ID')
+
+async def find_legacy_members(guild_id, names):
+    # Challenges saved before user ids were stored hold the claimant's username.
+    # Usernames are unique on Discord, so when the guild is loaded each one goes
+    # to the member who has exactly that username (not a nickname or display
+    # name). Names nobody has any more stay as they are.
+    guild = client.get_guild(guild_id)
+    members = {}
+    if guild is None:
+        return members
+    for name in names:
+        for member in await guild.query_members(query=name, limit=LEGACY_MEMBER_QUERY_LIMIT):
+            if member.name == name:
+                members[name] = member
+    return members
+
+# Custom CTF events and their challenges, partitioned by guild
+guilds = GuildRegistry(
+    CUSTOM_CTFS_DIR,
+    legacy_guild_id=int(legacy_guild_id) if legacy_guild_id else None,
+    legacy_json_path=CUSTOM_CTFS_FILE,
+    legacy_db_path=CUSTOM_CTFS_DB,
+    find_members=find_legacy_members,
+)
+
+# Paced, batched output for responses that span several embeds
+outbox = Outbox()
+
+# Live, pinned per-CTF boards edited in place as challenges change
+scoreboards = Scoreboards(outbox, client.get_channel)
+
+# Role name -> id index per guild, kept current from role gateway events
+role_index = RoleIndex()
+
+async def send_reminder(reminder):
+    channel = client.get_channel(reminder.channel_id)
+    if channel is None:
+        return  # The channel is gone or the bot left the guild
+    event = event_index.get(reminder.event_id)
+    title = event.title if event else reminder.title
+    # Ping the CTF's role if the guild made one for this event
+    guild = client.get_guild(reminder.guild_id)
+    role = role_index.get(guild, f"CTF: {title}") if guild else None
+    mention = f"{role.mention} " if role else ""
+    when = "starts" if reminder.edge == START else "ends"
+    await outbox.send(channel, content=f"{mention}'{title}' {when} <t:{reminder.event_time}:R> (<t:{reminder.event_time}:f>).")
+
+# Scheduled start/end reminders for every guild, kept across restarts
+REMINDERS_DB = 'reminders.db'
+reminders = ReminderScheduler(ReminderStore(REMINDERS_DB), event_index.times, send_reminder)
+
+# Counters the components keep themselves, read when metrics are rendered
+metrics.add_collector('response_cache', ctftime.cache.stats)
+metrics.add_collector('ctftime', ctftime.stats)
+metrics.add_collector('outbox', outbox.stats)
+metrics.add_collector('discord', lambda: {'rate_limited': discord_rate_limits.count})
+metrics.add_collector('bot', lambda: {
+    'guilds_loaded': len(guilds),
+    'events_indexed': len(event_index),
+    'reminders': len(reminders),
+    'event_loop_lag_seconds': metrics.loop_lag,
+})
+
+async def unload_idle_guilds_forever():
+    while True:
+        await asyncio.sleep(GUILD_IDLE_TIMEOUT / 4)
+        try:
+            for guild_id in await guilds.unload_idle(GUILD_IDLE_TIMEOUT):
+                forget_guild(guild_id)
+        except Exception as e:
+            log.warning("Unloading idle guilds failed: %s", e)
+
+async def fetch_team_details(team_id):
+    url = f'{team_base_url}{team_id}/'
+    return await ctftime.get_json(url, **TEAM_DETAILS_CACHE)
+
+async def fetch_events(limit, start, finish):
+    return await ctftime.get_json(events_url, params={'limit': limit, 'start': start, 'finish': finish}, **EVENTS_LIST_CACHE)
+
+async def fetch_top_teams():
+    return await ctftime.get_json(top_teams, params={'limit': TOP_TEAMS_LIMIT}, **TOP_TEAMS_CACHE)
+
+async def fetch_top_teams_by_year(year):
+    url = top_teams_by_year.format(year=year)
+    return await ctftime.get_json(url, params={'limit': TOP_TEAMS_LIMIT}, **TOP_TEAMS_CACHE)
+
+async def fetch_specific_event(event_id):
+    url = specific_event.format(event_id=event_id)
+    return await ctftime.get_json(url, **SPECIFIC_EVENT_CACHE)
+
+async def fetch_top_teams_by_country(country_code):
+    url = f'{top_teams_by_country_url}{country_code}/'
+    return await ctftime.get_json(url, **TOP_TEAMS_CACHE)
+
+# Parsed leaderboards and team profiles on top of the cached responses
+rankings = Rankings(fetch_top_teams, fetch_top_teams_by_year, fetch_top_teams_by_country, fetch_team_details)
+
+async def sync_events():
+    now = int(time.time())
+    # Walked in windows, so a busy month isn't cut off at CTFTime's 100 events per
+    # request; the windows are the same between syncs and restarts, so unchanged
+    # ones are answered from the cache
+    events = [event async for event in stream_events(fetch_events, now - EVENT_SYNC_PAST, now + EVENT_SYNC_AHEAD)]
+    event_index.replace(events)
+    log.info("Synced %d CTFTime events", len(event_index))
+    # Follow events CTFTime has rescheduled since the reminders were set
+    moved = await reminders.reschedule()
+    if moved:
+        log.info("Moved %d reminders to new event times", moved)
+
+async def sync_events_forever():
+    while True:
+        try:
+            await sync_events()
+        except Exception as e:
+            log.warning("Event sync failed: %s", e)
+        await asyncio.sleep(EVENT_SYNC_INTERVAL)
+
+async def get_event(event_id):
+    # Prefer the local index, fall back to CTFTime for events outside the window
+    event = event_index.get(event_id)
+    if event is None:
+        data = await fetch_specific_event(event_id)
+        if data:
+            event = Event.from_data(data)
+            event_index.add(event)
+    return event
+
+def did_you_mean(names, name):
+    # " Did you mean 'x' or 'y'?" with the closest entries of a NameIndex, or ''
+    close = names.similar(name, SUGGESTIONS)
+    if not close:
+        return ''
+    quoted = [f"'{match}'" for match in close]
+    if len(quoted) > 1:
+        quoted[-2:] = [f"{quoted[-2]} or {quoted[-1]}"]
+    return f" Did you mean {', '.join(quoted)}?"
+
+async def find_event(event):
+    # An event by id, or by its title among the synced events; None if there's no such event
+    if isinstance(event, int):
+        return await get_event(event)
+    return event_index.by_title(event)
+
+def unknown_event(event, reply):
+    # `reply` for an unknown id; for a title, the closest synced titles instead
+    if isinstance(event, int):
+        return reply
+    return f"No synced event is titled '{event}'.{did_you_mean(event_index.titles, event)}"
+
+async def get_upcoming_events(limit):
+    # Yields up to `limit` events that haven't started yet, in start order.
+    # Served from the index when it holds enough, otherwise streamed from
+    # CTFTime window by window so the first ones arrive before the last are fetched.
+    if limit <= 0:
+        return
+    if event_index.synced:
+        events = event_index.upcoming(limit)
+        if len(events) >= limit:
+            for event in events:
+                yield event
+            return
+    now = int(time.time())
+    count = 0
+    async with aclosing(stream_events(fetch_events, now, now + UPCOMING_HORIZON)) as events:
+        async for event in events:
+            if event.start_ts < now:
+                continue
+            yield event
+            count += 1
+            if count >= limit:
+                return
+
+async def send_upcoming_events(channel, limit):
+    # Each embed of 25 events is sent as soon as it fills up, while later
+    # events are still being fetched
+    limit = min(limit, MAX_EVENTS_PER_COMMAND)
+    embed = discord.Embed(title="Upcoming CTF Events", color=0x00ff00)
+    sent = 0
+    async with aclosing(get_upcoming_events(limit)) as events:
+        async for event in events:
+            if len(embed.fields) == 25:
+                await outbox.send(channel, embeds=[embed])
+                sent += 1
+                embed = discord.Embed(title="Upcoming CTF Events (cont.)", color=0x00ff00)
+            embed.add_field(name=event.title, value=f"ID: {event.id}\nStart: {event.start}\nFinish: {event.finish}\nURL: {event.url}", inline=False)
+    if embed.fields:
+        await outbox.send(channel, embeds=[embed])
+    elif not sent:
+        await outbox.send(channel, "No upcoming events received from CTFTime")
+
+async def get_ongoing_events():
+    if not event_index.synced:
+        await sync_events()
+    return event_index.ongoing()
+
+@client.event
+async def on_ready():
+    log.info("Logged in as %s", client.user)
+    if guilds.legacy_pending:
+        # Old unsharded data belongs to the only guild, if there is just one
+        if len(client.guilds) == 1:
+            guilds.settle_legacy(client.guilds[0].id)
+        else:
+            log.warning("%s hold custom CTFs from before they were kept per server, but the bot is in %d servers; "
+                        "set CUSTOM_CTFS_GUILD_ID to the server they belong to and restart",
+                        ' and '.join(guilds.legacy_files()), len(client.guilds))
+            guilds.settle_legacy(None)
+    elif guilds.legacy_guild_id is not None and client.get_guild(guilds.legacy_guild_id) is None and guilds.legacy_files():
+        log.warning("CUSTOM_CTFS_GUILD_ID is %s, but the bot isn't in that server; %s stay unused",
+                    guilds.legacy_guild_id, ' and '.join(guilds.legacy_files()))
+
+@client.event
+async def on_guild_role_create(role):
+    role_index.add(role)
+
+@client.event
+async def on_guild_role_update(before, after):
+    role_index.rename(before, after)
+
+@client.event
+async def on_guild_role_delete(role):
+    role_index.remove(role)
+
+def forget_guild(guild_id):
+    # Drop what's kept in memory for a guild besides its GuildState; it is
+    # rebuilt on the guild's next command
+    role_index.forget_guild(guild_id)
+    scoreboards.forget_guild(guild_id)
+
+@client.event
+async def on_guild_remove(guild):
+    forget_guild(guild.id)
+
+def challenge_changed(state, ctf_name, challenge_name):
+    # Persist, re-index and re-render one challenge after it was added, changed or deleted
+    challenge = state.ctfs[ctf_name].challenges.get(challenge_name)
+    if challenge is None:
+        state.store.delete_challenge(ctf_name, challenge_name)
+    else:
+        state.store.put_challenge(ctf_name, challenge_name, challenge)
+    state.challenge_index.update(ctf_name, challenge_name, challenge)
+    scoreboards.changed(state, ctf_name, challenge_name)
+
+def get_ctf_role(guild, state, ctf_name):
+    # The CTF record remembers its role id, which survives role renames
+    ctf = state.ctfs.get(ctf_name)
+    if ctf and ctf.role_id:
+        role = guild.get_role(ctf.role_id)
+        if role:
+            return role
+    role = role_index.get(guild, f"CTF: {ctf_name}")
+    if role and ctf:
+        # Remember the id for CTFs created before role ids were stored
+        ctf.role_id = role.id
+        state.store.put_ctf(ctf_name, ctf)
+    return role
+
+async def create_ctf_role(guild, state, ctf_name):
+    # Check if the role already exists
+    role_name = f"CTF: {ctf_name}"
+    role = get_ctf_role(guild, state, ctf_name)
+    if not role:
+        # Create the role if it doesn't exist
+        role = await guild.create_role(name=role_name, mentionable=True)
+        role_index.add(role)
+        log.info("Created role %s in guild %s", role_name, guild.id)
+        ctf = state.ctfs.get(ctf_name)
+        if ctf:
+            ctf.role_id = role.id
+            state.store.put_ctf(ctf_name, ctf)
+    return role
+
+async def assign_ctf_role(member, role):
+    # Assign the role to the user
+    if role not in member.roles:
+        await member.add_roles(role)
+        log.info("Assigned role %s to %s", role.name, member.name)
+    else:
+        log.debug("%s already has the role %s", member.name, role.name)
+
+async def remove_ctf_role(member, role):
+    # Remove the role from the user
+    if role in member.roles:
+        await member.remove_roles(role)
+        log.info("Removed role %s from %s", role.name, member.name)
+    else:
+        log.debug("%s does not have the role %s", member.name, role.name)
+
+# Registered bot commands, in the order they are listed by !help_ctftime
+commands = CommandRegistry()
+
+@client.event
+async def on_message(message):
+    # Ordinary chat is rejected here with a single prefix check and dict lookup
+    resolved = commands.resolve(message.content)
+    if resolved is None or message.author == client.user:
+        return
+    command, rest = resolved
+
+    # Arguments are passed lazily, so with DEBUG off this costs no formatting or I/O
+    log.debug("command=%s guild=%s channel=%s user=%s", command.name,
+              message.guild.id if message.guild else None, message.channel.id, message.author.id)
+
+    if command.guild_only and message.guild is None:
+        await outbox.send(message.channel, f"{command.name} can only be used in a server.")
+        return
+
+    try:
+        args = command.parse(rest)
+    except UsageError:
+        metrics.inc('commands_total', command=command.name, outcome='usage')
+        await outbox.send(message.channel, f"Usage: {command.signature}")
+        return
+
+    await run_command(command, message, args)
+
+async def run_command(command, message, args):
+    # Shared by ! and slash commands: run the handler, time it and report failures
+    started = time.perf_counter()
+    outcome = 'ok'
+    try:
+        await command.handler(message, *args)
+    except Exception as e:
+        outcome = 'error'
+        log.exception("command=%s failed", command.name)
+        await outbox.send(message.channel, f"An error occurred: {e}")
+    finally:
+        metrics.observe('command_seconds', time.perf_counter() - started, command=command.name)
+        metrics.inc('commands_total', command=command.name, outcome=outcome)
+
+@commands.command('!help_ctftime')
+async def help_ctftime(message):
+    # Continued in further embeds once there are more than 25 commands
+    fields = [(command.signature, command.description) for command in commands if command.description]
+    embeds = field_embeds("CTFTime Bot Help", fields)
+    embeds[0].description = "Available commands:"
+    await outbox.send(message.channel, embeds=embeds)
+
+@commands.command('!create_ctf', '<name>', "Create a new custom CTF event with the given name.",
+                  parse=text_arg, guild_only=True, defer=True)
+async def create_ctf(message, ctf_name):
+    state = await guilds.get(message.guild.id)
+    custom_ctfs = state.ctfs
+
+    # Creating and deleting the same CTF must not interleave
+    async with state.ctf_locks.hold(ctf_name):
+        if ctf_name in custom_ctfs:
+            await outbox.send(message.channel, f"A CTF with the name '{ctf_name}' already exists.")
+        else:
+            custom_ctfs[ctf_name] = CustomCTF(ctf_name)
+            state.store.put_ctf(ctf_name, custom_ctfs[ctf_name])
+            state.ctf_names.add(ctf_name)
+
+            # Create a role for the CTF
+            guild = message.guild
+            role = await create_ctf_role(guild, state, ctf_name)
+            await outbox.send(message.channel, f"The Epic CTF '{ctf_name}' has been created. Role '{role.name}' has been created.")
+
+@commands.command('!delete_ctf', '<ctf_name>', "Delete a custom CTF event by name.",
+                  parse=text_arg, guild_only=True, defer=True)
+async def delete_ctf(message, ctf_name):
+    state = await guilds.get(message.guild.id)
+    custom_ctfs = state.ctfs
+
+    async with state.ctf_locks.hold(ctf_name):
+        if ctf_name not in custom_ctfs:
+            await outbox.send(message.channel, f"CTF '{ctf_name}' does not exist.{did_you_mean(state.ctf_names, ctf_name)}")
+        else:
+            # Find the role while the CTF record still knows its id
+            guild = message.guild
+            role = get_ctf_role(guild, state, ctf_name)
+
+            # Delete the CTF from the custom_ctfs dictionary
+            del custom_ctfs[ctf_name]
+            state.store.delete_ctf(ctf_name)
+            state.ctf_names.remove(ctf_name)
+            # A CTF whose name differs only in case takes its place
+            for other in custom_ctfs:
+                if other not in state.ctf_names:
+                    state.ctf_names.add(other)
+            state.challenge_index.remove_ctf(ctf_name)
+            scoreboards.forget(state, ctf_name)
+
+            # Optionally, delete the associated role
+            if role:
+                await role.delete()
+                await outbox.send(message.channel, f"CTF '{ctf_name}' and its associated role have been deleted.")
+            else:
+                await outbox.send(message.channel, f"CTF '{ctf_name}' has been deleted, but no associated role was found.")
+
+@commands.command('!join_ctf', '<ctf_name>', "Join a custom CTF event and get the associated role.",
+                  parse=text_arg, guild_only=True, defer=True)
+async def join_ctf(message, ctf_name):
+    state = await guilds.get(message.guild.id)
+
+    if ctf_name not in state.ctfs:
+        await outbox.send(message.channel, f"CTF '{ctf_name}' does not exist.{did_you_mean(state.ctf_names, ctf_name)}")
+    else:
+        # Assign the CTF role to the user
+        guild = message.guild
+        role = get_ctf_role(guild, state, ctf_name)
+        if role:
+            await assign_ctf_role(message.author, role)
+            await outbox.send(message.channel, f"You have joined CTF '{ctf_name}'. Role '{role.name}' has been assigned.")
+        else:
+            await outbox.send(message.channel, f"Role for CTF '{ctf_name}' not found.")
+
+@commands.command('!leave_ctf', '<ctf_name>', "Leave a CTF and remove the associated role.",
+                  parse=text_arg, guild_only=True, defer=True)
+async def leave_ctf(message, ctf_name):
+    state = await guilds.get(message.guild.id)
+
+    if ctf_name not in state.ctfs:
+        await outbox.send(message.channel, f"CTF '{ctf_name}' does not exist.{did_you_mean(state.ctf_names, ctf_name)}")
+    else:
+        # Remove the CTF role from the user
+        guild = message.guild
+        role = get_ctf_role(guild, state, ctf_name)
+        if role:
+            await remove_ctf_role(message.author, role)
+            await outbox.send(message.channel, f"You have left CTF '{ctf_name}'. Role '{role.name}' has been removed.")
+        else:
+            await outbox.send(message.channel, f"Role for CTF '{ctf_name}' not found.")
+
+@commands.command('!add_challenge', '<ctf_name> <challenge_name>', "Add a new challenge to a specific CTF.",
+                  parse=ctf_and_challenge_args, guild_only=True)
+async def add_challenge(message, ctf_name, challenge_name):
+    state = await guilds.get(message.guild.id)
+    ctf_name, challenge_name = state.split_ctf_and_challenge(ctf_name, challenge_name)
+    custom_ctfs = state.ctfs
+
+    if ctf_name not in custom_ctfs:
+        await outbox.send(message.channel, f"CTF '{ctf_name}' does not exist.{did_you_mean(state.ctf_names, ctf_name)}")
+    else:
+        if challenge_name in custom_ctfs[ctf_name].challenges:
+            await outbox.send(message.channel, f"The challenge '{challenge_name}' already exists in CTF '{ctf_name}'.")
+        else:
+            custom_ctfs[ctf_name].challenges[challenge_name] = new_challenge()
+            challenge_changed(state, ctf_name, challenge_name)
+            await outbox.send(message.channel, f"The challenge '{challenge_name}' has been added to CTF '{ctf_name}'.")
+
+@commands.command('!delete_challenge', '<ctf_name> <challenge_name>', "Delete a challenge from a specific CTF.",
+                  parse=ctf_and_challenge_args, guild_only=True)
+async def delete_challenge(message, ctf_name, challenge_name):
+    state = await guilds.get(message.guild.id)
+    ctf_name, challenge_name = state.split_ctf_and_challenge(ctf_name, challenge_name)
+    custom_ctfs = state.ctfs
+
+    if ctf_name not in custom_ctfs:
+        await outbox.send(message.channel, f"CTF '{ctf_name}' does not exist.{did_you_mean(state.ctf_names, ctf_name)}")
+    else:
+        if challenge_name not in custom_ctfs[ctf_name].challenges:
+            await outbox.send(message.channel, f"The challenge '{challenge_name}' does not exist in CTF '{ctf_name}'."
+                                               f"{did_you_mean(state.challenge_index.names(ctf_name), challenge_name)}")
+        else:
+            challenge = custom_ctfs[ctf_name].challenges[challenge_name]
+            # Check if the user is the one who allocated the challenge
+            if challenge.user == message.author.id:
+                del custom_ctfs[ctf_name].challenges[challenge_name]
+                challenge_changed(state, ctf_name, challenge_name)
+                await outbox.send(message.channel, f"The challenge '{challenge_name}' has been deleted from CTF '{ctf_name}'.")
+            else:
+                await outbox.send(message.channel, f"You cannot delete the challenge '{challenge_name}' because it is allocated to {state.users.name(challenge.user)}.")
+
+@commands.command('!allocate_challenge', '<ctf_name> <challenge_name>', "Allocate a challenge to yourself in a specific CTF.",
+                  parse=ctf_and_challenge_args, guild_only=True, defer=True)
+async def allocate_challenge(message, ctf_name, challenge_name):
+    state = await guilds.get(message.guild.id)
+    ctf_name, challenge_name = state.split_ctf_and_challenge(ctf_name, challenge_name)
+    custom_ctfs = state.ctfs
+
+    if ctf_name not in custom_ctfs:
+        await outbox.send(message.channel, f"CTF '{ctf_name}' does not exist.{did_you_mean(state.ctf_names, ctf_name)}")
+    else:
+        challenges = custom_ctfs[ctf_name].challenges
+        user_id = state.remember_user(message.author)
+
+        # If the challenge doesn't exist, add it to the CTF
+        added = challenge_name not in challenges
+        if added:
+            challenges[challenge_name] = new_challenge()
+
+        # Claim the challenge before any await, so concurrent claims can't both win
+        claimed, challenge = claim_challenge(challenges, challenge_name, user_id)
+        if added or claimed:
+            challenge_changed(state, ctf_name, challenge_name)
+        if added:
+            await outbox.send(message.channel, f"The challenge '{challenge_name}' has been added to CTF '{ctf_name}'.")
+
+        if not claimed:
+            await outbox.send(message.channel, f"The challenge '{challenge_name}' is already allocated to {state.users.name(challenge.user)}.")
+        else:
+            # Assign the CTF role to the user
+            guild = message.guild
+            role = get_ctf_role(guild, state, ctf_name)
+            if role:
+                await assign_ctf_role(message.author, role)
+            else:
+                await outbox.send(message.channel, f"Role for CTF '{ctf_name}' not found.")
+
+            await outbox.send(message.channel, f"The challenge '{challenge_name}' in CTF '{ctf_name}' has been allocated to {state.users.name(user_id)}.")
+
+@commands.command('!solve_challenge', '<ctf_name> <challenge_name>', "Mark a challenge as solved in a specific CTF.",
+                  parse=ctf_and_challenge_args, guild_only=True)
+async def solve_challenge_command(message, ctf_name, challenge_name):
+    state = await guilds.get(message.guild.id)
+    ctf_name, challenge_name = state.split_ctf_and_challenge(ctf_name, challenge_name)
+    custom_ctfs = state.ctfs
+
+    if ctf_name not in custom_ctfs:
+        await outbox.send(message.channel, f"CTF '{ctf_name}' does not exist.{did_you_mean(state.ctf_names, ctf_name)}")
+    else:
+        challenges = custom_ctfs[ctf_name].challenges
+        user_id = state.remember_user(message.author)
+        solved, challenge = solve_challenge(challenges, challenge_name, user_id)
+        if challenge is None:
+            await outbox.send(message.channel, f"The challenge '{challenge_name}' does not exist in CTF '{ctf_name}'."
+                                               f"{did_you_mean(state.challenge_index.names(ctf_name), challenge_name)}")
+        else:
+            if solved:
+                challenge_changed(state, ctf_name, challenge_name)
+                await outbox.send(message.channel, f"The challenge '{challenge_name}' in CTF '{ctf_name}' has been marked as solved by {state.users.name(user_id)}.")
+            elif challenge.solved:
+                await outbox.send(message.channel, f"The challenge '{challenge_name}' has already been solved by {state.users.name(challenge.user)}.")
+            else:
+                await outbox.send(message.channel, f"The challenge '{challenge_name}' is allocated to {state.users.name(challenge.user)}, not you.")
+
+@commands.command('!list_challenges', '<ctf_name>', "List all challenges for a specific CTF.",
+                  parse=text_arg, guild_only=True)
+async def list_challenges(message, ctf_name):
+    state = await guilds.get(message.guild.id)
+    custom_ctfs = state.ctfs
+
+    if ctf_name not in custom_ctfs:
+        await outbox.send(message.channel, f"CTF '{ctf_name}' does not exist.{did_you_mean(state.ctf_names, ctf_name)}")
+    else:
+        challenges = custom_ctfs[ctf_name].challenges
+        if not challenges:
+            await outbox.send(message.channel, f"No challenges have been added to CTF '{ctf_name}' yet.")
+        else:
+            # Split challenges into pages (25 challenges per page)
+            challenges_list = list(challenges.items())
+            pages = [challenges_list[i:i + 25] for i in range(0, len(challenges_list), 25)]
+
+            embeds = []
+            for page_num, page in enumerate(pages, start=1):
+                embed = discord.Embed(title=f"Challenges for CTF '{ctf_name}' (Page {page_num}/{len(pages)})", color=0x00ff00)
+                for challenge_name, details in page:
+                    user = state.users.name(details.user)
+                    status = "Solved" if details.solved else "Unsolved"
+                    working_on = f"Working on it: {user}" if details.working_on else "Not being worked on"
+                    solved_by = f"Solved by: {user}" if details.solved else "Not solved yet"
+                    embed.add_field(
+                        name=challenge_name,
+                        value=f"Status: {status}\n{working_on}\n{solved_by}",
+                        inline=False
+                    )
+                embeds.append(embed)
+            # Pages go out packed several to a message
+            await outbox.send(message.channel, embeds=embeds)
+
+@commands.command('!show_ctf', '<ctf_name>', "Show the live board for a CTF, including solved and unsolved challenges.",
+                  parse=text_arg, guild_only=True, defer=True)
+async def show_ctf(message, ctf_name):
+    state = await guilds.get(message.guild.id)
+    custom_ctfs = state.ctfs
+
+    if ctf_name not in custom_ctfs:
+        await outbox.send(message.channel, f"CTF '{ctf_name}' does not exist.{did_you_mean(state.ctf_names, ctf_name)}")
+    else:
+        # Reuse the live board if this channel already has one, otherwise post it here
+        board = custom_ctfs[ctf_name].board
+        if board and board[0] == message.channel.id:
+            board_message = scoreboards.board_message(state, ctf_name)
+            await scoreboards.refresh(state, ctf_name)
+            if board_message is not None and custom_ctfs[ctf_name].board:
+                await outbox.send(message.channel, f"Live board for CTF '{ctf_name}': {board_message.jump_url}")
+                return
+        # Posted as a regular message even for a slash command, so it can be edited for the whole CTF
+        await scoreboards.post(state, ctf_name, getattr(message.channel, 'target', message.channel))
+
+@commands.command('!my_challenges', '', "List the challenges you are working on or have solved.",
+                  guild_only=True)
+async def my_challenges(message):
+    state = await guilds.get(message.guild.id)
+    user_id = state.remember_user(message.author)
+    held = state.challenge_index.for_user(user_id)
+    if not held:
+        await outbox.send(message.channel, "You haven't claimed any challenges yet.")
+        return
+
+    working = [f"**{challenge_name}** ({ctf_name})" for ctf_name, challenge_name, status in held if status is WORKING]
+    solved = [f"**{challenge_name}** ({ctf_name})" for ctf_name, challenge_name, status in held if status is SOLVED]
+    fields = [(f"Working on ({len(working)})", chunk) for chunk in chunk_lines(working)]
+    fields += [(f"Solved ({len(solved)})", chunk) for chunk in chunk_lines(solved)]
+    await outbox.send(message.channel, embeds=field_embeds(f"Challenges for {state.users.name(user_id)}", fields))
+
+@commands.command('!unsolved', '<ctf_name>', "List the challenges in a CTF that haven't been solved yet.",
+                  parse=text_arg, guild_only=True)
+async def unsolved(message, ctf_name):
+    state = await guilds.get(message.guild.id)
+    if ctf_name not in state.ctfs:
+        await outbox.send(message.channel, f"CTF '{ctf_name}' does not exist.{did_you_mean(state.ctf_names, ctf_name)}")
+        return
+
+    challenges = state.ctfs[ctf_name].challenges
+    names = state.challenge_index.with_status(ctf_name, UNCLAIMED, WORKING)
+    if not names:
+        await outbox.send(message.channel, f"Every challenge in CTF '{ctf_name}' has been solved.")
+        return
+
+    lines = [render_fragment(challenge_name, challenges[challenge_name], state.users) for challenge_name in names]
+    fields = [("Challenges", chunk) for chunk in chunk_lines(lines)]
+    await outbox.send(message.channel, embeds=field_embeds(f"Unsolved challenges in CTF '{ctf_name}' ({len(names)})", fields))
+
+@commands.command('!ctf_stats', '<ctf_name>', "Show how many challenges in a CTF are unclaimed, in progress and solved.",
+                  parse=text_arg, guild_only=True)
+async def ctf_stats(message, ctf_name):
+    state = await guilds.get(message.guild.id)
+    if ctf_name not in state.ctfs:
+        await outbox.send(message.channel, f"CTF '{ctf_name}' does not exist.{did_you_mean(state.ctf_names, ctf_name)}")
+        return
+
+    counts = state.challenge_index.counts(ctf_name)
+    await outbox.send(
+        message.channel,
+        f"CTF '{ctf_name}': {counts[SOLVED]}/{counts['total']} solved, "
+        f"{counts[WORKING]} being worked on, {counts[UNCLAIMED]} unclaimed."
+    )
+
+@commands.command('!list_ctfs', '<limit>', "List upcoming CTF events with their IDs.",
+                  parse=optional_int_arg(5), defer=True)
+async def list_ctfs(message, limit):
+    await send_upcoming_events(message.channel, limit)
+
+@commands.command('!current_ctfs', '<limit>', "List CTF events that are currently running.",
+                  parse=optional_int_arg(None), defer=True)
+async def current_ctfs(message, limit):
+    ongoing_events = await get_ongoing_events()
+    if limit is not None:
+        ongoing_events = ongoing_events[:limit]
+    embeds = []
+    embed = discord.Embed(title="Currently Ongoing CTF Events", color=0x00ff00)
+    if ongoing_events:
+        for i, event in enumerate(ongoing_events):
+            if i > 0 and i % 25 == 0:
+                embeds.append(embed)
+                embed = discord.Embed(title="Currently Ongoing CTF Events (cont.)", color=0x00ff00)
+            embed.add_field(name=event.title, value=f"ID: {event.id}\nStart: {event.start}\nFinish: {event.finish}\nURL: {event.url}", inline=False)
+    else:
+        embed.add_field(name="No ongoing events", value="There are no CTF events currently ongoing.", inline=False)
+    embeds.append(embed)
+    await outbox.send(message.channel, embeds=embeds)
+
+@commands.command('!time_until_start', '<event_id or title>', "Get the time remaining until a specific CTF event starts.",
+                  parse=event_arg, defer=True)
+async def time_until_start(message, event):
+    data = await find_event(event)
+    if not data:
+        await outbox.send(message.channel, unknown_event(event, "No data received for the specified event."))
+    else:
+        current_time = datetime.now(data.start.tzinfo)
+        time_until_start = data.start - current_time
+
+        if time_until_start.total_seconds() > 0:
+            # Unix epoch time
+            epoch_time = data.start_ts
+
+            # Convert to human-readable format
+            days = time_until_start.days
+            hours, remainder = divmod(time_until_start.seconds, 3600)
+            minutes, _ = divmod(remainder, 60)
+
+            # Send the response
+            await outbox.send(
+                message.channel,
+                f"Time until the event '{data.title}' starts:\n"
+                f"- Epoch Time: {epoch_time}\n"
+                f"- Human-Readable: {days} days, {hours} hours, {minutes} minutes"
+            )
+        else:
+            await outbox.send(message.channel, f"The event '{data.title}' has already started.")
+
+@commands.command('!time_left', '<event_id or title>', "Get the remaining time for a specific CTF event.",
+                  parse=event_arg, defer=True)
+async def time_left(message, event):
+    data = await find_event(event)
+    if not data:
+        await outbox.send(message.channel, unknown_event(event, "No data received from CTFTime"))
+    else:
+        current_time = datetime.now(data.finish.tzinfo)
+        time_left = data.finish - current_time
+        if time_left.total_seconds() > 0:
+            await outbox.send(message.channel, f"Time left for the event '{data.title}': {time_left}")
+        else:
+            await outbox.send(message.channel, f"The event '{data.title}' has already ended.")
+
+@commands.command('!remind', '<event_id or "title"> [offsets]',
+                  "Ping this channel before an event starts and ends, e.g. `!remind 1234 1d 1h 15m` (default 1h 15m).",
+                  parse=event_and_offsets_args(DEFAULT_OFFSETS, MAX_OFFSETS), guild_only=True, defer=True)
+async def remind(message, event, offsets):
+    data = await find_event(event)
+    if not data:
+        await outbox.send(message.channel, unknown_event(event, "No data received for the specified event."))
+        return
+
+    added = await reminders.schedule(message.guild.id, message.channel.id, data.id, data.title,
+                                     data.start_ts, data.finish_ts, offsets)
+    if not added:
+        await outbox.send(message.channel, f"No new reminders for '{data.title}': they are already set here or their time has passed.")
+    else:
+        before = ', '.join(format_offset(offset) for offset in offsets)
+        await outbox.send(message.channel, f"Set {len(added)} reminders for '{data.title}', {before} before it starts and ends.")
+
+@commands.command('!unremind', '<event_id>', "Cancel this channel's reminders for an event.",
+                  parse=int_arg, guild_only=True)
+async def unremind(message, event_id):
+    cancelled = await reminders.cancel(message.channel.id, event_id)
+    if cancelled:
+        await outbox.send(message.channel, f"Cancelled {cancelled} reminders for event {event_id}.")
+    else:
+        await outbox.send(message.channel, f"There are no reminders for event {event_id} in this channel.")
+
+@commands.command('!upcoming', '<limit>', "Fetch a specified number of upcoming events (default is 5).",
+                  parse=optional_int_arg(5), defer=True)
+async def upcoming(message, limit):
+    await send_upcoming_events(message.channel, limit)
+
+@commands.command('!top', '[year]', "Show CTFtime's top teams for a year (default is this year).",
+                  parse=optional_int_arg(None), defer=True)
+async def top(message, year):
+    year, teams = await rankings.top(year)
+    if not teams:
+        await outbox.send(message.channel, "No rankings received from CTFTime")
+        return
+
+    # Fetched concurrently; a refreshed leaderboard has already started on them
+    profiles = await rankings.teams(team.team_id for team in teams)
+    lines = []
+    for team in teams:
+        profile = profiles.get(team.team_id)
+        flag = country_flag(profile.country) if profile else ''
+        lines.append(f"**{team.place}.** {team.name} {flag} — {team.points:.2f} points")
+    embed = discord.Embed(title=f"CTFtime Top Teams {year}", description='\n'.join(lines), color=0x00ff00)
+    await outbox.send(message.channel, embeds=[embed])
+
+@commands.command('!top_country', '<country_code>', "Show the top teams of a country, e.g. `!top_country pl`.",
+                  parse=country_code_arg, defer=True)
+async def top_country(message, country_code):
+    teams = await rankings.top_by_country(country_code)
+    if not teams:
+        await outbox.send(message.channel, f"No rankings received from CTFTime for '{country_code.upper()}'.")
+        return
+
+    lines = [f"**{team.place}.** {team.name} — {team.points:.2f} points, {team.events} events (#{team.world_place} worldwide)"
+             for team in teams[:TOP_COUNTRY_LIMIT]]
+    embed = discord.Embed(title=f"Top Teams in {country_flag(country_code)} {country_code.upper()}",
+                          description='\n'.join(lines), color=0x00ff00)
+    if len(teams) > TOP_COUNTRY_LIMIT:
+        embed.set_footer(text=f"...and {len(teams) - TOP_COUNTRY_LIMIT} more teams")
+    await outbox.send(message.channel, embeds=[embed])
+
+@commands.command('!team', '<team_id>', "Show a team's CTFtime profile and current rating.",
+                  parse=int_arg, defer=True)
+async def team(message, team_id):
+    profile = await rankings.team(team_id)
+    if profile is None:
+        await outbox.send(message.channel, f"No team with ID {team_id} on CTFTime.")
+        return
+
+    embed = discord.Embed(title=profile.name, url=f"https://ctftime.org/team/{profile.id}", color=0x00ff00)
+    country = f"{country_flag(profile.country)} {profile.country}" if profile.country else "Unknown"
+    embed.add_field(name="Country", value=country, inline=True)
+    latest = profile.latest_rating
+    if latest:
+        year, (place, points, country_place) = latest
+        rating = f"#{place} worldwide, {points:.2f} points"
+        if country_place:
+            rating += f", #{country_place} in country"
+        embed.add_field(name=f"Rating {year}", value=rating, inline=True)
+    if profile.academic:
+        embed.add_field(name="Academic", value=profile.university or "Yes", inline=True)
+    if profile.aliases:
+        embed.add_field(name="Also known as", value=', '.join(profile.aliases)[:1024], inline=False)
+    await outbox.send(message.channel, embeds=[embed])
+
+@commands.command('!bot_stats', '', "Show command latencies, CTFTime and cache statistics (server managers only).",
+                  guild_only=True)
+async def bot_stats(message):
+    if not message.author.guild_permissions.manage_guild:
+        await outbox.send(message.channel, "Only members who can manage this server can see the bot's stats.")
+        return
+
+    uptime = timedelta(seconds=int(time.time() - metrics.started))
+    embed = discord.Embed(title="CTFTime Bot Stats",
+                          description=f"Up {uptime}, event loop lag {metrics.loop_lag * 1000:.1f} ms",
+                          color=0x00ff00)
+
+    def outcomes(name, key):
+        # {label value: {outcome: count}} from a counter labelled with `key` and outcome
+        counts = {}
+        for labels, value in metrics.series(name).items():
+            labels = dict(labels)
+            counts.setdefault(labels[key], {})[labels['outcome']] = value
+        return counts
+
+    commands_run = outcomes('commands_total', 'command')
+    timings = sorted(metrics.series('command_seconds').items(), key=lambda item: -item[1].count)
+    lines = [f"`{dict(labels)['command']}` {histogram.count}x, {format_latency(histogram)}, "
+             f"{commands_run.get(dict(labels)['command'], {}).get('error', 0)} errors"
+             for labels, histogram in timings[:10]]
+    embed.add_field(name="Commands", value='\n'.join(lines) or "None yet", inline=False)
+
+    requests_made = outcomes('ctftime_requests_total', 'endpoint')
+    timings = sorted(metrics.series('ctftime_request_seconds').items(), key=lambda item: -item[1].count)
+    lines = []
+    for labels, histogram in timings[:10]:
+        endpoint = dict(labels)['endpoint']
+        errors = requests_made.get(endpoint, {}).get('error', 0)
+        lines.append(f"`{endpoint}` {histogram.count}x, {format_latency(histogram)}, "
+                     f"{errors / histogram.count:.0%} errors")
+    embed.add_field(name="CTFTime Requests", value='\n'.join(lines) or "None yet", inline=False)
+
+    cache = ctftime.cache.stats()
+    client_stats = ctftime.stats()
+    embed.add_field(name="Response Cache", inline=False, value=(
+        f"{cache['entries']} entries, {cache['hit_ratio']:.0%} hit ratio "
+        f"({cache['hits']} fresh, {cache['stale_hits']} stale, {cache['misses']} misses)\n"
+        f"{client_stats['store_hits']} loaded from disk, {client_stats['not_modified']} revalidated, "
+        f"{client_stats['coalesced_requests']} coalesced"))
+
+    sent = outbox.stats()
+    embed.add_field(name="Discord Output", inline=False, value=(
+        f"{sent['sends']} sends, {sent['edits']} edits ({sent['merged_edits']} merged), "
+        f"{discord_rate_limits.count} rate limited ({sent['gave_up_rate_limited']} too long for discord.py, waited out per channel)"))
+    embed.add_field(name="State", inline=False, value=(
+        f"{len(guilds)} guilds loaded, {len(event_index)} events indexed, {len(reminders)} reminders pending"))
+    await outbox.send(message.channel, embeds=[embed])
+
+# Slash commands run the same handlers, given a stand-in for the message.
+# Commands that wait on CTFTime or Discord's role API before answering defer
+# first, so a slow fetch or a rate-limited role change can't miss the 3-second
+# deadline for answering, and reply with follow-ups.
+
+async def run_interaction(interaction, name, parse):
+    # `parse` builds the handler's arguments from the typed options, or raises UsageError
+    command = commands.get(name)
+    log.debug("command=%s guild=%s channel=%s user=%s (slash)", command.name,
+              interaction.guild_id, interaction.channel_id, interaction.user.id)
+    try:
+        args = parse()
+    except UsageError:
+        metrics.inc('commands_total', command=command.name, outcome='usage')
+        await interaction.response.send_message(f"Usage: /{command.name[1:]} {command.usage}", ephemeral=True)
+        return
+
+    if command.defer:
+        await interaction.response.defer(thinking=True)
+    message = InteractionMessage(interaction)
+    await run_command(command, message, args)
+    await message.finish()
+
+def slash_command(name, description=None):
+    # Register a callback as the slash version of the ! command `name`
+    command = commands.get(name)
+    def register(callback):
+        slash = tree.command(name=name[1:], description=(description or command.description)[:DESCRIPTION_LIMIT])(callback)
+        if command.guild_only:
+            slash = app_commands.guild_only()(slash)
+        return slash
+    return register
+
+async def ctf_autocomplete(interaction, current):
+    if interaction.guild_id is None:
+        return []
+    state = await guilds.get(interaction.guild_id)
+    return [choice(name) for name in state.ctf_names.search(current, MAX_CHOICES)]
+
+async def challenge_autocomplete(interaction, current):
+    # Challenges of the CTF chosen in the same command
+    ctf_name = getattr(interaction.namespace, 'ctf', None)
+    if interaction.guild_id is None or not ctf_name:
+        return []
+    state = await guilds.get(interaction.guild_id)
+    names = state.challenge_index.names(state.ctf_names.canonical(ctf_name) or ctf_name)
+    return [choice(name) for name in names.search(current, MAX_CHOICES)]
+
+async def event_autocomplete(interaction, current):
+    # Synced events whose titles match what's typed so far, or the next ones to start
+    events = event_index.search_titles(current, MAX_CHOICES) if current.strip() else event_index.upcoming(MAX_CHOICES)
+    return [choice(f"{event.title} ({event.id})", str(event.id)) for event in events]
+
+def ctf_slash_command(name):
+    @slash_command(name)
+    @app_commands.describe(ctf="Name of the CTF")
+    @app_commands.autocomplete(ctf=ctf_autocomplete)
+    async def callback(interaction, ctf: str):
+        await run_interaction(interaction, name, lambda: text_arg(ctf))
+    return callback
+
+def challenge_slash_command(name, existing=True):
+    # `existing`: the challenge is one of the CTF's, so its name is autocompleted
+    autocomplete = {'ctf': ctf_autocomplete}
+    if existing:
+        autocomplete['challenge'] = challenge_autocomplete
+
+    @slash_command(name)
+    @app_commands.describe(ctf="Name of the CTF", challenge="Name of the challenge")
+    @app_commands.autocomplete(**autocomplete)
+    async def callback(interaction, ctf: str, challenge: str):
+        await run_interaction(interaction, name, lambda: text_arg(ctf) + text_arg(challenge))
+    return callback
+
+def event_slash_command(name):
+    @slash_command(name)
+    @app_commands.describe(event="Event ID or title")
+    @app_commands.autocomplete(event=event_autocomplete)
+    async def callback(interaction, event: str):
+        await run_interaction(interaction, name, lambda: event_arg(event))
+    return callback
+
+@slash_command('!create_ctf')
+@app_commands.describe(name="Name of the new CTF")
+async def create_ctf_slash(interaction, name: str):
+    await run_interaction(interaction, '!create_ctf', lambda: text_arg(name))
+
+for command_name in ('!delete_ctf', '!join_ctf', '!leave_ctf', '!list_challenges', '!show_ctf', '!unsolved', '!ctf_stats'):
+    ctf_slash_command(command_name)
+
+challenge_slash_command('!add_challenge', existing=False)
+for command_name in ('!delete_challenge', '!allocate_challenge', '!solve_challenge'):
+    challenge_slash_command(command_name)
+
+@slash_command('!my_challenges')
+async def my_challenges_slash(interaction):
+    await run_interaction(interaction, '!my_challenges', lambda: ())
+
+@slash_command('!list_ctfs')
+@app_commands.describe(limit="How many events to list")
+async def list_ctfs_slash(interaction, limit: app_commands.Range[int, 1, MAX_EVENTS_PER_COMMAND] = 5):
+    await run_interaction(interaction, '!list_ctfs', lambda: (limit,))
+
+@slash_command('!upcoming')
+@app_commands.describe(limit="How many events to list")
+async def upcoming_slash(interaction, limit: app_commands.Range[int, 1, MAX_EVENTS_PER_COMMAND] = 5):
+    await run_interaction(interaction, '!upcoming', lambda: (limit,))
+
+@slash_command('!current_ctfs')
+@app_commands.describe(limit="How many events to list (default all)")
+async def current_ctfs_slash(interaction, limit: app_commands.Range[int, 1, MAX_EVENTS_PER_COMMAND] = None):
+    await run_interaction(interaction, '!current_ctfs', lambda: (limit,))
+
+event_slash_command('!time_until_start')
+event_slash_command('!time_left')
+
+@slash_command('!remind', "Ping this channel before an event starts and ends (default 1h and 15m before).")
+@app_commands.describe(event="Event ID or title", offsets="How long before, e.g. \"1d 1h 15m\"")
+@app_commands.autocomplete(event=event_autocomplete)
+async def remind_slash(interaction, event: str, offsets: str = ''):
+    await run_interaction(interaction, '!remind',
+                          lambda: event_arg(event) + (parse_offsets(offsets, DEFAULT_OFFSETS, MAX_OFFSETS),))
+
+@slash_command('!unremind')
+@app_commands.describe(event="Event ID")
+@app_commands.autocomplete(event=event_autocomplete)
+async def unremind_slash(interaction, event: str):
+    await run_interaction(interaction, '!unremind', lambda: int_arg(event))
+
+@slash_command('!top')
+@app_commands.describe(year="Year of the rankings (default this year)")
+async def top_slash(interaction, year: int = None):
+    await run_interaction(interaction, '!top', lambda: (year,))
+
+@slash_command('!top_country', "Show the top teams of a country.")
+@app_commands.describe(country_code="Two-letter country code, e.g. pl")
+async def top_country_slash(interaction, country_code: app_commands.Range[str, 2, 2]):
+    await run_interaction(interaction, '!top_country', lambda: country_code_arg(country_code))
+
+@slash_command('!team')
+@app_commands.describe(team_id="CTFtime team ID")
+async def team_slash(interaction, team_id: int):
+    await run_interaction(interaction, '!team', lambda: (team_id,))
+
+@slash_command('!bot_stats')
+@app_commands.default_permissions(manage_guild=True)
+async def bot_stats_slash(interaction):
+    await run_interaction(interaction, '!bot_stats', lambda: ())
+
+# Run the bot the safe way; importing the module (as the tests and benchmarks do) doesn't start it
+if __name__ == '__main__':
+    # log_handler=None leaves discord.py's logs to the logging setup above
+    client.run(os.getenv('DISCORD_BOT_TOKEN'), log_handler=None)
@@ -0,0 +1,95 @@
+import time
+from bisect import bisect_left, bisect_right, insort
+from name_index import NameIndex, DEFAULT_LIMIT
+
+
+class EventIndex:
+    # In-memory index over a rolling window of CTFTime events (models.Event),
+    # kept sorted by start and finish time so time-based queries are bisects
+    # instead of HTTP calls.
+    def __init__(self):
+        self._events = {}
+        self._by_start = []    # (start_epoch, event_id)
+        self._by_finish = []   # (finish_epoch, event_id)
+        self._times = {}       # event_id -> (start_epoch, finish_epoch)
+        self.titles = NameIndex()    # title -> event_id
+        self.last_sync = None
+
+    def __len__(self):
+        return len(self._events)
+
+    def __contains__(self, event_id):
+        return event_id in self._events
+
+    @property
+    def synced(self):
+        return self.last_sync is not None
+
+    def replace(self, events):
+        # Swap in a freshly synced window in one go
+        self._events = {}
+        self._times = {}
+        self.titles = NameIndex()
+        for event in events:
+            self._store(event)
+        self._by_start = sorted((start, event_id) for event_id, (start, _) in self._times.items())
+        self._by_finish = sorted((finish, event_id) for event_id, (_, finish) in self._times.items())
+        self.last_sync = time.time()
+
+    def add(self, event):
+        # Insert or update a single event (e.g. one fetched by id on a miss)
+        event_id = event.id
+        if event_id in self._times:
+            self._remove_times(event_id)
+            old_title = self._events[event_id].title
+            if old_title != event.title and self.titles.get(old_title) == event_id:
+                self.titles.remove(old_title)
+        self._store(event)
+        start, finish = self._times[event_id]
+        insort(self._by_start, (start, event_id))
+        insort(self._by_finish, (finish, event_id))
+
+    def _store(self, event):
+        self._events[event.id] = event
+        self._times[event.id] = (event.start_ts, event.finish_ts)
+        self.titles.add(event.title, event.id)
+
+    def _remove_times(self, event_id):
+        start, finish = self._times[event_id]
+        del self._by_start[bisect_left(self._by_start, (start, event_id))]
+        del self._by_finish[bisect_left(self._by_finish, (finish, event_id))]
+
+    def get(self, event_id):
+        return self._events.get(event_id)
+
+    def by_title(self, title):
+        # The event with this title, ignoring case and spacing, or None
+        return self._events.get(self.titles.get(title))
+
+    def search_titles(self, query, limit=DEFAULT_LIMIT):
+        # Events whose titles complete or closely match `query`
+        return [self.by_title(title) for title in self.titles.search(query, limit)]
+
+    def times(self, event_id):
+        # (start_epoch, finish_epoch) for an indexed event, or None
+        return self._times.get(event_id)
+
+    def ongoing(self, now=None):
+        # Events that have started and not yet finished, ordered by finish time
+        now = time.time() if now is None else now
+        first = bisect_right(self._by_finish, (now, float('inf')))
+        return [self._events[event_id] for finish, event_id in self._by_finish[first:]
+                if self._times[event_id][0] <= now]
+
+    def starting_within(self, seconds, now=None):
+        # Events starting between now and now + seconds, ordered by start time
+        now = time.time() if now is None else now
+        lo = bisect_left(self._by_start, (now, -1))
+        hi = bisect_right(self._by_start, (now + seconds, float('inf')))
+        return [self._events[event_id] for _, event_id in self._by_start[lo:hi]]
+
+    def upcoming(self, limit, now=None):
+        # The next `limit` events that haven't started yet, ordered by start time
+        now = time.time() if now is None else now
+        lo = bisect_left(self._by_start, (now, -1))
+        return [self._events[event_id] for _, event_id in self._by_start[lo:lo + limit]]
@@ -0,0 +1,61 @@
+import asyncio
+from collections import deque
+from models import Event
+
+# CTFTime returns at most this many events per request
+PAGE_LIMIT = 100
+# Date range covered by one request
+WINDOW = 7 * 24 * 3600
+# A window that comes back full is split until it is this small
+MIN_WINDOW = 3600
+# Windows fetched ahead of the one being consumed
+PREFETCH = 2
+
+
+def split_range(start, finish, window=WINDOW):
+    # [start, finish) rounded out to multiples of `window` and cut at each one,
+    # so every call (and every restart) asks for the same windows and their
+    # cached responses can be reused
+    start = start // window * window
+    ranges = deque()
+    while start < finish:
+        ranges.append((start, start + window))
+        start += window
+    return ranges
+
+
+async def stream_events(fetch_window, start, finish, window=WINDOW, prefetch=PREFETCH, page_limit=PAGE_LIMIT):
+    # Yield the Events CTFTime lists for the windows covering [start, finish),
+    # window by window and in start order within each window. fetch_window(limit, start, finish)
+    # returns one window's raw events. At most `prefetch` windows (one more
+    # while a full window is split) are held in memory, and the ids kept for
+    # de-duplication are dropped once their event is over.
+    ranges = split_range(start, finish, window)
+    tasks = deque()
+    seen = {}    # event_id -> finish_ts
+    try:
+        while ranges or tasks:
+            while ranges and len(tasks) < prefetch:
+                lo, hi = ranges.popleft()
+                tasks.append((lo, hi, asyncio.ensure_future(fetch_window(page_limit, lo, hi))))
+            lo, hi, task = tasks.popleft()
+            data = await task or []
+            if len(data) >= page_limit and hi - lo > MIN_WINDOW:
+                # Truncated: fetch both halves instead, ahead of everything later
+                middle = (lo + hi) // 2
+                for half_lo, half_hi in ((middle, hi), (lo, middle)):
+                    tasks.appendleft((half_lo, half_hi, asyncio.ensure_future(fetch_window(page_limit, half_lo, half_hi))))
+                continue
+
+            events = sorted((Event.from_data(event) for event in data), key=lambda event: (event.start_ts, event.id))
+            for event_id in [event_id for event_id, finish_ts in seen.items() if finish_ts < lo]:
+                del seen[event_id]
+            for event in events:
+                if event.id in seen:
+                    continue  # Already yielded from an earlier, overlapping window
+                seen[event.id] = event.finish_ts
+                yield event
+    finally:
+        # The consumer stopped early (or failed): drop the prefetched windows
+        for _, _, task in tasks:
+            task.cancel()
@@ -0,0 +1,198 @@
+import asyncio
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from storage import CTFStore
+from challenges import KeyedLocks, ChallengeIndex, legacy_usernames, adopt_legacy_users
+from models import UserNames
+from name_index import NameIndex
+
+log = logging.getLogger(__name__)
+
+# Worker threads shared by every guild's store for disk I/O
+STORE_WORKERS = 4
+
+
+class GuildState:
+    # Everything the bot keeps for one guild: its custom CTFs, the names of
+    # the members who claimed challenges, the storage shard they are persisted
+    # to, indexes over the CTF and challenge names and the per-CTF locks for
+    # multi-step changes.
+    def __init__(self, guild_id, store):
+        self.guild_id = guild_id
+        self.store = store
+        self.ctfs = {}
+        self.ctf_names = NameIndex()
+        self.users = UserNames()
+        self.ctf_locks = KeyedLocks()
+        self.challenge_index = ChallengeIndex()
+        self.last_used = time.monotonic()
+
+    def remember_user(self, member):
+        # Keep the display name for a member's id current and saved; returns
+        # the id to store on challenges
+        if self.users.remember(member.id, member.display_name):
+            self.store.put_user(member.id, member.display_name)
+        return self.users.intern(member.id)
+
+    def split_ctf_and_challenge(self, ctf_name, challenge_name):
+        # "<ctf> <challenge>" was split at the first space; if that isn't a CTF
+        # but the text starts with a multi-word one, split after that instead
+        if ctf_name in self.ctfs:
+            return ctf_name, challenge_name
+        text = f"{ctf_name} {challenge_name}"
+        for name in sorted(self.ctf_names.complete(ctf_name), key=len, reverse=True):
+            if text.startswith(name + ' ') and name in self.ctfs:
+                return name, text[len(name):].strip()
+        return ctf_name, challenge_name
+
+
+class GuildRegistry:
+    # Custom CTF state partitioned by guild id. Each guild gets its own SQLite
+    # shard and is loaded lazily the first time one of its commands arrives, so
+    # memory and startup time scale with active guilds rather than all guilds.
+    # Data from before the sharding is moved into the shard of `legacy_guild_id`;
+    # if that isn't known up front, loads wait until settle_legacy() is called,
+    # so no guild gets an empty shard in place of the one it should adopt.
+    # Challenges claimed before user ids were stored go to the members that
+    # `find_members(guild_id, usernames)` finds for their usernames on load.
+    def __init__(self, data_dir, legacy_guild_id=None, legacy_json_path=None, legacy_db_path=None,
+                 find_members=None):
+        self.data_dir = data_dir
+        self.find_members = find_members
+        self.legacy_guild_id = legacy_guild_id
+        self.legacy_json_path = legacy_json_path
+        self.legacy_db_path = legacy_db_path
+        self._executor = ThreadPoolExecutor(max_workers=STORE_WORKERS, thread_name_prefix='ctfstore')
+        self._guilds = {}
+        self._loading = {}
+        self._closing = {}
+        self._legacy_settled = asyncio.Event()
+        if legacy_guild_id is not None or not self.legacy_files():
+            self._legacy_settled.set()
+
+    def __len__(self):
+        return len(self._guilds)
+
+    def legacy_files(self):
+        # The pre-sharding files still waiting to be moved into a guild's shard
+        return [path for path in (self.legacy_db_path, self.legacy_json_path) if path and os.path.exists(path)]
+
+    @property
+    def legacy_pending(self):
+        return not self._legacy_settled.is_set()
+
+    def settle_legacy(self, guild_id):
+        # Name the guild the pre-sharding data belongs to, or None to leave it be
+        if self.legacy_pending:
+            self.legacy_guild_id = guild_id
+            self._legacy_settled.set()
+
+    def shard_path(self, guild_id):
+        return os.path.join(self.data_dir, f'guild_{guild_id}.db')
+
+    def loaded(self, guild_id):
+        return self._guilds.get(guild_id)
+
+    async def get(self, guild_id):
+        state = self._guilds.get(guild_id)
+        if state is None:
+            # Concurrent first commands from the same guild share one load
+            loading = self._loading.get(guild_id)
+            if loading is None:
+                loading = asyncio.get_running_loop().create_task(self._load(guild_id))
+                self._loading[guild_id] = loading
+            try:
+                state = await asyncio.shield(loading)
+            finally:
+                if self._loading.get(guild_id) is loading and loading.done():
+                    del self._loading[guild_id]
+        state.last_used = time.monotonic()
+        return state
+
+    async def _load(self, guild_id):
+        await self._legacy_settled.wait()
+        # A shard being unloaded is only opened again once it's closed
+        closing = self._closing.get(guild_id)
+        if closing is not None:
+            await asyncio.wait([closing])
+        path = self.shard_path(guild_id)
+        legacy_json_path = None
+        if self.legacy_guild_id is not None and guild_id == self.legacy_guild_id:
+            self._adopt_legacy_db(path)
+            legacy_json_path = self.legacy_json_path
+        store = CTFStore(path, legacy_json_path=legacy_json_path, executor=self._executor)
+        state = GuildState(guild_id, store)
+        ctfs, users = await store.load()
+        state.ctfs = ctfs
+        state.users = UserNames(users)
+        for ctf in ctfs.values():
+            for challenge in ctf.challenges.values():
+                challenge.user = state.users.intern(challenge.user)
+        await self._adopt_legacy_users(state)
+        state.ctf_names = NameIndex(state.ctfs)
+        state.challenge_index.rebuild(state.ctfs)
+        self._guilds[guild_id] = state
+        return state
+
+    async def _adopt_legacy_users(self, state):
+        names = legacy_usernames(state.ctfs)
+        if not names or self.find_members is None:
+            return
+        try:
+            members = await self.find_members(state.guild_id, names)
+        except Exception:
+            log.exception("Couldn't look up the members of guild %s with legacy claims", state.guild_id)
+            return
+        for ctf_name, challenge_name, name, member in adopt_legacy_users(state.ctfs, members):
+            challenge = state.ctfs[ctf_name].challenges[challenge_name]
+            challenge.user = state.remember_user(member)
+            state.store.put_challenge(ctf_name, challenge_name, challenge)
+            log.info("Guild %s: challenge '%s' in CTF '%s', claimed as %r, now belongs to member %s",
+                     state.guild_id, challenge_name, ctf_name, name, member.id)
+
+    def _adopt_legacy_db(self, path):
+        # The pre-sharding single database becomes this guild's shard
+        if not self.legacy_db_path or not os.path.exists(self.legacy_db_path):
+            return
+        if os.path.exists(path):
+            log.warning("Not moving %s to %s, which already exists; merge them by hand", self.legacy_db_path, path)
+            return
+        os.makedirs(self.data_dir, exist_ok=True)
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(self.legacy_db_path + suffix):
+                os.replace(self.legacy_db_path + suffix, path + suffix)
+        log.info("Moved %s to %s", self.legacy_db_path, path)
+
+    async def unload_idle(self, max_idle):
+        # Drop guilds that haven't issued a command for a while and have nothing
+        # left to write; returns their ids. A command arriving while a guild's
+        # shard is being closed loads it again once the close is done.
+        now = time.monotonic()
+        unloaded = []
+        for guild_id, state in list(self._guilds.items()):
+            # Skip guilds another unload already dropped while this one waited
+            if self._guilds.get(guild_id) is not state:
+                continue
+            if now - state.last_used > max_idle and not state.store.has_pending:
+                del self._guilds[guild_id]
+                closing = asyncio.get_running_loop().create_task(state.store.close())
+                self._closing[guild_id] = closing
+                try:
+                    await asyncio.shield(closing)
+                finally:
+                    if self._closing.get(guild_id) is closing:
+                        del self._closing[guild_id]
+                # Not unloaded after all if a command brought it back meanwhile
+                if guild_id not in self._guilds and guild_id not in self._loading:
+                    unloaded.append(guild_id)
+        return unloaded
+
+    async def close(self):
+        for closing in list(self._closing.values()):
+            await asyncio.wait([closing])
+        for state in list(self._guilds.values()):
+            await state.store.close()
+        self._guilds.clear()
+        self._executor.shutdown(wait=True)
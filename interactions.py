@@ -0,0 +1,62 @@
+import discord
+
+# Discord's limits for slash command descriptions and autocomplete choices
+DESCRIPTION_LIMIT = 100
+CHOICE_LIMIT = 100
+MAX_CHOICES = 25
+
+
+def choice(name, value=None):
+    # An autocomplete choice, cut to Discord's length limit
+    return discord.app_commands.Choice(name=name[:CHOICE_LIMIT], value=(name if value is None else value)[:CHOICE_LIMIT])
+
+
+class InteractionChannel:
+    # Stands in for message.channel when a command comes in as a slash command.
+    # The first send answers the interaction, later ones (and every one after
+    # a defer) are follow-ups; anything else is looked up on the real channel.
+    # The outbox sends these without the channel's pacing.
+    paced = False
+
+    def __init__(self, interaction):
+        self.interaction = interaction
+        self.id = interaction.channel_id
+        self.sent = 0
+
+    @property
+    def target(self):
+        # The channel the command was used in, for messages that have to
+        # outlive the interaction (follow-ups can only be edited for 15 minutes)
+        return self.interaction.channel
+
+    def __getattr__(self, name):
+        return getattr(self.interaction.channel, name)
+
+    async def send(self, content=None, **kwargs):
+        if content is not None:
+            kwargs['content'] = content
+        self.sent += 1
+        if not self.interaction.response.is_done():
+            await self.interaction.response.send_message(**kwargs)
+            return None
+        return await self.interaction.followup.send(wait=True, **kwargs)
+
+
+class InteractionMessage:
+    # The parts of a discord.Message the command handlers use, for a slash command
+    def __init__(self, interaction):
+        self.interaction = interaction
+        self.guild = interaction.guild
+        self.author = interaction.user
+        self.channel = InteractionChannel(interaction)
+        self.content = ''
+
+    async def finish(self):
+        # Every interaction needs an answer; clear the "thinking..." of a
+        # deferred command that ended up with nothing to say
+        if self.channel.sent:
+            return
+        if self.interaction.response.is_done():
+            await self.interaction.delete_original_response()
+        else:
+            await self.interaction.response.send_message("Done.", ephemeral=True)
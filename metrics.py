@@ -0,0 +1,152 @@
+import asyncio
+import logging
+import time
+from bisect import bisect_left
+from urllib.parse import urlsplit
+from aiohttp import web
+
+# Upper bounds, in seconds, of the latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# How often the event loop lag is sampled
+LOOP_LAG_INTERVAL = 1.0
+
+
+def endpoint_label(url):
+    # "https://ctftime.org/api/v1/teams/1234/" -> "/api/v1/teams/{id}/", so
+    # every team or event doesn't become its own series
+    path = urlsplit(url).path
+    return '/'.join('{id}' if part.isdigit() else part for part in path.split('/'))
+
+
+def format_labels(labels):
+    # (("command", "!top"),) -> '{command="!top"}'
+    if not labels:
+        return ''
+    escape = lambda value: str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return '{' + ','.join(f'{name}="{escape(value)}"' for name, value in labels) + '}'
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        # Upper bound of the bucket the q-th observation falls in
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+
+class LogCounter(logging.Filter):
+    # Counts the log records whose message starts with `prefix`, for things a
+    # library only reports by logging them. Nothing is filtered out.
+    def __init__(self, prefix):
+        super().__init__()
+        self.prefix = prefix
+        self.count = 0
+
+    def filter(self, record):
+        if isinstance(record.msg, str) and record.msg.startswith(self.prefix):
+            self.count += 1
+        return True
+
+
+class Metrics:
+    # In-process counters and latency histograms, labelled like Prometheus
+    # series. Components that already keep their own counters (the outbox, the
+    # response cache, ...) are read through collectors when the metrics are
+    # rendered instead of being updated here on every call.
+    def __init__(self, prefix='ctftimebot'):
+        self.prefix = prefix
+        self.counters = {}      # (name, labels) -> value
+        self.histograms = {}    # (name, labels) -> Histogram
+        self.collectors = {}    # name -> callable returning {key: number}
+        self.started = time.time()
+        self.loop_lag = 0.0
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram()
+        histogram.observe(value)
+
+    def add_collector(self, name, collect):
+        self.collectors[name] = collect
+
+    def series(self, name):
+        # {labels: counter value or Histogram} for one metric name
+        found = {labels: value for (metric, labels), value in self.counters.items() if metric == name}
+        found.update({labels: value for (metric, labels), value in self.histograms.items() if metric == name})
+        return found
+
+    def render(self):
+        # Prometheus text exposition format
+        lines = []
+        for name in sorted({name for name, _ in self.counters}):
+            lines.append(f"# TYPE {self.prefix}_{name} counter")
+            for labels, value in sorted(self.series(name).items()):
+                lines.append(f"{self.prefix}_{name}{format_labels(labels)} {value}")
+        for name in sorted({name for name, _ in self.histograms}):
+            full = f"{self.prefix}_{name}"
+            lines.append(f"# TYPE {full} histogram")
+            for labels, histogram in sorted(self.series(name).items()):
+                cumulative = 0
+                for bound, count in zip(histogram.buckets + ('+Inf',), histogram.counts):
+                    cumulative += count
+                    lines.append(f"{full}_bucket{format_labels(labels + (('le', bound),))} {cumulative}")
+                lines.append(f"{full}_sum{format_labels(labels)} {histogram.sum}")
+                lines.append(f"{full}_count{format_labels(labels)} {histogram.count}")
+        lines.append(f"# TYPE {self.prefix}_uptime_seconds gauge")
+        lines.append(f"{self.prefix}_uptime_seconds {time.time() - self.started:.0f}")
+        for collector, collect in sorted(self.collectors.items()):
+            for key, value in sorted(collect().items()):
+                if isinstance(value, (int, float)):
+                    lines.append(f"# TYPE {self.prefix}_{collector}_{key} gauge")
+                    lines.append(f"{self.prefix}_{collector}_{key} {value}")
+        return '\n'.join(lines) + '\n'
+
+    async def monitor_loop_lag(self, interval=LOOP_LAG_INTERVAL):
+        # A sleep that wakes up late means something blocked the event loop
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(interval)
+            self.loop_lag = max(time.perf_counter() - started - interval, 0.0)
+            self.observe('event_loop_lag_seconds', self.loop_lag)
+
+    async def serve(self, host, port):
+        # Serve GET /metrics for a Prometheus scraper; returns the runner to clean up
+        async def handle(request):
+            return web.Response(text=self.render(), content_type='text/plain')
+
+        app = web.Application()
+        app.router.add_get('/metrics', handle)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        return runner
+
+
+def format_latency(histogram):
+    # "p50 25 ms, p99 250 ms"; values are bucket upper bounds
+    def ms(seconds):
+        return f">{histogram.buckets[-1]:g} s" if seconds == float('inf') else f"{seconds * 1000:g} ms"
+    return f"p50 {ms(histogram.quantile(0.5))}, p99 {ms(histogram.quantile(0.99))}"
@@ -0,0 +1,201 @@
+import enum
+import sys
+from datetime import datetime
+
+
+def parse_ctftime_time(value):
+    # CTFTime sends ISO 8601 with an offset ("2024-05-03T12:00:00+00:00"),
+    # which fromisoformat reads far faster than strptime
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        return datetime.strptime(value, '%Y-%m-%dT%H:%M:%S%z')
+
+
+class Status(enum.IntEnum):
+    # Challenge lifecycle: unclaimed -> working -> solved
+    UNCLAIMED = 0
+    WORKING = 1
+    SOLVED = 2
+
+
+class Challenge:
+    # `user` is the Discord user id of whoever claimed the challenge. Challenges
+    # saved before ids were tracked hold that member's username (a str) instead.
+    __slots__ = ('status', 'user')
+
+    def __init__(self, status=Status.UNCLAIMED, user=None):
+        self.status = status
+        self.user = user
+
+    def __repr__(self):
+        return f"Challenge({self.status.name}, {self.user!r})"
+
+    @property
+    def solved(self):
+        return self.status is Status.SOLVED
+
+    @property
+    def working_on(self):
+        return self.status is Status.WORKING
+
+    def to_data(self):
+        return [int(self.status), self.user]
+
+    @classmethod
+    def from_data(cls, data):
+        if isinstance(data, dict):
+            # Old free-form {'user', 'solved', 'working_on'} record
+            user = data.get('user')
+            if data.get('solved'):
+                status = Status.SOLVED
+            elif user is not None:
+                status = Status.WORKING
+            else:
+                status = Status.UNCLAIMED
+            return cls(status, sys.intern(user) if isinstance(user, str) else user)
+        status, user = data
+        return cls(Status(status), user)
+
+
+class CustomCTF:
+    __slots__ = ('name', 'challenges', 'role_id', 'board')
+
+    def __init__(self, name, challenges=None, role_id=None, board=None):
+        self.name = name
+        self.challenges = challenges if challenges is not None else {}
+        self.role_id = role_id
+        self.board = board    # (channel_id, message_id) of the live board, if any
+
+    def __repr__(self):
+        return f"CustomCTF({self.name!r}, {len(self.challenges)} challenges)"
+
+    def to_data(self):
+        # Challenges are stored as their own records, so they are left out here
+        data = {'name': self.name}
+        if self.role_id is not None:
+            data['role_id'] = self.role_id
+        if self.board is not None:
+            data['board'] = list(self.board)
+        return data
+
+    @classmethod
+    def from_data(cls, data):
+        board = data.get('board')
+        if isinstance(board, dict):
+            board = (board['channel_id'], board['message_id'])
+        ctf = cls(data['name'], role_id=data.get('role_id'), board=tuple(board) if board else None)
+        for challenge_name, challenge in data.get('challenges', {}).items():
+            ctf.challenges[challenge_name] = Challenge.from_data(challenge)
+        return ctf
+
+
+class UserNames:
+    # Display names for the user ids stored on challenges. Each name string is
+    # interned, and so is each id: they arrive as new ints from every Discord
+    # message and database row, and every challenge held by a member should
+    # share one copy.
+    def __init__(self, names=None):
+        self._names = {}
+        self._ids = {}
+        for user_id, name in (names or {}).items():
+            self._names[self.intern(user_id)] = sys.intern(name)
+
+    def __len__(self):
+        return len(self._names)
+
+    def intern(self, user):
+        # The shared int for a user id; usernames and None are returned as they are
+        if user is None or isinstance(user, str):
+            return user
+        return self._ids.setdefault(user, user)
+
+    def remember(self, user_id, name):
+        # Returns True when the stored name changed and needs saving
+        if self._names.get(user_id) == name:
+            return False
+        self._names[self.intern(user_id)] = sys.intern(name)
+        return True
+
+    def name(self, user):
+        if user is None or isinstance(user, str):
+            return user
+        return self._names.get(user, f"user {user}")
+
+
+class Event:
+    # A CTFTime event, normalised once when it is fetched: start and finish are
+    # timezone-aware datetimes, with their epoch seconds alongside for sorting
+    # and comparisons, so rendering and filtering never parse strings.
+    __slots__ = ('id', 'title', 'url', 'start', 'finish', 'start_ts', 'finish_ts')
+
+    def __init__(self, id, title, url, start, finish):
+        self.id = id
+        self.title = title
+        self.url = url
+        self.start = start
+        self.finish = finish
+        self.start_ts = int(start.timestamp())
+        self.finish_ts = int(finish.timestamp())
+
+    def __repr__(self):
+        return f"Event({self.id}, {self.title!r})"
+
+    @classmethod
+    def from_data(cls, data):
+        return cls(data['id'], data['title'], data.get('url', ''),
+                   parse_ctftime_time(data['start']), parse_ctftime_time(data['finish']))
+
+
+class RankedTeam:
+    # One row of a CTFTime leaderboard (global or per country)
+    __slots__ = ('place', 'team_id', 'name', 'points', 'country', 'events', 'world_place')
+
+    def __init__(self, place, team_id, name, points, country=None, events=None, world_place=None):
+        self.place = place
+        self.team_id = team_id
+        self.name = name
+        self.points = points
+        self.country = country
+        self.events = events
+        self.world_place = world_place
+
+    def __repr__(self):
+        return f"RankedTeam({self.place}, {self.name!r})"
+
+
+class Team:
+    # A team's CTFTime profile. `ratings` maps year -> (place, points, country_place).
+    __slots__ = ('id', 'name', 'country', 'aliases', 'academic', 'university', 'ratings')
+
+    def __init__(self, id, name, country=None, aliases=(), academic=False, university=None, ratings=None):
+        self.id = id
+        self.name = name
+        self.country = country
+        self.aliases = aliases
+        self.academic = academic
+        self.university = university
+        self.ratings = ratings or {}
+
+    def __repr__(self):
+        return f"Team({self.id}, {self.name!r})"
+
+    @property
+    def latest_rating(self):
+        # (year, (place, points, country_place)) for the most recent rated year, or None
+        if not self.ratings:
+            return None
+        year = max(self.ratings)
+        return year, self.ratings[year]
+
+    @classmethod
+    def from_data(cls, data):
+        ratings = {}
+        for year, rating in (data.get('rating') or {}).items():
+            if rating and rating.get('rating_place'):
+                ratings[int(year)] = (rating['rating_place'], rating.get('rating_points', 0), rating.get('country_place'))
+        university = data.get('university')
+        if isinstance(university, dict):
+            university = university.get('name')
+        return cls(data['id'], data.get('name') or data.get('primary_alias', ''), data.get('country') or None,
+                   tuple(data.get('aliases') or ()), bool(data.get('academic')), university, ratings)
@@ -0,0 +1,144 @@
+import heapq
+from collections import Counter
+
+# Discord shows at most 25 autocomplete choices
+DEFAULT_LIMIT = 25
+# Least trigram similarity (0..1) for a name to count as a fuzzy match
+FUZZY_CUTOFF = 0.3
+# Trie depth; longer prefixes are checked against the names found at this depth,
+# which keeps the trie small when there are thousands of long names
+TRIE_DEPTH = 6
+
+
+def normalize(name):
+    # Names match regardless of case and spacing
+    return ' '.join(name.casefold().split())
+
+
+def trigrams(text):
+    # "ctf" -> {"  c", " ct", "ctf", "tf "}; the padding weights word starts
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def word_starts(key):
+    # "midnight sun ctf" -> "midnight sun ctf", "sun ctf", "ctf"
+    yield key
+    for i, char in enumerate(key):
+        if char == ' ':
+            yield key[i + 1:]
+
+
+class NameIndex:
+    # Prefix and fuzzy lookup over a set of names (CTFs, challenges, event
+    # titles), each with an optional value. A trie over the start of every word
+    # answers prefix queries ("sun" finds "Midnight Sun CTF") by walking only
+    # the matching branch, and an inverted trigram index finds close
+    # misspellings by counting shared trigrams, so neither scans every name.
+    def __init__(self, names=()):
+        self._entries = {}    # normalized name -> (name, value, trigram count)
+        self._trie = {}       # char -> child node; None -> {(word start, normalized name)}
+        self._grams = {}      # trigram -> set of normalized names
+        for name in names:
+            self.add(name)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, name):
+        return normalize(name) in self._entries
+
+    def add(self, name, value=None):
+        key = normalize(name)
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[:2] != (name, value):
+                self._entries[key] = (name, value, entry[2])
+            return
+        grams = trigrams(key)
+        self._entries[key] = (name, value, len(grams))
+        for start in word_starts(key):
+            node = self._trie
+            for char in start[:TRIE_DEPTH]:
+                node = node.setdefault(char, {})
+            node.setdefault(None, set()).add((start, key))
+        for gram in grams:
+            self._grams.setdefault(gram, set()).add(key)
+
+    def remove(self, name):
+        # Only removes the name as it was last added, so removing one of two
+        # names that differ in case keeps the other
+        key = normalize(name)
+        entry = self._entries.get(key)
+        if entry is None or entry[0] != name:
+            return
+        del self._entries[key]
+        for start in word_starts(key):
+            path = [self._trie]
+            for char in start[:TRIE_DEPTH]:
+                path.append(path[-1][char])
+            path[-1][None].discard((start, key))
+            if not path[-1][None]:
+                del path[-1][None]
+            # Prune the branch back to the last node still in use
+            for depth in range(len(path) - 1, 0, -1):
+                if path[depth]:
+                    break
+                del path[depth - 1][start[depth - 1]]
+        for gram in trigrams(key):
+            keys = self._grams[gram]
+            keys.discard(key)
+            if not keys:
+                del self._grams[gram]
+
+    def get(self, name, default=None):
+        # The value of a name, matched regardless of case and spacing
+        entry = self._entries.get(normalize(name))
+        return default if entry is None else entry[1]
+
+    def canonical(self, name):
+        # The name as it was added, or None
+        entry = self._entries.get(normalize(name))
+        return None if entry is None else entry[0]
+
+    def complete(self, prefix, limit=DEFAULT_LIMIT):
+        # Names with a word starting with `prefix`, names that start with it first
+        prefix = normalize(prefix)
+        if not prefix:
+            return [self._entries[key][0] for key in heapq.nsmallest(limit, self._entries)]
+        node = self._trie
+        for char in prefix[:TRIE_DEPTH]:
+            node = node.get(char)
+            if node is None:
+                return []
+        found = set()
+        stack = [node]
+        # Depth-first in character order, so the first `limit` hits are the alphabetically first ones
+        while stack and len(found) < limit:
+            node = stack.pop()
+            for start, key in sorted(node.get(None, ())):
+                if start.startswith(prefix):
+                    found.add(key)
+            stack.extend(node[char] for char in sorted((char for char in node if char is not None), reverse=True))
+        ranked = sorted(found, key=lambda key: (not key.startswith(prefix), key))
+        return [self._entries[key][0] for key in ranked[:limit]]
+
+    def similar(self, name, limit=5, cutoff=FUZZY_CUTOFF):
+        # The names closest to `name` by trigram (Jaccard) similarity, best first
+        query = trigrams(normalize(name))
+        shared = Counter()
+        for gram in query:
+            shared.update(self._grams.get(gram, ()))
+        scored = []
+        for key, count in shared.items():
+            score = count / (len(query) + self._entries[key][2] - count)
+            if score >= cutoff:
+                scored.append((-score, key))
+        return [self._entries[key][0] for _, key in heapq.nsmallest(limit, scored)]
+
+    def search(self, query, limit=DEFAULT_LIMIT):
+        # Autocomplete: prefix matches, topped up with fuzzy ones for typos
+        names = self.complete(query, limit)
+        if len(names) < limit and normalize(query):
+            names += [name for name in self.similar(query, limit) if name not in names][:limit - len(names)]
+        return names
@@ -0,0 +1,214 @@
+import asyncio
+import time
+from collections import deque
+import discord
+
+# Discord limits for a single message
+MAX_EMBEDS_PER_MESSAGE = 10
+MAX_EMBED_CHARS_PER_MESSAGE = 6000
+MAX_FIELDS_PER_EMBED = 25
+
+# Per-channel pacing: a burst of this many sends, then this many per second
+CHANNEL_BURST = 5
+CHANNEL_RATE = 1.0
+# Retries of a send that keeps getting rate limited before giving up
+MAX_RATE_LIMIT_RETRIES = 3
+
+
+def pack_embeds(embeds, max_embeds=MAX_EMBEDS_PER_MESSAGE, max_chars=MAX_EMBED_CHARS_PER_MESSAGE):
+    # Group embeds into as few messages as Discord's per-message limits allow
+    batches = []
+    batch = []
+    size = 0
+    for embed in embeds:
+        length = len(embed)
+        if batch and (len(batch) == max_embeds or size + length > max_chars):
+            batches.append(batch)
+            batch = []
+            size = 0
+        batch.append(embed)
+        size += length
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def field_embeds(title, fields, color=0x00ff00):
+    # Spread (name, value) fields over as many embeds as Discord's per-embed
+    # field and character limits require
+    embeds = [discord.Embed(title=title, color=color)]
+    size = len(title)
+    for name, value in fields:
+        if len(embeds[-1].fields) == MAX_FIELDS_PER_EMBED or size + len(name) + len(value) > MAX_EMBED_CHARS_PER_MESSAGE:
+            embeds.append(discord.Embed(title=f"{title} (cont.)", color=color))
+            size = len(title) + 8
+        embeds[-1].add_field(name=name, value=value, inline=False)
+        size += len(name) + len(value)
+    return embeds
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def time_to_full(self):
+        # Seconds until the bucket is back to its full burst
+        self._refill()
+        return (self.capacity - self.tokens) / self.rate
+
+    async def take(self):
+        while True:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class ChannelQueue:
+    # Outgoing sends and edits for one channel, drained in order by a single
+    # worker task that is paced by the channel's token bucket.
+    def __init__(self, outbox, channel):
+        self.outbox = outbox
+        self.channel = channel
+        self.bucket = TokenBucket(outbox.rate, outbox.burst)
+        self.items = deque()
+        self.pending_edits = {}
+        self.worker = None
+        self.release_timer = None
+
+    def put(self, item):
+        if self.release_timer is not None:
+            # In use again before it was forgotten
+            self.release_timer.cancel()
+            self.release_timer = None
+        self.items.append(item)
+        if self.worker is None:
+            self.worker = asyncio.get_running_loop().create_task(self._drain())
+
+    async def _drain(self):
+        try:
+            while self.items:
+                kind, target, kwargs, future = self.items.popleft()
+                if kind == 'edit':
+                    # From here on, newer edits for this message queue up separately
+                    self.pending_edits.pop(target.id, None)
+                await self.bucket.take()
+                try:
+                    result = await self.outbox._call(kind, target, kwargs)
+                except Exception as e:
+                    if not future.done():
+                        future.set_exception(e)
+                else:
+                    if not future.done():
+                        future.set_result(result)
+        finally:
+            self.worker = None
+            self.outbox._release(self)
+
+
+class Outbox:
+    # Rate-limit-aware output scheduler that every message the bot sends goes
+    # through, so its counts are the bot's real Discord traffic. Multi-embed
+    # responses are packed into as few messages as possible, each channel's
+    # sends are paced with a token bucket, and repeated edits of the same
+    # message that haven't gone out yet are merged into a single edit.
+    def __init__(self, rate=CHANNEL_RATE, burst=CHANNEL_BURST):
+        self.rate = rate
+        self.burst = burst
+        self._queues = {}
+        self.sends = 0
+        self.edits = 0
+        self.merged_edits = 0
+        self.gave_up_rate_limited = 0
+
+    def _queue(self, channel):
+        queue = self._queues.get(channel.id)
+        if queue is None:
+            queue = self._queues[channel.id] = ChannelQueue(self, channel)
+        return queue
+
+    def _release(self, queue):
+        # Forget an idle channel once its bucket has refilled. Until then the
+        # queue is kept, so a new burst to the channel is still paced.
+        queue.release_timer = None
+        if queue.items or queue.worker is not None or self._queues.get(queue.channel.id) is not queue:
+            return
+        delay = queue.bucket.time_to_full()
+        if delay > 0:
+            queue.release_timer = asyncio.get_running_loop().call_later(delay, self._release, queue)
+        else:
+            del self._queues[queue.channel.id]
+
+    async def _call(self, kind, target, kwargs):
+        # `target` is what to send through (a channel, or a slash command's
+        # reply to it) or the message to edit
+        for attempt in range(MAX_RATE_LIMIT_RETRIES + 1):
+            try:
+                if kind == 'send':
+                    self.sends += 1
+                    return await target.send(**kwargs)
+                self.edits += 1
+                return await target.edit(**kwargs)
+            except discord.RateLimited as e:
+                # discord.py waits out short 429s itself; one longer than the
+                # client's max_ratelimit_timeout is raised instead and waited out
+                # here, holding back only this channel's queue
+                if attempt == MAX_RATE_LIMIT_RETRIES:
+                    raise
+                self.gave_up_rate_limited += 1
+                await asyncio.sleep(e.retry_after)
+
+    def _submit(self, channel, kind, target, kwargs):
+        future = asyncio.get_running_loop().create_future()
+        self._queue(channel).put((kind, target, kwargs, future))
+        return future
+
+    async def send(self, channel, content=None, embeds=None, **kwargs):
+        # Returns the list of messages sent, one per packed batch of embeds
+        batches = pack_embeds(embeds) if embeds else [None]
+        messages = []
+        for i, batch in enumerate(batches):
+            message_kwargs = dict(kwargs)
+            if content is not None and i == 0:
+                message_kwargs['content'] = content
+            if batch is not None:
+                message_kwargs['embeds'] = batch
+            messages.append(message_kwargs)
+        if not getattr(channel, 'paced', True):
+            # Replies to a slash command are limited by Discord separately from
+            # the channel, and must not miss the interaction's deadline waiting
+            # behind the channel's queue; they go out right away, in order
+            return [await self._call('send', channel, message_kwargs) for message_kwargs in messages]
+        return list(await asyncio.gather(*(self._submit(channel, 'send', channel, message_kwargs)
+                                           for message_kwargs in messages)))
+
+    async def edit(self, message, **kwargs):
+        queue = self._queue(message.channel)
+        pending = queue.pending_edits.get(message.id)
+        if pending is not None:
+            # Not sent yet: fold this update into the queued edit
+            pending[2].update(kwargs)
+            self.merged_edits += 1
+            return await asyncio.shield(pending[3])
+        item = ('edit', message, dict(kwargs), asyncio.get_running_loop().create_future())
+        queue.pending_edits[message.id] = item
+        queue.put(item)
+        return await asyncio.shield(item[3])
+
+    def stats(self):
+        return {
+            'sends': self.sends,
+            'edits': self.edits,
+            'merged_edits': self.merged_edits,
+            'gave_up_rate_limited': self.gave_up_rate_limited,
+            'active_channels': len(self._queues),
+        }
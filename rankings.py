@@ -0,0 +1,100 @@
+import asyncio
+import aiohttp
+from models import RankedTeam, Team
+
+# Team details fetched at once when a leaderboard is refreshed
+TEAM_PREFETCH_WORKERS = 4
+# Teams per leaderboard whose details are prefetched
+TEAM_PREFETCH_LIMIT = 25
+
+
+def country_flag(country_code):
+    # "pl" -> 🇵🇱, using the regional indicator symbols
+    if not country_code or len(country_code) != 2 or not country_code.isalpha():
+        return ''
+    return ''.join(chr(0x1F1E6 + ord(letter) - ord('A')) for letter in country_code.upper())
+
+
+def parse_top(data):
+    # {"2024": [{"team_id", "team_name", "points"}, ...]} -> (year, teams)
+    if not data:
+        return None, []
+    year, rows = next(iter(data.items()))
+    teams = [RankedTeam(place, row['team_id'], row['team_name'], row.get('points', 0))
+             for place, row in enumerate(rows, start=1)]
+    return int(year), teams
+
+
+def parse_top_by_country(data):
+    teams = [RankedTeam(row['country_place'], row['team_id'], row['team_name'], row.get('points', 0),
+                        country=row.get('team_country'), events=row.get('events'), world_place=row.get('place'))
+             for row in data or []]
+    teams.sort(key=lambda team: team.place)
+    return teams
+
+
+class Rankings:
+    # CTFTime leaderboards and team profiles, parsed once per response. The
+    # fetch functions go through the shared client, which caches the raw JSON;
+    # a parsed leaderboard is reused for as long as the client keeps returning
+    # the same response object. Each new leaderboard starts fetching the listed
+    # teams' details in the background, a few at a time.
+    def __init__(self, fetch_top, fetch_top_by_year, fetch_top_by_country, fetch_team,
+                 workers=TEAM_PREFETCH_WORKERS):
+        self.fetch_top = fetch_top
+        self.fetch_top_by_year = fetch_top_by_year
+        self.fetch_top_by_country = fetch_top_by_country
+        self.fetch_team = fetch_team
+        self._workers = asyncio.Semaphore(workers)
+        self._parsed = {}      # leaderboard key -> (raw response, parsed)
+        self._prefetches = set()
+
+    def _parse(self, key, data, parse):
+        cached = self._parsed.get(key)
+        if cached is not None and cached[0] is data:
+            return cached[1]
+        parsed = parse(data)
+        self._parsed[key] = (data, parsed)
+        teams = parsed[1] if isinstance(parsed, tuple) else parsed
+        self.prefetch(team.team_id for team in teams[:TEAM_PREFETCH_LIMIT])
+        return parsed
+
+    async def top(self, year=None):
+        # (year, [RankedTeam]) for the given year, or the current one
+        if year is None:
+            return self._parse('top', await self.fetch_top(), parse_top)
+        return self._parse(('top', year), await self.fetch_top_by_year(year), parse_top)
+
+    async def top_by_country(self, country_code):
+        country_code = country_code.lower()
+        return self._parse(('country', country_code), await self.fetch_top_by_country(country_code),
+                           parse_top_by_country)
+
+    async def team(self, team_id):
+        # The team's profile, or None if CTFTime doesn't know the id
+        async with self._workers:
+            try:
+                data = await self.fetch_team(team_id)
+            except aiohttp.ClientResponseError as e:
+                if e.status == 404:
+                    return None
+                raise
+        return Team.from_data(data) if data else None
+
+    async def teams(self, team_ids):
+        # {team_id: Team} fetched concurrently, at most `workers` at a time;
+        # teams that fail to load are left out
+        team_ids = list(dict.fromkeys(team_ids))
+        results = await asyncio.gather(*(self.team(team_id) for team_id in team_ids), return_exceptions=True)
+        return {team_id: team for team_id, team in zip(team_ids, results) if isinstance(team, Team)}
+
+    def prefetch(self, team_ids):
+        # Warm the team cache without waiting for it
+        task = asyncio.get_running_loop().create_task(self.teams(team_ids))
+        self._prefetches.add(task)
+        task.add_done_callback(self._prefetches.discard)
+        return task
+
+    def close(self):
+        for task in list(self._prefetches):
+            task.cancel()
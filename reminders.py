@@ -0,0 +1,190 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+
+log = logging.getLogger(__name__)
+
+# Which end of an event a reminder is for
+START = 'start'
+FINISH = 'finish'
+
+# Reminders sent for `!remind <event_id>` without offsets: an hour and 15 minutes before
+DEFAULT_OFFSETS = (3600, 900)
+MAX_OFFSETS = 5
+
+
+def format_offset(seconds):
+    # 5400 -> "1h30m", 900 -> "15m", 86400 -> "1d"
+    parts = []
+    for unit, size in (('d', 86400), ('h', 3600), ('m', 60)):
+        count, seconds = divmod(seconds, size)
+        if count:
+            parts.append(f"{count}{unit}")
+    return ''.join(parts) or f"{seconds}s"
+
+
+class Reminder:
+    # One ping in one channel, `offset` seconds before an event starts or finishes.
+    # `event_time` is the start/finish epoch the reminder was last scheduled against.
+    __slots__ = ('id', 'guild_id', 'channel_id', 'event_id', 'title', 'edge', 'offset', 'event_time')
+
+    def __init__(self, id, guild_id, channel_id, event_id, title, edge, offset, event_time):
+        self.id = id
+        self.guild_id = guild_id
+        self.channel_id = channel_id
+        self.event_id = event_id
+        self.title = title
+        self.edge = edge
+        self.offset = offset
+        self.event_time = event_time
+
+    def __repr__(self):
+        return f"Reminder({self.id}, event {self.event_id}, {format_offset(self.offset)} before {self.edge})"
+
+    @property
+    def key(self):
+        return (self.channel_id, self.event_id, self.edge, self.offset)
+
+    @property
+    def fire_at(self):
+        return self.event_time - self.offset
+
+    def to_row(self):
+        return (self.id, self.guild_id, self.channel_id, self.event_id, self.title,
+                self.edge, self.offset, self.event_time)
+
+
+class ReminderScheduler:
+    # Every reminder of every guild is driven by one task sleeping on a min-heap
+    # of (fire_at, id), so scheduling is O(log n) and there's no coroutine per
+    # reminder. Heap entries are never removed in place: a reminder that was
+    # cancelled or moved leaves a stale entry that is skipped when popped.
+    def __init__(self, store, event_times, fire):
+        self.store = store
+        self.event_times = event_times    # event_id -> (start, finish) or None
+        self.fire = fire                  # async callable(reminder)
+        self._reminders = {}
+        self._keys = {}
+        self._heap = []
+        self._ids = itertools.count(1)
+        self._wakeup = asyncio.Event()
+        self.fired = 0
+
+    def __len__(self):
+        return len(self._reminders)
+
+    def _push(self, reminder):
+        heapq.heappush(self._heap, (reminder.fire_at, reminder.id))
+        # Wake the scheduler if this is now the earliest reminder
+        if self._heap[0][1] == reminder.id:
+            self._wakeup.set()
+
+    def _forget(self, reminder):
+        del self._reminders[reminder.id]
+        del self._keys[reminder.key]
+
+    async def load(self):
+        rows = await self.store.load()
+        for row in rows:
+            reminder = Reminder(*row)
+            self._reminders[reminder.id] = reminder
+            self._keys[reminder.key] = reminder.id
+        self._heap = [(reminder.fire_at, reminder.id) for reminder in self._reminders.values()]
+        heapq.heapify(self._heap)
+        self._ids = itertools.count(max(self._reminders, default=0) + 1)
+        self._wakeup.set()
+
+    async def schedule(self, guild_id, channel_id, event_id, title, start, finish, offsets, now=None):
+        # Returns the reminders that were added; ones already set up in this
+        # channel or whose time has passed are skipped
+        now = time.time() if now is None else now
+        added = []
+        for edge, event_time in ((START, start), (FINISH, finish)):
+            for offset in offsets:
+                if event_time - offset <= now or (channel_id, event_id, edge, offset) in self._keys:
+                    continue
+                reminder = Reminder(next(self._ids), guild_id, channel_id, event_id, title, edge, offset, event_time)
+                self._reminders[reminder.id] = reminder
+                self._keys[reminder.key] = reminder.id
+                self._push(reminder)
+                added.append(reminder)
+        await self.store.put([reminder.to_row() for reminder in added])
+        return added
+
+    async def cancel(self, channel_id, event_id):
+        # Drop every reminder for an event in one channel; their heap entries go stale
+        cancelled = [reminder for reminder in self._reminders.values()
+                     if reminder.channel_id == channel_id and reminder.event_id == event_id]
+        for reminder in cancelled:
+            self._forget(reminder)
+        await self.store.delete([reminder.id for reminder in cancelled])
+        return len(cancelled)
+
+    def _current_time(self, reminder):
+        # The event's start/finish as the event index has it now, in case
+        # CTFTime rescheduled it; events outside the index keep their old time
+        times = self.event_times(reminder.event_id)
+        if times is None:
+            return reminder.event_time
+        return times[0] if reminder.edge == START else times[1]
+
+    async def reschedule(self):
+        # Called after every event sync: move reminders whose event moved
+        moved = []
+        for reminder in self._reminders.values():
+            event_time = self._current_time(reminder)
+            if event_time != reminder.event_time:
+                reminder.event_time = event_time
+                self._push(reminder)
+                moved.append(reminder)
+        await self.store.put([reminder.to_row() for reminder in moved])
+        return len(moved)
+
+    def _pop_due(self, now):
+        due = []
+        moved = []
+        expired = []
+        while self._heap and self._heap[0][0] <= now:
+            fire_at, reminder_id = heapq.heappop(self._heap)
+            reminder = self._reminders.get(reminder_id)
+            if reminder is None or reminder.fire_at != fire_at:
+                continue  # Cancelled or moved since this entry was pushed
+            event_time = self._current_time(reminder)
+            if event_time != reminder.event_time:
+                reminder.event_time = event_time
+                self._push(reminder)
+                moved.append(reminder)
+                continue
+            self._forget(reminder)
+            # Reminders missed while the bot was down still go out, unless
+            # the start/finish they were for has already passed
+            (due if now < event_time else expired).append(reminder)
+        return due, moved, expired
+
+    async def run(self):
+        while True:
+            self._wakeup.clear()
+            due, moved, expired = self._pop_due(time.time())
+            for reminder in due:
+                try:
+                    await self.fire(reminder)
+                    self.fired += 1
+                except Exception as e:
+                    log.warning("Sending %s failed: %s", reminder, e)
+            try:
+                await self.store.put([reminder.to_row() for reminder in moved])
+                await self.store.delete([reminder.id for reminder in due + expired])
+            except Exception as e:
+                log.error("Saving reminders failed: %s", e)
+
+            timeout = self._heap[0][0] - time.time() if self._heap else None
+            if timeout is None or timeout > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def close(self):
+        await self.store.close()
@@ -0,0 +1,42 @@
+class RoleIndex:
+    # Per-guild role name -> role id index, so finding a CTF role doesn't scan
+    # every role in the guild. A guild is indexed once on first lookup and then
+    # kept current from the role create/update/delete gateway events.
+    def __init__(self):
+        self._guilds = {}
+
+    def _names(self, guild):
+        names = self._guilds.get(guild.id)
+        if names is None:
+            names = {}
+            for role in guild.roles:
+                names.setdefault(role.name, role.id)
+            self._guilds[guild.id] = names
+        return names
+
+    def get(self, guild, name):
+        role_id = self._names(guild).get(name)
+        return guild.get_role(role_id) if role_id is not None else None
+
+    def add(self, role):
+        names = self._guilds.get(role.guild.id)
+        if names is not None:
+            names.setdefault(role.name, role.id)
+
+    def remove(self, role):
+        names = self._guilds.get(role.guild.id)
+        if names is not None and names.get(role.name) == role.id:
+            del names[role.name]
+            # Another role with the same name may still exist
+            for other in role.guild.roles:
+                if other.name == role.name and other.id != role.id:
+                    names[role.name] = other.id
+                    break
+
+    def rename(self, before, after):
+        if before.name != after.name:
+            self.remove(before)
+            self.add(after)
+
+    def forget_guild(self, guild_id):
+        self._guilds.pop(guild_id, None)
@@ -0,0 +1,204 @@
+import asyncio
+import logging
+import discord
+
+log = logging.getLogger(__name__)
+
+# Wait this long after a change before editing the board, so bursts become one edit
+BOARD_DEBOUNCE = 2.0
+
+# Discord limits the board has to fit in
+FIELD_VALUE_LIMIT = 1024
+FIELDS_PER_EMBED = 25
+EMBED_CHARS_PER_MESSAGE = 6000
+
+
+def render_fragment(challenge_name, challenge, users):
+    # One line per challenge, rendered once and cached until the challenge changes
+    if challenge.solved:
+        return f"✅ **{challenge_name}** — solved by {users.name(challenge.user)}"
+    if challenge.working_on:
+        return f"🔨 **{challenge_name}** — {users.name(challenge.user)} working on it"
+    return f"⬜ **{challenge_name}**"
+
+
+def chunk_lines(lines, limit=FIELD_VALUE_LIMIT):
+    # Split lines into field values that each fit Discord's 1024 character limit
+    chunks = []
+    chunk = []
+    size = 0
+    for line in lines:
+        line = line[:limit]
+        if chunk and size + 1 + len(line) > limit:
+            chunks.append('\n'.join(chunk))
+            chunk = []
+            size = 0
+        size += len(line) + (1 if chunk else 0)
+        chunk.append(line)
+    if chunk:
+        chunks.append('\n'.join(chunk))
+    return chunks
+
+
+class Board:
+    # Cached per-challenge fragments and the pending edit for one CTF's board
+    def __init__(self, ctf_name):
+        self.ctf_name = ctf_name
+        self.fragments = {}
+        self.message = None
+        self.timer = None
+        self.task = None
+
+    def cancel(self):
+        # Drop the scheduled edit and stop one that is under way
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+    def invalidate(self, challenge_name=None):
+        if challenge_name is None:
+            self.fragments.clear()
+        else:
+            self.fragments.pop(challenge_name, None)
+
+    def fragment(self, challenge_name, challenge, users):
+        line = self.fragments.get(challenge_name)
+        if line is None:
+            line = self.fragments[challenge_name] = render_fragment(challenge_name, challenge, users)
+        return line
+
+    def render(self, ctf, users):
+        challenges = ctf.challenges
+        solved = []
+        unsolved = []
+        for challenge_name, challenge in challenges.items():
+            (solved if challenge.solved else unsolved).append(self.fragment(challenge_name, challenge, users))
+        # Drop fragments of challenges that no longer exist
+        if len(self.fragments) > len(challenges):
+            for challenge_name in list(self.fragments):
+                if challenge_name not in challenges:
+                    del self.fragments[challenge_name]
+
+        embed = discord.Embed(
+            title=f"CTF: {self.ctf_name}",
+            description=f"{len(solved)}/{len(challenges)} challenges solved",
+            color=0x00ff00,
+        )
+        if not challenges:
+            embed.add_field(name="Challenges", value="No challenges have been added to this CTF yet.", inline=False)
+            return [embed]
+
+        fields = [(f"Solved Challenges ({len(solved)})", chunk) for chunk in chunk_lines(solved)]
+        fields += [(f"Unsolved Challenges ({len(unsolved)})", chunk) for chunk in chunk_lines(unsolved)]
+
+        embeds = [embed]
+        total = len(embed)
+        for shown, (name, value) in enumerate(fields):
+            if total + len(name) + len(value) > EMBED_CHARS_PER_MESSAGE - 100:
+                # Everything has to fit in one message; say what was left out
+                remaining = sum(value.count('\n') + 1 for _, value in fields[shown:])
+                embeds[-1].set_footer(text=f"...and {remaining} more challenges not shown")
+                break
+            if len(embeds[-1].fields) == FIELDS_PER_EMBED:
+                embeds.append(discord.Embed(color=0x00ff00))
+            embeds[-1].add_field(name=name, value=value, inline=False)
+            total += len(name) + len(value)
+        return embeds
+
+
+class Scoreboards:
+    # One persistent, pinned board message per CTF that is edited in place when
+    # its challenges change, instead of posting a fresh embed every time.
+    def __init__(self, outbox, get_channel, debounce=BOARD_DEBOUNCE):
+        self.outbox = outbox
+        self.get_channel = get_channel
+        self.debounce = debounce
+        self._boards = {}
+
+    def board(self, state, ctf_name):
+        key = (state.guild_id, ctf_name)
+        board = self._boards.get(key)
+        if board is None:
+            board = self._boards[key] = Board(ctf_name)
+        return board
+
+    def render(self, state, ctf_name):
+        return self.board(state, ctf_name).render(state.ctfs[ctf_name], state.users)
+
+    async def post(self, state, ctf_name, channel):
+        # Post a new board for the CTF in this channel and make it the live one
+        ctf = state.ctfs[ctf_name]
+        board = self.board(state, ctf_name)
+        old_message = self.board_message(state, ctf_name)
+        # render() keeps the board within one message
+        message = (await self.outbox.send(channel, embeds=board.render(ctf, state.users)))[0]
+        try:
+            await message.pin()
+        except discord.HTTPException:
+            pass  # Missing the Manage Messages permission, the board still works unpinned
+        board.message = message
+        ctf.board = (channel.id, message.id)
+        state.store.put_ctf(ctf_name, ctf)
+        if old_message is not None:
+            await self._retire(old_message, message)
+        return message
+
+    async def _retire(self, old_message, message):
+        # The previous board stops being updated: point it at the new one and unpin it
+        try:
+            await self.outbox.edit(old_message, content=f"This board has moved: {message.jump_url}", embeds=[])
+            await old_message.unpin()
+        except discord.HTTPException as e:
+            log.info("Retiring the old board %s failed: %s", old_message.id, e)
+
+    def board_message(self, state, ctf_name):
+        board = self.board(state, ctf_name)
+        if board.message is None:
+            location = state.ctfs[ctf_name].board
+            channel = self.get_channel(location[0]) if location else None
+            if channel is not None:
+                # A partial message can be edited without fetching it first
+                board.message = channel.get_partial_message(location[1])
+        return board.message
+
+    def changed(self, state, ctf_name, challenge_name=None):
+        # Re-render only what changed and schedule one debounced edit
+        board = self.board(state, ctf_name)
+        board.invalidate(challenge_name)
+        if board.timer is None and state.ctfs[ctf_name].board:
+            board.timer = asyncio.get_running_loop().call_later(self.debounce, self._start_refresh, state, ctf_name)
+
+    def _start_refresh(self, state, ctf_name):
+        board = self.board(state, ctf_name)
+        board.timer = None
+        board.task = asyncio.get_running_loop().create_task(self.refresh(state, ctf_name))
+
+    async def refresh(self, state, ctf_name):
+        board = self.board(state, ctf_name)
+        ctf = state.ctfs.get(ctf_name)
+        if ctf is None:
+            return
+        message = self.board_message(state, ctf_name)
+        if message is None:
+            return
+        try:
+            await self.outbox.edit(message, embeds=board.render(ctf, state.users))
+        except discord.NotFound:
+            # The board was deleted; the next !show_ctf posts a new one
+            board.message = None
+            ctf.board = None
+            state.store.put_ctf(ctf_name, ctf)
+        except Exception as e:
+            log.warning("Updating the board for '%s' failed: %s", ctf_name, e)
+
+    def forget(self, state, ctf_name):
+        board = self._boards.pop((state.guild_id, ctf_name), None)
+        if board is not None:
+            board.cancel()
+
+    def forget_guild(self, guild_id):
+        for key in [key for key in self._boards if key[0] == guild_id]:
+            self._boards.pop(key).cancel()
@@ -0,0 +1,406 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from models import Challenge, CustomCTF
+
+log = logging.getLogger(__name__)
+
+# How long mutations are collected before they are written in one transaction
+GROUP_COMMIT_DELAY = 0.05
+# Checkpoint and truncate the write-ahead log after this many commits
+COMPACT_EVERY = 200
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS ctfs (
+    name TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS challenges (
+    ctf TEXT NOT NULL,
+    name TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (ctf, name)
+);
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL
+);
+"""
+
+
+class CTFStore:
+    # SQLite (WAL mode) backend for custom CTFs. Only the records that changed
+    # are written; bursts of mutations are grouped into a single commit that
+    # runs on a worker thread so the event loop never touches disk. Several
+    # stores may share one executor; each store serialises its own disk work.
+    def __init__(self, path, legacy_json_path=None, executor=None):
+        self.path = path
+        self.legacy_json_path = legacy_json_path
+        self._owns_executor = executor is None
+        self._executor = executor or ThreadPoolExecutor(max_workers=1, thread_name_prefix='ctfstore')
+        self._io_lock = asyncio.Lock()
+        self._conn = None
+        self._pending = {}
+        self._flush_handle = None
+        self._flush_task = None
+        self._commits = 0
+
+    # -- worker thread ---------------------------------------------------
+
+    def _connect(self):
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.executescript(SCHEMA)
+        return self._conn
+
+    def _load(self):
+        conn = self._connect()
+        if self.legacy_json_path and os.path.exists(self.legacy_json_path):
+            if conn.execute('SELECT COUNT(*) FROM ctfs').fetchone()[0] == 0:
+                self._migrate_json(conn)
+            else:
+                log.warning("Not importing %s, %s already has CTFs", self.legacy_json_path, self.path)
+
+        ctfs = {}
+        for name, data in conn.execute('SELECT name, data FROM ctfs'):
+            ctfs[name] = CustomCTF.from_data(json.loads(data))
+        for ctf, name, data in conn.execute('SELECT ctf, name, data FROM challenges'):
+            if ctf in ctfs:
+                ctfs[ctf].challenges[name] = Challenge.from_data(json.loads(data))
+        users = dict(conn.execute('SELECT id, name FROM users'))
+        return ctfs, users
+
+    def _migrate_json(self, conn):
+        # One-time import of the old custom_ctfs.json format
+        with open(self.legacy_json_path, 'r') as f:
+            legacy = json.load(f)
+        with conn:
+            for ctf_name, record in legacy.items():
+                ctf = CustomCTF.from_data(record)
+                conn.execute('INSERT OR REPLACE INTO ctfs (name, data) VALUES (?, ?)',
+                             (ctf_name, json.dumps(ctf.to_data())))
+                for challenge_name, challenge in ctf.challenges.items():
+                    conn.execute('INSERT OR REPLACE INTO challenges (ctf, name, data) VALUES (?, ?, ?)',
+                                 (ctf_name, challenge_name, json.dumps(challenge.to_data())))
+        os.replace(self.legacy_json_path, self.legacy_json_path + '.migrated')
+        log.info("Migrated %d CTFs from %s to %s", len(legacy), self.legacy_json_path, self.path)
+
+    def _write_batch(self, batch):
+        conn = self._connect()
+        with conn:
+            for key, data in batch.items():
+                if key[0] == 'user':
+                    conn.execute('INSERT OR REPLACE INTO users (id, name) VALUES (?, ?)', (key[1], data))
+                elif key[0] == 'challenges':
+                    # Every challenge of a deleted CTF
+                    conn.execute('DELETE FROM challenges WHERE ctf = ?', (key[1],))
+                elif key[0] == 'ctf':
+                    if data is None:
+                        conn.execute('DELETE FROM ctfs WHERE name = ?', (key[1],))
+                    else:
+                        conn.execute('INSERT OR REPLACE INTO ctfs (name, data) VALUES (?, ?)', (key[1], data))
+                else:
+                    if data is None:
+                        conn.execute('DELETE FROM challenges WHERE ctf = ? AND name = ?', (key[1], key[2]))
+                    else:
+                        conn.execute('INSERT OR REPLACE INTO challenges (ctf, name, data) VALUES (?, ?, ?)',
+                                     (key[1], key[2], data))
+        self._commits += 1
+        if self._commits % COMPACT_EVERY == 0:
+            self._compact()
+
+    def _compact(self):
+        conn = self._connect()
+        conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        conn.execute('PRAGMA optimize')
+
+    def _close(self):
+        if self._conn is not None:
+            self._compact()
+            self._conn.close()
+            self._conn = None
+
+    # -- event loop side ---------------------------------------------------
+
+    @property
+    def has_pending(self):
+        return bool(self._pending) or self._flush_task is not None
+
+    async def _run(self, func, *args):
+        async with self._io_lock:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    async def load(self):
+        return await self._run(self._load)
+
+    def put_ctf(self, ctf_name, ctf):
+        self._queue(('ctf', ctf_name), json.dumps(ctf.to_data()))
+
+    def delete_ctf(self, ctf_name):
+        # Clearing the challenges is queued on its own, so it still happens if
+        # the CTF is re-created (replacing the queued delete) before the flush
+        self._queue(('challenges', ctf_name), None)
+        self._queue(('ctf', ctf_name), None)
+
+    def put_challenge(self, ctf_name, challenge_name, challenge):
+        self._queue(('challenge', ctf_name, challenge_name), json.dumps(challenge.to_data()))
+
+    def delete_challenge(self, ctf_name, challenge_name):
+        self._queue(('challenge', ctf_name, challenge_name), None)
+
+    def put_user(self, user_id, name):
+        self._queue(('user', user_id), name)
+
+    def _queue(self, key, data):
+        # Re-queue at the end so the batch replays mutations in causal order
+        self._pending.pop(key, None)
+        self._pending[key] = data
+        if self._flush_handle is None and self._flush_task is None:
+            loop = asyncio.get_running_loop()
+            self._flush_handle = loop.call_later(GROUP_COMMIT_DELAY, self._start_flush)
+
+    def _start_flush(self):
+        self._flush_handle = None
+        self._flush_task = asyncio.get_running_loop().create_task(self.flush())
+
+    async def flush(self):
+        try:
+            while self._pending:
+                batch, self._pending = self._pending, {}
+                try:
+                    await self._run(self._write_batch, batch)
+                except Exception as e:
+                    log.error("Failed to save custom CTFs to %s: %s", self.path, e)
+                    # Keep the failed writes for the next flush; newer mutations win
+                    # and, like in _queue, move to the end to keep causal order
+                    for key, data in self._pending.items():
+                        batch.pop(key, None)
+                        batch[key] = data
+                    self._pending = batch
+                    break
+        finally:
+            self._flush_task = None
+
+    async def compact(self):
+        await self._run(self._compact)
+
+    async def close(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if self._flush_task is not None:
+            await self._flush_task
+        await self.flush()
+        await self._run(self._close)
+        if self._owns_executor:
+            self._executor.shutdown(wait=True)
+
+
+REMINDER_SCHEMA = """
+CREATE TABLE IF NOT EXISTS reminders (
+    id INTEGER PRIMARY KEY,
+    guild_id INTEGER NOT NULL,
+    channel_id INTEGER NOT NULL,
+    event_id INTEGER NOT NULL,
+    title TEXT NOT NULL,
+    edge TEXT NOT NULL,
+    offset INTEGER NOT NULL,
+    event_time INTEGER NOT NULL
+);
+"""
+
+
+class ReminderStore:
+    # SQLite file for scheduled event reminders of every guild. Reminders are
+    # only written when they are created, fire or move, so each change is its
+    # own small transaction on a worker thread.
+    def __init__(self, path, executor=None):
+        self.path = path
+        self._owns_executor = executor is None
+        self._executor = executor or ThreadPoolExecutor(max_workers=1, thread_name_prefix='reminderstore')
+        self._io_lock = asyncio.Lock()
+        self._conn = None
+
+    def _connect(self):
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.executescript(REMINDER_SCHEMA)
+        return self._conn
+
+    def _load(self):
+        return self._connect().execute(
+            'SELECT id, guild_id, channel_id, event_id, title, edge, offset, event_time FROM reminders').fetchall()
+
+    def _put(self, rows):
+        with self._connect() as conn:
+            conn.executemany('INSERT OR REPLACE INTO reminders VALUES (?, ?, ?, ?, ?, ?, ?, ?)', rows)
+
+    def _delete(self, ids):
+        with self._connect() as conn:
+            conn.executemany('DELETE FROM reminders WHERE id = ?', [(reminder_id,) for reminder_id in ids])
+
+    def _close(self):
+        if self._conn is not None:
+            self._conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+            self._conn.close()
+            self._conn = None
+
+    async def _run(self, func, *args):
+        async with self._io_lock:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    async def load(self):
+        return await self._run(self._load)
+
+    async def put(self, rows):
+        if rows:
+            await self._run(self._put, rows)
+
+    async def delete(self, ids):
+        if ids:
+            await self._run(self._delete, ids)
+
+    async def close(self):
+        await self._run(self._close)
+        if self._owns_executor:
+            self._executor.shutdown(wait=True)
+
+
+RESPONSE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    body TEXT NOT NULL,
+    expires REAL NOT NULL,
+    stale_until REAL NOT NULL,
+    etag TEXT,
+    last_modified TEXT
+);
+"""
+
+# Persisted responses are dropped this long after they stop being servable,
+# unless they can still be revalidated with an ETag or Last-Modified date
+RESPONSE_RETENTION = 7 * 24 * 3600
+
+
+class ResponseStore:
+    # SQLite file backing the CTFTime response cache across restarts. Expiry
+    # times are wall-clock epochs, since the in-memory cache's monotonic clock
+    # doesn't survive a restart. Writes are grouped into one commit like
+    # CTFStore's, and JSON is encoded and decoded on the worker thread.
+    def __init__(self, path, executor=None):
+        self.path = path
+        self._owns_executor = executor is None
+        self._executor = executor or ThreadPoolExecutor(max_workers=1, thread_name_prefix='responsestore')
+        self._io_lock = asyncio.Lock()
+        self._conn = None
+        self._pending = {}
+        self._flush_handle = None
+        self._flush_task = None
+
+    def _connect(self):
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.executescript(RESPONSE_SCHEMA)
+        return self._conn
+
+    def _get(self, key):
+        row = self._connect().execute(
+            'SELECT body, expires, stale_until, etag, last_modified FROM responses WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        return (json.loads(row[0]),) + tuple(row[1:])
+
+    def _load_recent(self, limit):
+        rows = self._connect().execute(
+            'SELECT key, body, expires, stale_until, etag, last_modified FROM responses '
+            'ORDER BY expires DESC LIMIT ?', (limit,)).fetchall()
+        return [(key, json.loads(body), expires, stale_until, etag, last_modified)
+                for key, body, expires, stale_until, etag, last_modified in rows]
+
+    def _write_batch(self, batch):
+        rows = [(key, json.dumps(value), expires, stale_until, etag, last_modified)
+                for key, (value, expires, stale_until, etag, last_modified) in batch.items()]
+        with self._connect() as conn:
+            conn.executemany('INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)', rows)
+
+    def _prune(self, now):
+        with self._connect() as conn:
+            conn.execute('DELETE FROM responses WHERE stale_until < ? AND etag IS NULL AND last_modified IS NULL',
+                         (now,))
+            conn.execute('DELETE FROM responses WHERE stale_until < ?', (now - RESPONSE_RETENTION,))
+
+    def _close(self):
+        if self._conn is not None:
+            self._conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+            self._conn.close()
+            self._conn = None
+
+    async def _run(self, func, *args):
+        async with self._io_lock:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    async def get(self, key):
+        # (value, expires, stale_until, etag, last_modified), or None
+        pending = self._pending.get(key)
+        if pending is not None:
+            return pending
+        return await self._run(self._get, key)
+
+    async def load_recent(self, limit):
+        # [(key, value, expires, stale_until, etag, last_modified)], newest first
+        return await self._run(self._load_recent, limit)
+
+    def put(self, key, value, ttl, stale_ttl=0, etag=None, last_modified=None):
+        now = time.time()
+        self._pending[key] = (value, now + ttl, now + ttl + stale_ttl, etag, last_modified)
+        if self._flush_handle is None and self._flush_task is None:
+            loop = asyncio.get_running_loop()
+            self._flush_handle = loop.call_later(GROUP_COMMIT_DELAY, self._start_flush)
+
+    def _start_flush(self):
+        self._flush_handle = None
+        self._flush_task = asyncio.get_running_loop().create_task(self.flush())
+
+    async def flush(self):
+        try:
+            while self._pending:
+                batch, self._pending = self._pending, {}
+                try:
+                    await self._run(self._write_batch, batch)
+                except Exception as e:
+                    # Losing cached responses only costs a refetch
+                    log.warning("Failed to save cached responses to %s: %s", self.path, e)
+                    break
+        finally:
+            self._flush_task = None
+
+    async def close(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if self._flush_task is not None:
+            await self._flush_task
+        await self.flush()
+        await self._run(self._prune, time.time())
+        await self._run(self._close)
+        if self._owns_executor:
+            self._executor.shutdown(wait=True)
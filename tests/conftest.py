@@ -0,0 +1,132 @@
+import asyncio
+import os
+import sys
+import discord
+import pytest
+from aiohttp import web
+
+# The bot's modules live at the repo root, the fake Discord and CTFTime the
+# load test uses in benchmarks/bench_load.py
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+sys.path.insert(0, os.path.join(REPO, 'benchmarks'))
+
+from bench_load import FakeChannel, FakeMessage
+
+
+class StubServer:
+    # A local HTTP server standing in for CTFTime. `routes` maps a path to the
+    # JSON it answers with (None for a 404); paths in `hung` never answer.
+    # Every response waits `latency` seconds, and the most requests being
+    # handled at the same time is kept in max_in_flight.
+    def __init__(self, routes=None, hung=(), latency=0.0):
+        self.routes = dict(routes or {})
+        self.hung = set(hung)
+        self.latency = latency
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._closing = asyncio.Event()
+
+    async def handle(self, request):
+        self.requests += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            if request.path in self.hung:
+                await self._closing.wait()
+            elif self.latency:
+                await asyncio.sleep(self.latency)
+        finally:
+            self.in_flight -= 1
+        data = self.routes.get(request.path)
+        if data is None:
+            raise web.HTTPNotFound()
+        return web.json_response(data)
+
+    async def start(self):
+        # Returns the base URL on a free local port
+        app = web.Application()
+        app.router.add_get('/{path:.*}', self.handle)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, '127.0.0.1', 0).start()
+        port = self.runner.addresses[0][1]
+        return f'http://127.0.0.1:{port}'
+
+    async def close(self):
+        self._closing.set()
+        await self.runner.cleanup()
+
+
+class RecordingChannel(FakeChannel):
+    # Records every send, edit, pin and unpin made to it. The first `rate_limits` calls
+    # are refused the way discord.py reports a long 429.
+    def __init__(self, guild, id, rate_limits=0, retry_after=0.01):
+        super().__init__(guild, id)
+        self.calls = []
+        self.rate_limits = rate_limits
+        self.retry_after = retry_after
+
+    def api_call(self, kind, kwargs):
+        self.calls.append((kind, kwargs))
+        if self.rate_limits:
+            self.rate_limits -= 1
+            raise discord.RateLimited(self.retry_after)
+
+    def calls_of(self, kind):
+        return [kwargs for call_kind, kwargs in self.calls if call_kind == kind]
+
+    @property
+    def replies(self):
+        return [kwargs.get('content') for kwargs in self.calls_of('send')]
+
+    def message(self, content, author):
+        return RecordingMessage(next(self._ids), self, content, author)
+
+    def get_partial_message(self, message_id):
+        return RecordingMessage(message_id, self)
+
+    async def send(self, content=None, **kwargs):
+        if content is not None:
+            kwargs['content'] = content
+        self.api_call('send', kwargs)
+        return await super().send(**kwargs)
+
+
+class RecordingMessage(FakeMessage):
+    async def edit(self, **kwargs):
+        self.channel.api_call('edit', kwargs)
+        return await super().edit(**kwargs)
+
+    async def pin(self):
+        self.channel.api_call('pin', {'message_id': self.id})
+        await super().pin()
+
+    async def unpin(self):
+        self.channel.api_call('unpin', {'message_id': self.id})
+        await super().unpin()
+
+
+@pytest.fixture
+def bot(tmp_path, monkeypatch):
+    # The bot module with fresh state for one test, working in a scratch directory
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('LOG_LEVEL', 'WARNING')
+    import ctftimebot
+    from ctftime_client import CTFTimeClient
+    from event_index import EventIndex
+    from guilds import GuildRegistry
+    from outbox import Outbox
+    from roles import RoleIndex
+    from scoreboard import Scoreboards
+
+    # Discord's per-channel pacing is left out, as in the load test
+    outbox = Outbox(rate=1e9, burst=1e9)
+    monkeypatch.setattr(ctftimebot, 'outbox', outbox)
+    monkeypatch.setattr(ctftimebot, 'scoreboards', Scoreboards(outbox, ctftimebot.client.get_channel))
+    monkeypatch.setattr(ctftimebot, 'guilds', GuildRegistry(str(tmp_path / 'custom_ctfs')))
+    monkeypatch.setattr(ctftimebot, 'role_index', RoleIndex())
+    monkeypatch.setattr(ctftimebot, 'event_index', EventIndex())
+    monkeypatch.setattr(ctftimebot, 'ctftime', CTFTimeClient())
+    return ctftimebot
@@ -0,0 +1,96 @@
+import asyncio
+import random
+from bench_load import Server
+from conftest import RecordingChannel
+from challenges import WORKING
+from guilds import GuildRegistry
+
+CLAIMANTS = 300
+DISCORD_LATENCY = 0.002
+
+
+def recorded_server():
+    server = Server(0, CLAIMANTS, DISCORD_LATENCY)
+    server.channel = RecordingChannel(server.guild, server.channel.id)
+    return server
+
+
+async def send(bot, server, member, content):
+    await bot.on_message(server.channel.message(content, member))
+
+
+async def stored_challenges(bot, guild_id, ctf_name):
+    # What the guild's shard holds once everything is written and reloaded from disk
+    data_dir = bot.guilds.data_dir
+    await bot.guilds.close()
+    guilds = GuildRegistry(data_dir)
+    try:
+        return (await guilds.get(guild_id)).ctfs[ctf_name].challenges
+    finally:
+        await guilds.close()
+
+
+def test_concurrent_claims_have_one_winner(bot):
+    server = recorded_server()
+
+    async def run():
+        await send(bot, server, server.admin, '!create_ctf kickoff')
+        await send(bot, server, server.admin, '!add_challenge kickoff pwn1')
+        server.channel.calls.clear()
+        # Everyone goes for the same challenge at once
+        await asyncio.gather(*(send(bot, server, member, '!allocate_challenge kickoff pwn1')
+                               for member in server.members))
+        state = bot.guilds.loaded(server.guild.id)
+        return state, await stored_challenges(bot, server.guild.id, 'kickoff')
+
+    state, stored = asyncio.run(run())
+    replies = server.channel.replies
+    won = [reply for reply in replies if 'has been allocated to' in reply]
+    lost = [reply for reply in replies if 'is already allocated to' in reply]
+    assert len(won) == 1
+    assert len(lost) == CLAIMANTS - 1
+    assert not server.channel.errors
+
+    challenge = state.ctfs['kickoff'].challenges['pwn1']
+    winner = next(member for member in server.members if won[0].endswith(f"allocated to {member.display_name}."))
+    assert challenge.user == winner.id and challenge.status is WORKING
+    assert all(reply.endswith(f"allocated to {winner.display_name}.") for reply in lost)
+    # The indexes, the saved copy and the roles agree with the winner
+    assert state.challenge_index.with_status('kickoff', WORKING) == ['pwn1']
+    assert state.challenge_index.for_user(winner.id) == [('kickoff', 'pwn1', WORKING)]
+    assert all(not state.challenge_index.for_user(member.id) for member in server.members if member is not winner)
+    assert stored['pwn1'].user == winner.id and stored['pwn1'].status is WORKING
+    assert [member for member in server.members if member.roles] == [winner]
+
+
+def test_concurrent_claims_on_new_challenges(bot):
+    # Claims for challenges nobody has added yet, several members per challenge
+    # and all challenges at once: each is added once and won once
+    server = recorded_server()
+    challenges = [f"chal{i}" for i in range(CLAIMANTS // 6)]
+    claims = [(member, challenges[i % len(challenges)]) for i, member in enumerate(server.members)]
+    random.Random(1).shuffle(claims)
+
+    async def run():
+        await send(bot, server, server.admin, '!create_ctf kickoff')
+        server.channel.calls.clear()
+        await asyncio.gather(*(send(bot, server, member, f'!allocate_challenge kickoff {challenge_name}')
+                               for member, challenge_name in claims))
+        state = bot.guilds.loaded(server.guild.id)
+        return state, await stored_challenges(bot, server.guild.id, 'kickoff')
+
+    state, stored = asyncio.run(run())
+    replies = server.channel.replies
+    assert not server.channel.errors
+    members = {member.display_name: member for member in server.members}
+    counts = state.challenge_index.counts('kickoff')
+    assert counts['total'] == counts[WORKING] == len(challenges)
+    for challenge_name in challenges:
+        added = [reply for reply in replies if reply == f"The challenge '{challenge_name}' has been added to CTF 'kickoff'."]
+        won = [reply for reply in replies if reply.startswith(f"The challenge '{challenge_name}' in CTF 'kickoff' has been allocated to ")]
+        assert len(added) == 1
+        assert len(won) == 1
+        winner = members[won[0].rsplit(' ', 1)[1].rstrip('.')]
+        assert state.ctfs['kickoff'].challenges[challenge_name].user == winner.id
+        assert state.challenge_index.for_user(winner.id) == [('kickoff', challenge_name, WORKING)]
+        assert stored[challenge_name].user == winner.id
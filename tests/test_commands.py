@@ -0,0 +1,11 @@
+import pytest
+from commands import UsageError, optional_int_arg
+
+
+def test_optional_int_arg():
+    parse = optional_int_arg(5)
+    assert parse('') == (5,)
+    assert parse(' 3 ') == (3,)
+    for rest in ('0', '-2', 'many'):
+        with pytest.raises(UsageError):
+            parse(rest)
@@ -0,0 +1,152 @@
+import asyncio
+import time
+import aiohttp
+from bench_load import FakeCTFTime, Server
+from conftest import RecordingChannel, StubServer
+from ctftime_client import CTFTimeClient, MAX_CONCURRENCY
+
+TIMEOUT = 0.2
+BURST = 10
+EVENT = {'id': 1, 'title': 'Kickoff CTF'}
+MISSING_EVENT = 999999
+
+
+def test_hung_request_is_cut_off_at_the_timeout():
+    async def run():
+        server = StubServer({'/events/': [{'id': 1}]}, hung={'/api/hung/'})
+        base = await server.start()
+        client = CTFTimeClient(timeout=TIMEOUT)
+        try:
+            started = time.perf_counter()
+            try:
+                await client.get_json(f'{base}/api/hung/')
+            except asyncio.TimeoutError:
+                elapsed = time.perf_counter() - started
+            else:
+                raise AssertionError("the hung request returned")
+            # The client is still usable afterwards
+            result = await client.get_json(f'{base}/events/')
+        finally:
+            await client.close()
+            await server.close()
+        return elapsed, result
+
+    elapsed, result = asyncio.run(run())
+    assert TIMEOUT * 0.9 <= elapsed < TIMEOUT + 0.5
+    assert result == [{'id': 1}]
+
+
+def test_requests_in_flight_are_bounded():
+    requests = 3 * MAX_CONCURRENCY
+
+    async def run():
+        server = StubServer({f'/events/{i}/': {'id': i} for i in range(requests)}, latency=0.05)
+        base = await server.start()
+        client = CTFTimeClient()
+        try:
+            results = await asyncio.gather(*(client.get_json(f'{base}/events/{i}/') for i in range(requests)))
+        finally:
+            await client.close()
+            await server.close()
+        return server, results
+
+    server, results = asyncio.run(run())
+    assert server.requests == requests
+    assert server.max_in_flight == MAX_CONCURRENCY
+    assert [result['id'] for result in results] == list(range(requests))
+
+
+async def start_ctftime(latency=0.05):
+    # A CTFTime answering slowly enough for a burst to overlap
+    server = StubServer({'/events/1/': EVENT}, latency=latency)
+    return server, await server.start()
+
+
+def test_burst_makes_one_upstream_request():
+    async def run():
+        server, base = await start_ctftime()
+        client = CTFTimeClient()
+        try:
+            results = await asyncio.gather(*(client.get_json(f'{base}/events/1/') for _ in range(BURST)))
+        finally:
+            await client.close()
+            await server.close()
+        return server, client, results
+
+    server, client, results = asyncio.run(run())
+    assert server.requests == 1
+    assert client.upstream_requests == 1
+    assert client.coalesced_requests == BURST - 1
+    assert results == [EVENT] * BURST
+
+
+def test_cached_burst_makes_one_upstream_request():
+    async def run():
+        server, base = await start_ctftime()
+        client = CTFTimeClient()
+        url = f'{base}/events/1/'
+        try:
+            await asyncio.gather(*(client.get_json(url, ttl=60) for _ in range(BURST)))
+            # Answered from the cache from then on
+            await asyncio.gather(*(client.get_json(url, ttl=60) for _ in range(BURST)))
+        finally:
+            await client.close()
+            await server.close()
+        return server, client
+
+    server, client = asyncio.run(run())
+    assert server.requests == 1
+    assert client.upstream_requests == 1
+    assert client.coalesced_requests == BURST - 1
+    assert client.cache.hits == BURST
+
+
+def test_burst_shares_the_error():
+    async def run():
+        server, base = await start_ctftime()
+        client = CTFTimeClient()
+        try:
+            errors = await asyncio.gather(*(client.get_json(f'{base}/events/2/') for _ in range(BURST)),
+                                          return_exceptions=True)
+        finally:
+            await client.close()
+            await server.close()
+        return server, client, errors
+
+    server, client, errors = asyncio.run(run())
+    assert server.requests == 1
+    assert client.upstream_requests == 1
+    assert client.coalesced_requests == BURST - 1
+    assert all(isinstance(error, aiohttp.ClientResponseError) and error.status == 404 for error in errors)
+    # Every caller gets the one request's error
+    assert all(error is errors[0] for error in errors)
+
+
+def test_burst_of_time_left_commands(bot, monkeypatch):
+    # Ten people typing `!time_left <id>` in the same second when a CTF starts
+    async def run():
+        fake = FakeCTFTime(int(time.time()), 0.05)
+        base = await fake.start()
+        monkeypatch.setattr(bot, 'specific_event', base + 'events/{event_id}/')
+        server = Server(0, BURST, 0.001)
+        server.channel = RecordingChannel(server.guild, server.channel.id)
+        event = fake.events[0]
+        try:
+            await asyncio.gather(*(bot.on_message(server.channel.message(f"!time_left {event['id']}", member))
+                                   for member in server.members))
+            requests_before = fake.requests
+            await asyncio.gather(*(bot.on_message(server.channel.message(f"!time_left {MISSING_EVENT}", member))
+                                   for member in server.members))
+        finally:
+            await bot.ctftime.close()
+            await fake.close()
+        return fake, requests_before, event, server.channel.replies
+
+    fake, requests_before, event, replies = asyncio.run(run())
+    assert requests_before == 1
+    assert fake.requests == 2
+    assert bot.ctftime.upstream_requests == 2
+    assert bot.ctftime.coalesced_requests == 2 * (BURST - 1)
+    found, missing = replies[:BURST], replies[BURST:]
+    assert all(event['title'] in reply for reply in found)
+    assert len(missing) == BURST and all(reply.startswith("An error occurred") and '404' in reply for reply in missing)
@@ -0,0 +1,74 @@
+import asyncio
+import json
+import logging
+from bench_load import FakeGuild, FakeMember
+from challenges import WORKING, SOLVED
+from guilds import GuildRegistry
+from models import CustomCTF
+
+GUILD_ID = 1
+
+
+def test_legacy_usernames_go_to_the_members_who_have_them(tmp_path, caplog):
+    # custom_ctfs.json from before user ids were stored
+    legacy_json = tmp_path / 'custom_ctfs.json'
+    legacy_json.write_text(json.dumps({'kickoff': {'name': 'kickoff', 'challenges': {
+        'pwn1': {'user': 'alice', 'solved': False, 'working_on': True},
+        'web1': {'user': 'alice', 'solved': True, 'working_on': False},
+        'rev1': {'user': 'gone', 'solved': False, 'working_on': True},
+    }}}))
+    guild = FakeGuild(GUILD_ID, 0)
+    alice = FakeMember(guild, 10**17, 'alice')
+    lookups = []
+
+    async def find_members(guild_id, names):
+        lookups.append((guild_id, sorted(names)))
+        return {'alice': alice}
+
+    async def run():
+        guilds = GuildRegistry(str(tmp_path / 'custom_ctfs'), legacy_guild_id=GUILD_ID,
+                               legacy_json_path=str(legacy_json), find_members=find_members)
+        state = await guilds.get(GUILD_ID)
+        await guilds.close()
+        # Saved, so a fresh registry doesn't need to look anyone up
+        reloaded = GuildRegistry(str(tmp_path / 'custom_ctfs'), find_members=find_members)
+        stored = await reloaded.get(GUILD_ID)
+        await reloaded.close()
+        return state, stored
+
+    with caplog.at_level(logging.INFO, logger='guilds'):
+        state, stored = asyncio.run(run())
+    assert lookups == [(GUILD_ID, ['alice', 'gone']), (GUILD_ID, ['gone'])]
+    for challenges in (state.ctfs['kickoff'].challenges, stored.ctfs['kickoff'].challenges):
+        assert challenges['pwn1'].user == alice.id and challenges['pwn1'].status is WORKING
+        assert challenges['web1'].user == alice.id and challenges['web1'].status is SOLVED
+        # Nobody has that username any more
+        assert challenges['rev1'].user == 'gone'
+    assert state.challenge_index.for_user(alice.id) == [('kickoff', 'pwn1', WORKING), ('kickoff', 'web1', SOLVED)]
+    assert state.users.name(alice.id) == alice.display_name
+    # One shared id across the challenges
+    assert state.ctfs['kickoff'].challenges['pwn1'].user is state.ctfs['kickoff'].challenges['web1'].user
+    adopted = [record for record in caplog.records if 'now belongs to member' in record.getMessage()]
+    assert len(adopted) == 2 and all("claimed as 'alice'" in record.getMessage() for record in adopted)
+
+
+def test_command_during_unload_waits_for_the_close(tmp_path):
+    async def run():
+        guilds = GuildRegistry(str(tmp_path / 'custom_ctfs'))
+        state = await guilds.get(GUILD_ID)
+        state.ctfs['kickoff'] = CustomCTF('kickoff')
+        state.store.put_ctf('kickoff', state.ctfs['kickoff'])
+        await state.store.flush()
+        state.last_used = 0
+        unloading = asyncio.ensure_future(guilds.unload_idle(60))
+        await asyncio.sleep(0)
+        # The guild's next command arrives while its shard is being closed
+        reloaded = await guilds.get(GUILD_ID)
+        unloaded = await unloading
+        await guilds.close()
+        return state, reloaded, unloaded
+
+    state, reloaded, unloaded = asyncio.run(run())
+    assert reloaded is not state
+    assert list(reloaded.ctfs) == ['kickoff']
+    assert unloaded == []
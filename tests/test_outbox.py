@@ -0,0 +1,190 @@
+import asyncio
+import logging
+import time
+import discord
+import pytest
+from bench_load import FakeGuild, FakeMember
+from conftest import RecordingChannel
+from outbox import Outbox, MAX_EMBEDS_PER_MESSAGE, MAX_EMBED_CHARS_PER_MESSAGE, MAX_RATE_LIMIT_RETRIES
+
+UNPACED = {'rate': 1e9, 'burst': 1e9}
+
+
+def recording_channel(id=1, rate_limits=0, latency=0.0):
+    return RecordingChannel(FakeGuild(id, latency), id, rate_limits)
+
+
+def embed(size, i=0):
+    return discord.Embed(title=f"{i:04}", description='x' * (size - 4))
+
+
+def assert_within_limits(sends):
+    for kwargs in sends:
+        assert len(kwargs['embeds']) <= MAX_EMBEDS_PER_MESSAGE
+        assert sum(len(embed) for embed in kwargs['embeds']) <= MAX_EMBED_CHARS_PER_MESSAGE
+
+
+def test_packs_ten_embeds_per_message():
+    channel = recording_channel()
+
+    async def run():
+        return await Outbox(**UNPACED).send(channel, embeds=[embed(100, i) for i in range(23)])
+
+    messages = asyncio.run(run())
+    sends = channel.calls_of('send')
+    assert [len(kwargs['embeds']) for kwargs in sends] == [10, 10, 3]
+    assert len(messages) == 3
+    assert_within_limits(sends)
+    # In order
+    assert [e.title for kwargs in sends for e in kwargs['embeds']] == [f"{i:04}" for i in range(23)]
+
+
+def test_packs_within_6000_characters():
+    channel = recording_channel()
+
+    async def run():
+        await Outbox(**UNPACED).send(channel, content="Results", embeds=[embed(2500, i) for i in range(5)])
+
+    asyncio.run(run())
+    sends = channel.calls_of('send')
+    assert [len(kwargs['embeds']) for kwargs in sends] == [2, 2, 1]
+    assert_within_limits(sends)
+    # The text goes with the first message only
+    assert [kwargs.get('content') for kwargs in sends] == ["Results", None, None]
+
+
+def test_list_challenges_of_a_big_ctf(bot):
+    # 120 challenges are five 25-field pages, which used to be five sends
+    channel = recording_channel()
+    captain = FakeMember(channel.guild, 10, 'captain')
+
+    async def command(content):
+        await bot.on_message(channel.message(content, captain))
+
+    async def run():
+        await command('!create_ctf big')
+        for i in range(120):
+            await command(f'!add_challenge big challenge{i:03}')
+        channel.calls.clear()
+        await command('!list_challenges big')
+        await bot.guilds.close()
+
+    asyncio.run(run())
+    sends = channel.calls_of('send')
+    assert len(sends) == 2
+    assert [len(kwargs['embeds']) for kwargs in sends] == [3, 2]
+    assert sum(len(embed.fields) for kwargs in sends for embed in kwargs['embeds']) == 120
+    assert_within_limits(sends)
+    assert not channel.errors
+
+
+def test_rapid_edits_become_one_call():
+    channel = recording_channel()
+    outbox = Outbox(**UNPACED)
+
+    async def run():
+        message, = await outbox.send(channel, content="board v0")
+        await asyncio.gather(*(outbox.edit(message, content=f"board v{i}") for i in range(1, 21)))
+
+    asyncio.run(run())
+    assert channel.calls_of('edit') == [{'content': "board v20"}]
+    assert outbox.stats()['edits'] == 1
+    assert outbox.stats()['merged_edits'] == 19
+
+
+def test_edits_during_an_edit_become_one_more_call():
+    # Edits arriving while one is on its way to Discord are merged into the next
+    channel = recording_channel(latency=0.05)
+    outbox = Outbox(**UNPACED)
+
+    async def run():
+        message, = await outbox.send(channel, content="board v0")
+        first = asyncio.ensure_future(outbox.edit(message, content="board v1"))
+        await asyncio.sleep(0.01)
+        await asyncio.gather(first, *(outbox.edit(message, content=f"board v{i}") for i in range(2, 12)))
+
+    asyncio.run(run())
+    assert channel.calls_of('edit') == [{'content': "board v1"}, {'content': "board v11"}]
+
+
+def test_rate_limited_send_is_retried():
+    channel = recording_channel(rate_limits=2)
+    outbox = Outbox(**UNPACED)
+
+    async def run():
+        return await outbox.send(channel, content="hello")
+
+    messages = asyncio.run(run())
+    assert len(messages) == 1 and messages[0].content == "hello"
+    assert len(channel.calls_of('send')) == 3
+    assert outbox.stats()['gave_up_rate_limited'] == 2
+
+
+def test_rate_limited_send_gives_up():
+    channel = recording_channel(rate_limits=MAX_RATE_LIMIT_RETRIES + 1)
+    outbox = Outbox(**UNPACED)
+
+    async def run():
+        await outbox.send(channel, content="hello")
+
+    with pytest.raises(discord.RateLimited):
+        asyncio.run(run())
+    assert len(channel.calls_of('send')) == MAX_RATE_LIMIT_RETRIES + 1
+    assert channel.sends == 0
+
+
+def test_bot_stats_counts_the_429s_discord_py_sleeps_through(bot):
+    # discord.py retries these inside the request; all the bot sees is the warning
+    channel = recording_channel()
+    captain = FakeMember(channel.guild, 10, 'captain')
+    http_log = logging.getLogger('discord.http')
+    before = bot.discord_rate_limits.count
+
+    async def run():
+        for _ in range(2):
+            http_log.warning('We are being rate limited. %s %s responded with 429. Retrying in %.2f seconds.',
+                             'POST', 'https://discord.com/api/v10/channels/1/messages', 0.5)
+        http_log.warning('Global rate limit has been hit. Retrying in %.2f seconds.', 0.5)
+        await bot.on_message(channel.message('!bot_stats', captain))
+        await bot.guilds.close()
+
+    asyncio.run(run())
+    assert bot.discord_rate_limits.count == before + 2
+    fields = {field.name: field.value for kwargs in channel.calls_of('send') for field in kwargs['embeds'][0].fields}
+    assert f"{before + 2} rate limited (0 too long for discord.py" in fields['Discord Output']
+
+
+def test_sends_are_paced_per_channel():
+    busy = recording_channel(1)
+    quiet = recording_channel(2)
+    outbox = Outbox(rate=20, burst=2)
+
+    async def run():
+        started = time.perf_counter()
+        flood = asyncio.gather(*(outbox.send(busy, content=f"{i}") for i in range(6)))
+        await outbox.send(quiet, content="hi")
+        quiet_done = time.perf_counter() - started
+        await flood
+        return quiet_done, time.perf_counter() - started
+
+    quiet_done, busy_done = asyncio.run(run())
+    # Two right away, then one every 50 ms, in order; other channels don't wait
+    assert busy_done >= 4 / 20 * 0.9
+    assert quiet_done < 0.05
+    assert [kwargs['content'] for kwargs in busy.calls_of('send')] == [f"{i}" for i in range(6)]
+
+
+def test_idle_channels_are_forgotten():
+    channels = [recording_channel(i) for i in range(1, 51)]
+    outbox = Outbox(rate=20, burst=2)
+
+    async def run():
+        await asyncio.gather(*(outbox.send(channel, content="hi") for channel in channels))
+        active = outbox.stats()['active_channels']
+        # Each bucket is one send short of full, which takes 1/20 s to refill
+        await asyncio.sleep(0.2)
+        return active, outbox.stats()['active_channels']
+
+    active, idle = asyncio.run(run())
+    assert active == 50
+    assert idle == 0
@@ -0,0 +1,50 @@
+import asyncio
+from bench_load import FakeGuild, FakeMember
+from conftest import RecordingChannel
+
+
+def test_board_posted_elsewhere_retires_the_old_one(bot):
+    guild = FakeGuild(1, 0)
+    first = RecordingChannel(guild, 1)
+    second = RecordingChannel(guild, 2)
+    captain = FakeMember(guild, 10, 'captain')
+
+    async def run():
+        await bot.on_message(first.message('!create_ctf kickoff', captain))
+        await bot.on_message(first.message('!show_ctf kickoff', captain))
+        state = bot.guilds.loaded(guild.id)
+        old_board = state.ctfs['kickoff'].board
+        await bot.on_message(second.message('!show_ctf kickoff', captain))
+        new_board = state.ctfs['kickoff'].board
+        await bot.guilds.close()
+        return old_board, new_board
+
+    old_board, new_board = asyncio.run(run())
+    assert old_board[0] == first.id and new_board[0] == second.id
+    new_url = f"https://discord.com/channels/{guild.id}/{second.id}/{new_board[1]}"
+    assert first.calls_of('edit') == [{'content': f"This board has moved: {new_url}", 'embeds': []}]
+    assert first.calls_of('unpin') == [{'message_id': old_board[1]}]
+    assert second.calls_of('pin') == [{'message_id': new_board[1]}]
+    assert not second.calls_of('unpin')
+
+
+def test_forget_stops_a_refresh_under_way(bot):
+    guild = FakeGuild(1, 0)
+    channel = RecordingChannel(guild, 1)
+    captain = FakeMember(guild, 10, 'captain')
+
+    async def run():
+        await bot.on_message(channel.message('!create_ctf kickoff', captain))
+        await bot.on_message(channel.message('!show_ctf kickoff', captain))
+        state = bot.guilds.loaded(guild.id)
+        board = bot.scoreboards.board(state, 'kickoff')
+        bot.scoreboards._start_refresh(state, 'kickoff')
+        task = board.task
+        bot.scoreboards.forget_guild(guild.id)
+        await asyncio.sleep(0.01)
+        await bot.guilds.close()
+        return task
+
+    task = asyncio.run(run())
+    assert task.cancelled()
+    assert not channel.calls_of('edit')
@@ -0,0 +1,49 @@
+import asyncio
+from models import Challenge, CustomCTF
+from storage import CTFStore
+
+
+async def reopen(path):
+    store = CTFStore(path)
+    ctfs, _ = await store.load()
+    await store.close()
+    return ctfs
+
+
+def test_recreated_ctf_drops_old_challenges(tmp_path):
+    # !delete_ctf X followed right away by !create_ctf X, in one group commit
+    path = str(tmp_path / 'ctfs.db')
+
+    async def run():
+        store = CTFStore(path)
+        await store.load()
+        store.put_ctf('x', CustomCTF('x'))
+        store.put_challenge('x', 'a', Challenge())
+        await store.flush()
+        store.delete_ctf('x')
+        store.put_ctf('x', CustomCTF('x'))
+        await store.close()
+        return await reopen(path)
+
+    ctfs = asyncio.run(run())
+    assert list(ctfs) == ['x']
+    assert ctfs['x'].challenges == {}
+
+
+def test_challenges_added_after_recreate_are_kept(tmp_path):
+    path = str(tmp_path / 'ctfs.db')
+
+    async def run():
+        store = CTFStore(path)
+        await store.load()
+        store.put_ctf('x', CustomCTF('x'))
+        store.put_challenge('x', 'a', Challenge())
+        store.put_challenge('x', 'b', Challenge())
+        store.delete_ctf('x')
+        store.put_ctf('x', CustomCTF('x'))
+        store.put_challenge('x', 'a', Challenge())
+        await store.close()
+        return await reopen(path)
+
+    ctfs = asyncio.run(run())
+    assert list(ctfs['x'].challenges) == ['a']